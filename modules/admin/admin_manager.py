@@ -1,6 +1,6 @@
 import time
 import logging
-from pubsub import pub
+from tools.eventbus import pub
 
 
 class AdminManager(object):
@@ -178,6 +178,12 @@ class AdminManager(object):
             self._admins[nick] = {}
         self._admins[nick]['user'] = user
         self._admins[nick]['expiration'] = time.time() + self._admin_timeout
+        pub.sendMessage(
+            'admin:login',
+            nick=nick,
+            user=user,
+            expiration=self._admins[nick]['expiration']
+        )
 
     def listAdmins(self):
         return [
@@ -190,9 +196,35 @@ class AdminManager(object):
         if nick in self._admins.keys():
             self._admins[nick]['user'] = None
             self._admins[nick]['expiration'] = 0
+            pub.sendMessage('admin:logout', nick=nick)
             return True
         return False
 
+    def getSessions(self):
+        """Returns a dict of nick -> (user, expiration) of active sessions."""
+        now = time.time()
+        return dict([
+            (nick, (info['user'], info['expiration']))
+            for nick, info in self._admins.iteritems()
+            if info.get('expiration', 0) > now
+        ])
+
+    def restoreSessions(self, sessions):
+        """
+        Restores sessions from getSessions (eg from another process). Does
+        not publish login or logout events. Sessions with no user are
+        cleared.
+        """
+        if not self._admin_enabled:
+            return
+        for nick, (user, expiration) in sessions.items():
+            if nick not in self._admins:
+                if user is None or self._admin_type == 'simple':
+                    continue
+                self._admins[nick] = {}
+            self._admins[nick]['user'] = user
+            self._admins[nick]['expiration'] = expiration if user else 0
+
     def clearAdmins(self):
         [self.clearAdmin(nick) for nick in self._admins.keys()]
 
@@ -0,0 +1,2 @@
+from coordinator import Coordinator
+from worker import ClusterClient, ClusterSettings
@@ -0,0 +1,270 @@
+import os
+import sys
+import logging
+
+from twisted.internet import reactor, protocol
+
+from modules.dispatch.process_plugin import encodeMessage, MessageDecoder
+from tools.hashring import HashRing
+from tools import util
+
+
+CHANNELS_KEY = 'default_channels'
+
+
+def normalizeChannel(channel):
+    """Returns the channel with a prefix, in lower case."""
+    channel = channel.lower()
+    if channel[:1] not in '&#!+':
+        channel = '#' + channel
+    return channel
+
+
+def getClusterConfig(configuration):
+    """
+    Returns (socket path, number of workers) from the `cluster` config
+    section.
+    """
+    cluster = configuration.cluster
+    socket_path = (cluster and cluster.socket) or 'yaib.sock'
+    workers = (cluster and cluster.workers) or 2
+    return socket_path, workers
+
+
+class CoordinatorProtocol(protocol.Protocol):
+    """One worker's connection to the coordinator socket."""
+
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+        self.decoder = MessageDecoder()
+        self.worker_id = None
+
+    def send(self, message):
+        self.transport.write(encodeMessage(message))
+
+    def dataReceived(self, data):
+        for message in self.decoder.feed(data):
+            self.coordinator.messageReceived(self, message)
+
+    def connectionLost(self, reason):
+        self.coordinator.workerLost(self)
+
+
+class CoordinatorFactory(protocol.ServerFactory):
+
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+
+    def buildProtocol(self, addr):
+        return CoordinatorProtocol(self.coordinator)
+
+
+class WorkerProcessProtocol(protocol.ProcessProtocol):
+    """Tells the coordinator when a worker process exits."""
+
+    def __init__(self, coordinator, worker_id):
+        self.coordinator = coordinator
+        self.worker_id = worker_id
+
+    def processEnded(self, reason):
+        self.coordinator.workerEnded(self.worker_id, reason)
+
+
+class Coordinator(object):
+    """
+    Runs yaib as several worker processes, each with its own connection to
+    the primary network. The coordinator owns the settings and the admin
+    sessions, and assigns the channels in `default_channels` to the workers
+    with a consistent hash so a worker joining or leaving only moves its own
+    share of the channels.
+
+    Workers talk to the coordinator over a Unix socket:
+    - ('hello', worker id) - the worker is ready for channels
+    - ('set', key, value, initial) - a worker changed a setting
+    - ('channels', joined, left) - a worker joined or left channels
+    - ('admins', sessions) - a worker logged admins in or out
+
+    and are sent:
+    - ('settings', settings) - every setting, after hello
+    - ('set', key, value) - a setting changed in another worker
+    - ('admins', sessions) - admin sessions changed in another worker
+    - ('assign', channels) - the channels the worker should be in
+
+    Worker processes that exit are restarted with exponential backoff, their
+    channels are spread over the other workers in the meantime.
+
+    Configured with the `cluster` config section:
+    - `workers` (int) - number of worker processes, defaults to 2
+    - `socket` (string) - path of the Unix socket, defaults to 'yaib.sock'
+    - `nick_format` (string) - nick of each worker, defaults to
+                               '{nick}{worker}'
+    """
+
+    MAX_RESTART_DELAY = 60
+
+    def __init__(self, configuration, settings, script=None, clock=reactor):
+        self.config = configuration
+        self.settings = settings
+        self.clock = clock
+
+        # the script started with --worker for each worker process
+        self.script = os.path.realpath(script or sys.argv[0])
+        self.socket_path, self.worker_count = getClusterConfig(configuration)
+
+        self.ring = HashRing()
+        self.stopping = False
+
+        # worker id -> connected protocol, assigned channels, crash count
+        self.workers = {}
+        self.assignments = {}
+        self.crashes = {}
+
+        # nick -> (user, expiration) of the admins logged in on any worker
+        self.admins = {}
+
+        # seed the channels, workers add the other defaults themselves
+        connection_config = configuration.connection
+        if isinstance(connection_config, list):
+            connection_config = util.dictToObject(connection_config[0])
+        channels = connection_config.default_channels
+        if channels is None:
+            channels = configuration.default_channels
+        self.settings.set(
+            CHANNELS_KEY, util.toList(channels or []), initial=True
+        )
+
+    def start(self):
+        """Listen on the socket, spawn the workers and run the reactor."""
+        self.listen()
+        for worker_id in range(self.worker_count):
+            self.spawn(worker_id)
+        self.clock.addSystemEventTrigger('before', 'shutdown', self.stop)
+        self.clock.run()
+
+    def listen(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.port = self.clock.listenUNIX(
+            self.socket_path, CoordinatorFactory(self)
+        )
+
+    def spawn(self, worker_id):
+        """Start the worker process with the given id."""
+        if self.stopping:
+            return
+        self.clock.spawnProcess(
+            WorkerProcessProtocol(self, worker_id),
+            sys.executable,
+            [sys.executable, self.script, '--worker', str(worker_id)],
+            env=dict(os.environ),
+            path=os.getcwd(),
+            childFDs={0: 'w', 1: 1, 2: 2}
+        )
+
+    def stop(self):
+        """Stop restarting workers and tell them to quit."""
+        self.stopping = True
+        for worker in self.workers.values():
+            worker.send(('quit',))
+
+    def workerEnded(self, worker_id, reason):
+        if self.stopping:
+            return
+        crashes = self.crashes[worker_id] = self.crashes.get(worker_id, 0) + 1
+        delay = min(2 ** crashes, self.MAX_RESTART_DELAY)
+        logging.error(
+            "Worker %d exited (%s). Restarting in %d seconds" % (
+                worker_id, reason.value, delay
+            )
+        )
+        self.clock.callLater(delay, self.spawn, worker_id)
+
+    def messageReceived(self, worker, message):
+        kind = message[0]
+        if kind == 'hello':
+            self.workerReady(worker, message[1])
+        elif kind == 'set':
+            key, value, initial = message[1:]
+            self.settings.set(key, value, initial=initial)
+            self.broadcast(('set', key, self.settings.get(key)), worker)
+            if key == CHANNELS_KEY:
+                # the sender may have joined a channel another worker owns
+                self.rebalance(worker)
+        elif kind == 'channels':
+            self.updateChannels(worker, message[1], message[2])
+        elif kind == 'admins':
+            self.admins.update(message[1])
+            self.broadcast(message, worker)
+        else:
+            logging.warning("Unknown message from worker: %r" % (kind,))
+
+    def updateChannels(self, worker, joined, left):
+        """
+        Apply the channels a worker joined and left to the channels. Changes
+        made on different workers at the same time are all kept.
+        """
+        left = set(map(normalizeChannel, left))
+        channels = [
+            c for c in self.settings.get(CHANNELS_KEY) or []
+            if normalizeChannel(c) not in left
+        ]
+        known = set(map(normalizeChannel, channels))
+        for channel in joined:
+            if normalizeChannel(channel) not in known:
+                known.add(normalizeChannel(channel))
+                channels.append(channel)
+        self.settings.set(CHANNELS_KEY, channels)
+
+        # the sender too, it may not know about the other workers' changes
+        self.broadcast(('set', CHANNELS_KEY, channels))
+        # the sender may have joined a channel another worker owns
+        self.rebalance(worker)
+
+    def workerReady(self, worker, worker_id):
+        logging.info("Worker %d connected" % worker_id)
+        worker.worker_id = worker_id
+        self.workers[worker_id] = worker
+        self.crashes.pop(worker_id, None)
+
+        worker.send(('settings', self.settings.getAll()))
+        worker.send(('admins', self.admins))
+
+        self.ring.add(worker_id)
+        self.rebalance()
+
+    def workerLost(self, worker):
+        worker_id = worker.worker_id
+        if self.workers.get(worker_id) is not worker:
+            return
+        logging.warning("Worker %d disconnected" % worker_id)
+        del self.workers[worker_id]
+        self.assignments.pop(worker_id, None)
+        self.ring.remove(worker_id)
+        self.rebalance()
+
+    def broadcast(self, message, sender=None):
+        """Send the message to every worker except the sender."""
+        for worker in self.workers.values():
+            if worker is not sender:
+                worker.send(message)
+
+    def getAssignments(self):
+        """Returns a dict of worker id -> channels it should be in."""
+        assignments = dict([(worker_id, []) for worker_id in self.workers])
+        channels = self.settings.get(CHANNELS_KEY) or []
+        for channel in sorted(set(map(normalizeChannel, channels))):
+            worker_id = self.ring.get(channel)
+            if worker_id is not None:
+                assignments[worker_id].append(channel)
+        return assignments
+
+    def rebalance(self, worker=None):
+        """
+        Send every worker whose channels changed, and the given worker, its
+        channels.
+        """
+        for worker_id, channels in self.getAssignments().items():
+            if (self.assignments.get(worker_id) != channels or
+                    self.workers[worker_id] is worker):
+                self.assignments[worker_id] = channels
+                self.workers[worker_id].send(('assign', channels))
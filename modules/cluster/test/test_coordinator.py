@@ -0,0 +1,123 @@
+from modules.settings.base_settings import BaseSettings
+from tools import util
+
+from ..coordinator import Coordinator, normalizeChannel
+
+
+CHANNELS = ['#channel%d' % i for i in range(50)]
+
+
+class FakeWorker(object):
+    """Records the messages the coordinator sends a worker."""
+
+    def __init__(self):
+        self.worker_id = None
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def assigned(self):
+        assigns = [m[1] for m in self.sent if m[0] == 'assign']
+        return assigns[-1] if assigns else None
+
+
+class TestCoordinator(object):
+
+    def setup(self):
+        configuration = util.dictToObject({
+            'connection': {'host': 'localhost'},
+            'default_channels': CHANNELS
+        })
+        self.settings = BaseSettings()
+        self.coordinator = Coordinator(
+            configuration, self.settings, clock=None
+        )
+
+    def connect(self, worker_id):
+        worker = FakeWorker()
+        self.coordinator.messageReceived(worker, ('hello', worker_id))
+        return worker
+
+    def test_seeds_channels(self):
+        """Test the channels are seeded from the configuration."""
+        assert(self.settings.get('default_channels') == CHANNELS)
+
+    def test_normalize_channel(self):
+        """Test channel names get a prefix and are lower cased."""
+        assert(normalizeChannel('Yaib') == '#yaib')
+        assert(normalizeChannel('&Yaib') == '&yaib')
+
+    def test_hello(self):
+        """Test a new worker gets the settings and admins."""
+        worker = self.connect(0)
+        assert(worker.sent[0][0] == 'settings')
+        assert(worker.sent[0][1]['default_channels'] == CHANNELS)
+        assert(worker.sent[1] == ('admins', {}))
+        assert(sorted(worker.assigned()) == sorted(CHANNELS))
+
+    def test_spread(self):
+        """Test every channel is assigned to exactly one worker."""
+        workers = [self.connect(i) for i in range(3)]
+        assigned = sum([w.assigned() for w in workers], [])
+        assert(sorted(assigned) == sorted(CHANNELS))
+        for worker in workers:
+            assert(worker.assigned())
+
+    def test_worker_lost(self):
+        """Test a lost worker's channels move to the other workers."""
+        workers = [self.connect(i) for i in range(3)]
+        before = [list(w.assigned()) for w in workers]
+        self.coordinator.workerLost(workers[1])
+
+        assigned = workers[0].assigned() + workers[2].assigned()
+        assert(sorted(assigned) == sorted(CHANNELS))
+
+        # channels of the other workers stay put
+        assert(set(before[0]) <= set(workers[0].assigned()))
+        assert(set(before[2]) <= set(workers[2].assigned()))
+
+    def test_set_broadcast(self):
+        """Test settings from a worker are saved and sent to the others."""
+        first, second = self.connect(0), self.connect(1)
+        self.coordinator.messageReceived(
+            first, ('set', 'example.thing', 1, False)
+        )
+        assert(self.settings.get('example.thing') == 1)
+        assert(second.sent[-1] == ('set', 'example.thing', 1))
+        assert(('set', 'example.thing', 1) not in first.sent)
+
+    def test_channels_rebalanced(self):
+        """Test changing the channels assigns them."""
+        first, second = self.connect(0), self.connect(1)
+        self.coordinator.messageReceived(
+            first, ('set', 'default_channels', ['Yaib', '#yaib'], False)
+        )
+        assigned = first.assigned() + second.assigned()
+        assert(assigned == ['#yaib'])
+
+    def test_concurrent_channel_changes(self):
+        """Test joins and parts on different workers are all kept."""
+        first, second = self.connect(0), self.connect(1)
+        self.coordinator.messageReceived(first, ('channels', ['#new'], []))
+        self.coordinator.messageReceived(
+            second, ('channels', ['#other'], ['#Channel0'])
+        )
+        channels = self.settings.get('default_channels')
+        assert(channels == CHANNELS[1:] + ['#new', '#other'])
+
+        # every worker, the senders too, gets the merged channels
+        assert(('set', 'default_channels', channels) in first.sent)
+        assert(('set', 'default_channels', channels) in second.sent)
+
+        assigned = first.assigned() + second.assigned()
+        assert(sorted(assigned) == sorted(channels))
+
+    def test_admins(self):
+        """Test admin sessions are kept and sent to new workers."""
+        first = self.connect(0)
+        self.coordinator.messageReceived(
+            first, ('admins', {'keeyai': ('user', 100)})
+        )
+        second = self.connect(1)
+        assert(('admins', {'keeyai': ('user', 100)}) in second.sent)
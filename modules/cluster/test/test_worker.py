@@ -0,0 +1,74 @@
+from tools import util
+
+from ..worker import ClusterSettings, ClusterClient
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class TestClusterSettings(object):
+
+    def setup(self):
+        self.settings = ClusterSettings(util.dictToObject({}))
+        self.client = self.settings.client = FakeClient()
+
+    def test_set_forwarded(self):
+        """Test local changes are sent to the coordinator."""
+        self.settings.set('example.thing', 1, initial=True)
+        assert(self.settings.get('example.thing') == 1)
+        assert(self.client.sent == [('set', 'example.thing', 1, True)])
+
+    def test_apply_not_forwarded(self):
+        """Test changes from the coordinator are not sent back."""
+        self.settings.apply('example.thing', 1)
+        assert(self.settings.get('example.thing') == 1)
+        assert(self.client.sent == [])
+
+    def test_replace(self):
+        """Test the coordinator's settings replace the local ones."""
+        self.settings.set('example.thing', 1)
+        self.settings.replace({'nick': 'yaib'})
+        assert(self.settings.get('example.thing') is None)
+        assert(self.settings.get('nick') == 'yaib')
+
+    def test_channel_changes(self):
+        """Test channel changes are sent as the channels joined and left."""
+        self.settings.replace({'default_channels': ['#a', '#b']})
+        channels = self.settings.get('default_channels')
+        channels.append('#c')
+        self.settings.set('default_channels', channels)
+        channels.remove('#a')
+        self.settings.set('default_channels', channels)
+        self.settings.set('default_channels', channels)
+        assert(self.client.sent == [
+            ('channels', ['#c'], []),
+            ('channels', [], ['#a'])
+        ])
+
+        # changes from the coordinator are the new base
+        self.settings.apply('default_channels', ['#b', '#c', '#d'])
+        self.settings.set('default_channels', ['#b', '#d'])
+        assert(self.client.sent[-1] == ('channels', [], ['#c']))
+
+
+class TestClusterClient(object):
+
+    def setup(self):
+        self.client = ClusterClient(None, 3, util.dictToObject({}))
+
+    def test_format_nick(self):
+        """Test each worker gets its own nick."""
+        assert(self.client.formatNick('yaib') == 'yaib3')
+
+    def test_releasing(self):
+        """Test channels moved to another worker are only released once."""
+        self.client._releasing.add('#yaib')
+        assert(self.client.isReleasing('#Yaib'))
+        assert(not self.client.isReleasing('#yaib'))
+
@@ -0,0 +1,223 @@
+import logging
+
+from twisted.internet import reactor, protocol
+
+from modules.dispatch.process_plugin import encodeMessage, MessageDecoder
+from modules.settings.json_settings import JsonSettings
+from tools.eventbus import pub
+from coordinator import CHANNELS_KEY, getClusterConfig, normalizeChannel
+
+
+class ClusterSettings(JsonSettings):
+    """
+    Settings for a cluster worker. The coordinator owns the settings file:
+    changes are applied locally and sent to the coordinator, which saves
+    them and passes them on to the other workers.
+
+    Changes to the channels are sent as the channels joined and left rather
+    than the whole list, so joins and parts handled by different workers at
+    the same time do not overwrite each other.
+    """
+
+    def __init__(self, configuration={}):
+        super(ClusterSettings, self).__init__(configuration)
+        self.client = None
+
+        # the channels as last sent to or received from the coordinator
+        self._channels = []
+
+    def loadSettings(self):
+        loaded = super(ClusterSettings, self).loadSettings()
+        self._channels = list(self.get(CHANNELS_KEY) or [])
+        return loaded
+
+    def saveSettings(self):
+        """The coordinator saves the settings."""
+        pub.sendMessage('settings:saved')
+        return True
+
+    def set(self, key, value, initial=False, more=False):
+        super(ClusterSettings, self).set(key, value, initial, more)
+        if key == CHANNELS_KEY:
+            message = self._getChannelChanges()
+        else:
+            message = ('set', key, value, initial)
+        if message is not None and self.client is not None:
+            self.client.send(message)
+
+    def _getChannelChanges(self):
+        """Returns ('channels', joined, left), or None if nothing changed."""
+        # yaib changes the list in place, compare with a copy
+        channels = list(self.get(CHANNELS_KEY) or [])
+        joined = [c for c in channels if c not in self._channels]
+        left = [c for c in self._channels if c not in channels]
+        self._channels = channels
+        if joined or left:
+            return ('channels', joined, left)
+        return None
+
+    def apply(self, key, value):
+        """Set a setting changed by another worker without sending it on."""
+        super(ClusterSettings, self).set(key, value)
+        if key == CHANNELS_KEY:
+            self._channels = list(value or [])
+
+    def replace(self, settings):
+        """Replace every setting with the coordinator's."""
+        self._settings = settings
+        self._channels = list(self.get(CHANNELS_KEY) or [])
+        self._changed = None
+        self.afterUpdate()
+
+
+class ClusterClientProtocol(protocol.Protocol):
+
+    def __init__(self, client):
+        self.client = client
+        self.decoder = MessageDecoder()
+
+    def connectionMade(self):
+        self.client.connected(self)
+
+    def send(self, message):
+        self.transport.write(encodeMessage(message))
+
+    def dataReceived(self, data):
+        for message in self.decoder.feed(data):
+            self.client.messageReceived(message)
+
+    def connectionLost(self, reason):
+        self.client.disconnected(reason)
+
+
+class ClusterClientFactory(protocol.ClientFactory):
+
+    def __init__(self, client):
+        self.client = client
+
+    def buildProtocol(self, addr):
+        return ClusterClientProtocol(self.client)
+
+    def clientConnectionFailed(self, connector, reason):
+        self.client.disconnected(reason)
+
+
+class ClusterClient(object):
+    """
+    A worker's connection to the coordinator (see Coordinator). Keeps the
+    settings and admin sessions in sync and joins and leaves channels as
+    the coordinator assigns them. The worker quits if the coordinator goes
+    away.
+    """
+
+    def __init__(self, yaib, worker_id, configuration):
+        self.yaib = yaib
+        self.worker_id = worker_id
+        self.socket_path = getClusterConfig(configuration)[0]
+        self.nick_format = (
+            configuration.cluster and configuration.cluster.nick_format or
+            '{nick}{worker}'
+        )
+
+        self.connection = None
+        self.assigned = []
+        self.quitting = False
+
+        # channels being left because they moved to another worker
+        self._releasing = set()
+
+        # messages sent before the coordinator connection is made
+        self._queue = []
+
+        pub.subscribe(self.onAdminLogin, 'admin:login')
+        pub.subscribe(self.onAdminLogout, 'admin:logout')
+
+    def formatNick(self, nick):
+        """Returns this worker's version of the nick."""
+        return self.nick_format.format(nick=nick, worker=self.worker_id)
+
+    def connect(self, clock=reactor):
+        clock.connectUNIX(self.socket_path, ClusterClientFactory(self))
+        clock.addSystemEventTrigger('before', 'shutdown', self.stop)
+
+    def stop(self):
+        """Called when the worker is shutting down."""
+        self.quitting = True
+
+    def connected(self, connection):
+        self.connection = connection
+
+        # settings changed while connecting are in the snapshot sent back
+        queue, self._queue = self._queue, []
+        for message in queue:
+            connection.send(message)
+        connection.send(('hello', self.worker_id))
+
+    def disconnected(self, reason):
+        self.connection = None
+        if self.quitting:
+            return
+        self.quitting = True
+        logging.error(
+            "Lost the connection to the coordinator (%s). Quitting." % (
+                reason.value
+            )
+        )
+        self.yaib.quit()
+
+    def send(self, message):
+        if self.connection is None:
+            self._queue.append(message)
+        else:
+            self.connection.send(message)
+
+    def messageReceived(self, message):
+        kind = message[0]
+        if kind == 'settings':
+            self.yaib.settings.replace(message[1])
+        elif kind == 'set':
+            self.yaib.settings.apply(message[1], message[2])
+        elif kind == 'admins':
+            self.yaib.adminManager.restoreSessions(message[1])
+        elif kind == 'assign':
+            self.assign(message[1])
+        elif kind == 'quit':
+            self.quitting = True
+            self.yaib.quit()
+        else:
+            logging.warning("Unknown message from coordinator: %r" % (kind,))
+
+    def onAdminLogin(self, nick, user, expiration):
+        self.send(('admins', {nick: (user, expiration)}))
+
+    def onAdminLogout(self, nick):
+        self.send(('admins', {nick: (None, 0)}))
+
+    def assign(self, channels):
+        """Join the assigned channels and leave the rest."""
+        self.assigned = list(channels)
+
+        network = self.yaib.primary_network
+        if network.connection is None:
+            # joined once connected
+            return
+
+        joined = set(map(normalizeChannel, network.channels))
+        for channel in channels:
+            if channel not in joined:
+                network.connection.join(str(channel))
+        for channel in list(network.channels):
+            if normalizeChannel(channel) not in channels:
+                self._releasing.add(normalizeChannel(channel))
+                network.connection.leave(str(channel))
+
+    def isReleasing(self, channel):
+        """
+        Returns True, once, if the channel is being left because it moved to
+        another worker, rather than removed from the channels.
+        """
+        channel = normalizeChannel(channel)
+        if channel in self._releasing:
+            self._releasing.remove(channel)
+            return True
+        return False
@@ -0,0 +1,84 @@
+"""
+Hands the live IRC connections over to a new yaib process, so yaib can be
+restarted with new code without disconnecting (see Yaib.upgrade).
+
+The old process stops reading from its connections, waits until everything
+it queued has been sent, saves the runtime state and the connections' file
+descriptors to a state file and execs `yaib.py --resume <state file>`. The
+descriptors survive exec, and the new process adopts them without
+registering again.
+"""
+
+import os
+import sys
+import fcntl
+import logging
+import tempfile
+import cPickle as pickle
+
+
+RESUME_ARGUMENT = '--resume'
+
+# seconds to wait for queued messages to be sent before handing over
+DRAIN_TIMEOUT = 10
+
+
+def keepOpenOnExec(fd):
+    """Clear FD_CLOEXEC so the descriptor is inherited by exec."""
+    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+    fcntl.fcntl(fd, fcntl.F_SETFD, flags & ~fcntl.FD_CLOEXEC)
+
+
+def isDrained(connection):
+    """Returns True once the connection has nothing left to send."""
+    transport = connection.transport
+    return not (
+        connection.queued or
+        transport.dataBuffer or
+        transport._tempDataBuffer
+    )
+
+
+def getConnectionState(connection, channels):
+    """
+    Returns what a new process needs to adopt the connection, including the
+    data read from the server but not handled yet. Keeps the socket open
+    across exec.
+    """
+    fd = connection.transport.fileno()
+    keepOpenOnExec(fd)
+    return {
+        'fd': fd,
+        'family': connection.transport.socket.family,
+        'nickname': connection.nickname,
+        'channels': list(channels),
+        'supported': connection.supported,
+        'buffer': connection._buffer
+    }
+
+
+def saveState(state):
+    """Saves the state to a new file and returns its path."""
+    fd, path = tempfile.mkstemp(prefix='yaib-', suffix='.state')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def loadState(path):
+    """Loads and removes the state file."""
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    os.remove(path)
+    return state
+
+
+def execute(state, script):
+    """Replace this process with `script --resume`, never returns."""
+    path = saveState(state)
+    logging.info("Handing over to a new process with state %s" % path)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(
+        sys.executable, [sys.executable, script, RESUME_ARGUMENT, path]
+    )
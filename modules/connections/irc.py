@@ -6,6 +6,7 @@ Assumes several things about available functions on
 the factory
 """
 
+import os
 import time
 import string
 
@@ -13,11 +14,12 @@ from twisted.words.protocols import irc
 from twisted.internet import reactor, protocol
 from kitchen.text.converters import to_bytes
 
-from pubsub import pub
+from tools.eventbus import pub
+from modules.dispatch import Event
 
 
-def connectToServer(connection_config, nick):
-    factory = IRCFactory(
+def createFactory(factory_class, connection_config, nick, network):
+    return factory_class(
         connection_config.host,
         connection_config.port,
         nick,
@@ -25,20 +27,129 @@ def connectToServer(connection_config, nick):
         connection_config.max_flood,
         connection_config.flood_interval,
         connection_config.flood_wait,
-        connection_config.keepalive_delay
+        connection_config.keepalive_delay,
+        network=network
     )
+
+
+def connectToServer(connection_config, nick, network=None):
+    factory = createFactory(IRCFactory, connection_config, nick, network)
     reactor.connectTCP(connection_config.host, connection_config.port, factory)
     return factory
 
 
+def connectHelper(connection_config, nick, network):
+    """
+    Connect a helper with the given nick, used by the network to send
+    channel messages (see networks.Network.getSender).
+    """
+    factory = createFactory(HelperIRCFactory, connection_config, nick, network)
+    reactor.connectTCP(connection_config.host, connection_config.port, factory)
+    return factory
+
+
+def adoptConnection(connection_config, nick, network, state, helper=False):
+    """
+    Adopt a connection handed over by the previous yaib process (see
+    handoff.getConnectionState). It is already registered, so it is
+    published as `resumed` instead of `connected`.
+    """
+    factory = createFactory(
+        HelperIRCFactory if helper else IRCFactory,
+        connection_config,
+        nick,
+        network
+    )
+    factory.resume = state
+    reactor.adoptStreamConnection(state['fd'], state['family'], factory)
+
+    # the reactor uses its own copy of the descriptor
+    os.close(state['fd'])
+    return factory
+
+
 def start():
     reactor.run()
 
 
+def stop():
+    """Stops the reactor when there is no connection to quit."""
+    reactor.stop()
+
+
+def getClock():
+    """Returns the reactor clock used to schedule delayed calls."""
+    return reactor
+
+
 class YaibTwistedIRCProtocol(irc.IRCClient):
     # http://twistedmatrix.com/documents/8.2.0/api/twisted.words.protocols.irc.IRCClient.html
 
     messages = []
+    queued = 0
+    adopted = False
+
+    def connectionMade(self):
+        # flood state belongs to each connection
+        self.messages = []
+        self.queued = 0
+
+        # handed over from the previous process, already registered
+        state, self.factory.resume = self.factory.resume, None
+        if state is not None:
+            self.adopted = True
+            self.performLogin = False
+            self._registered = True
+            self.nickname = state['nickname']
+
+        irc.IRCClient.connectionMade(self)
+        if state is not None:
+            self.resumed(state)
+
+    def resumed(self, state):
+        """Called instead of signedOn for an adopted connection."""
+        self.supported = state['supported']
+        self.factory.resetDelay()
+        self.publish(
+            'resumed', connection=self, channels=state['channels']
+        )
+        self.keepAlive()
+
+        # lines the previous process read but did not handle
+        if state['buffer']:
+            self.dataReceived(state['buffer'])
+
+    def connectionLost(self, reason):
+        irc.IRCClient.connectionLost(self, reason)
+
+        # adopted connections have no connector for the factory to retry
+        if self.adopted:
+            reactor.callLater(
+                self.factory.initialDelay,
+                reactor.connectTCP,
+                self.factory.host,
+                self.factory.port,
+                self.factory
+            )
+
+    def getLoad(self):
+        """
+        Returns (queued messages, messages sent in the flood interval), lower
+        is better when choosing a connection to send with.
+        """
+        now = time.time()
+        recent = 0
+        for sent in self.messages:
+            if now - sent >= self.factory.flood_interval:
+                break
+            recent += 1
+        return (self.queued, recent)
+
+    def createEvent(self, user, **kwargs):
+        """Create the Event record for a line from this network."""
+        return Event.fromUser(
+            user, network=self.factory.network_name, **kwargs
+        )
 
     def sendMessage(self, channel, message):
         """
@@ -52,9 +163,10 @@ class YaibTwistedIRCProtocol(irc.IRCClient):
 
             # if we are flooded, queue this send
             if time.time() - flood_time < self.factory.flood_interval:
+                self.queued += 1
                 reactor.callLater(
                     self.factory.flood_wait,
-                    self.sendMessage,
+                    self.sendQueued,
                     *[channel, message]
                 )
                 return False
@@ -65,6 +177,10 @@ class YaibTwistedIRCProtocol(irc.IRCClient):
 
         self.msg(to_bytes(channel), to_bytes(message))
 
+    def sendQueued(self, channel, message):
+        self.queued -= 1
+        return self.sendMessage(channel, message)
+
     def describe(self, channel, action):
         irc.IRCClient.describe(self, to_bytes(channel), to_bytes(action))
 
@@ -180,83 +296,65 @@ class YaibTwistedIRCProtocol(irc.IRCClient):
         self.publish('messageOfTheDay', message=motd)
 
     def action(self, user, channel, action):
+        if self.isIgnored(user):
+            return
         self.publish(
             'userAction',
-            user=user,
-            nick=self.getNickFromUser(user),
-            channel=channel,
-            action=action
+            event=self.createEvent(user, channel=channel, message=action)
         )
 
     def noticed(self, user, channel, message):
+        if self.isIgnored(user):
+            return
         self.publish(
             'notification',
-            user=user,
-            nick=self.getNickFromUser(user),
-            channel=channel,
-            message=message
+            event=self.createEvent(user, channel=channel, message=message)
         )
 
-    def privateMessage(self, user, nick, message):
+    def privateMessage(self, event):
         # notify yaib
-        self.publish(
-            'privateMessage',
-            user=user,
-            nick=nick,
-            message=message
-        )
+        self.publish('privateMessage', event=event)
 
-    def directMessage(self, user, nick, channel, message):
-        self.publish(
-            'directMessage',
-            user=user,
-            nick=nick,
-            channel=channel,
-            message=message
-        )
+    def directMessage(self, event):
+        self.publish('directMessage', event=event)
 
-    def command(self, user, nick, channel, command, more):
+    def command(self, event):
         """Called when a user appears to issue a command."""
-        self.publish(
-            'command',
-            user=user,
-            nick=nick,
-            channel=channel,
-            command=command,
-            more=more
-        )
+        self.publish('command', event=event)
 
-    def message(self, user, nick, channel, message, highlight=False):
+    def message(self, event):
         """Called with every normal message said in each channel to
         which yaib is connected (not actions, commands, or PMs)."""
-        self.publish(
-            'message',
-            user=user,
-            nick=nick,
-            channel=channel,
-            message=message,
-            highlight=highlight
-        )
+        self.publish('message', event=event)
+
+    def isIgnored(self, user):
+        """Returns True for lines from yaib's own helper connections."""
+        ignored = self.factory.ignored
+        return bool(ignored) and self.getNickFromUser(user).lower() in ignored
 
     # all incoming text goes through this poorly named function
     def privmsg(self, user, channel, message):
+        if self.isIgnored(user):
+            return
+
         # convert text to unicode before anything else happens
         user = to_bytes(user)
         channel = to_bytes(channel)
         message = to_bytes(message)
 
-        nick, x, nick_host = user.partition('!')
+        # create the single record passed through the rest of yaib
+        event = self.createEvent(user, channel=channel, message=message)
 
         # private message
         if channel == self.nickname:
-            self.privateMessage(user, nick, message)
+            self.privateMessage(event)
 
         # not private message
         else:
 
             # if message starts with bot name, call it a command
             if message.lower().startswith(self.nickname):
-                self.directMessage(user, nick, channel, message)
+                self.directMessage(event)
 
             # if message starts with command prefix, call it a command
             elif message.startswith(self.factory.command_prefix):
@@ -265,16 +363,14 @@ class YaibTwistedIRCProtocol(irc.IRCClient):
                 message = message[len(self.factory.command_prefix):]
 
                 # split it into command name and the arguments
-                command, x, more = message.partition(' ')
+                event.command, x, event.more = message.partition(' ')
 
-                self.command(user, nick, channel, command, more)
+                self.command(event)
 
             else:
                 # just a regular message
-                if message.find(self.factory.nick) >= 0:
-                    self.message(user, nick, channel, message, True)
-                else:
-                    self.message(user, nick, channel, message, False)
+                event.highlight = message.find(self.factory.nick) >= 0
+                self.message(event)
 
     def joined(self, channel):
         self.publish('joined', channel=channel)
@@ -291,63 +387,43 @@ class YaibTwistedIRCProtocol(irc.IRCClient):
             message=message
         )
 
-    def userJoined(self, user, nick, channel):
-        self.publish(
-            'userJoined',
-            user=user,
-            nick=nick,
-            channel=channel
-        )
+    def userJoined(self, event):
+        self.publish('userJoined', event=event)
 
     # overwrite default irc_JOIN in order to send user
     def irc_JOIN(self, prefix, params):
         """
         Called when a user joins a channel.
         """
-        user = prefix
-        nick = self.getNickFromUser(user)
-        channel = params[-1]
-        if nick == self.nickname:
-            self.joined(channel)
-        else:
-            self.userJoined(user, nick, channel)
+        event = self.createEvent(prefix, channel=params[-1])
+        if event.nick == self.nickname:
+            self.joined(event.channel)
+        elif not self.isIgnored(prefix):
+            self.userJoined(event)
 
-    def userLeft(self, user, nick, channel):
-        self.publish(
-            'userLeft',
-            user=user,
-            nick=nick,
-            channel=channel
-        )
+    def userLeft(self, event):
+        self.publish('userLeft', event=event)
 
     # overwrite default irc_PART in order to send user
     def irc_PART(self, prefix, params):
         """
         Called when a user leaves a channel.
         """
-        user = prefix
-        nick = self.getNickFromUser(user)
-        channel = params[0]
-        if nick == self.nickname:
-            self.left(channel)
-        else:
-            self.userLeft(user, nick, channel)
+        event = self.createEvent(prefix, channel=params[0])
+        if event.nick == self.nickname:
+            self.left(event.channel)
+        elif not self.isIgnored(prefix):
+            self.userLeft(event)
 
-    def userQuit(self, user, nick, quitMessage):
-        self.publish(
-            'userQuit',
-            user=user,
-            nick=nick,
-            quitMessage=quitMessage
-        )
+    def userQuit(self, event):
+        self.publish('userQuit', event=event)
 
     def irc_QUIT(self, prefix, params):
         """
         Called when a user has quit.
         """
-        user = prefix
-        nick = self.getNickFromUser(user)
-        self.userQuit(user, nick, params[0])
+        if not self.isIgnored(prefix):
+            self.userQuit(self.createEvent(prefix, message=params[0]))
 
     def irc_KICK(self, prefix, params):
         """
@@ -460,7 +536,7 @@ class IRCFactory(protocol.ReconnectingClientFactory):
     def __init__(
             self, host, port, nick, command_prefix,
             max_flood, flood_interval, flood_wait, keepalive_delay,
-            *args, **kwargs):
+            network=None, *args, **kwargs):
         # protocol.ReconnectingClientFactory.__init__(self, *args, **kwargs)
 
         # store settings
@@ -473,9 +549,71 @@ class IRCFactory(protocol.ReconnectingClientFactory):
         self.flood_wait = flood_wait
         self.keepalive_delay = keepalive_delay
 
+        # the networks.Network of this connection, its name is sent with
+        # every event
+        self.network = network
+        self.network_name = network.name if network is not None else None
+
+        # lowercase nicks of yaib's helper connections, never handled
+        self.ignored = set()
+
+        # state of a connection to adopt (see adoptConnection)
+        self.resume = None
+
+        # event name -> pre-resolved event bus topic
+        self._topics = {}
+
     @property
     def command_prefix(self):
         return self.command_prefix
 
     def publish(self, eventName, *args, **kwargs):
-        pub.sendMessage('connection:%s' % eventName, **kwargs)
+        topic = self._topics.get(eventName)
+        if topic is None:
+            topic = pub.getTopic('connection:%s' % eventName)
+            self._topics[eventName] = topic
+        topic.send(network=self.network_name, **kwargs)
+
+
+class HelperIRCProtocol(YaibTwistedIRCProtocol):
+    """
+    A connection only used to send channel messages for its network, to
+    spread the output over more flood budgets. Joins the same channels as
+    the main connection and ignores everything it receives.
+    """
+
+    def connectionMade(self):
+        self.nickname = to_bytes(self.factory.nick)
+        self.channels = set()
+        YaibTwistedIRCProtocol.connectionMade(self)
+
+    def connectionLost(self, reason):
+        self.factory.network.removeHelper(self)
+        YaibTwistedIRCProtocol.connectionLost(self, reason)
+
+    def signedOn(self):
+        self.factory.resetDelay()
+        self.factory.network.addHelper(self)
+        self.keepAlive()
+
+    def resumed(self, state):
+        self.channels = set(state['channels'])
+        self.factory.resetDelay()
+        self.factory.network.addHelper(self)
+        self.keepAlive()
+
+    def joined(self, channel):
+        self.channels.add(channel.lower())
+
+    def left(self, channel):
+        self.channels.discard(channel.lower())
+
+    def kickedFrom(self, channel, kicker, kicker_user, message):
+        self.channels.discard(channel.lower())
+
+    def publish(self, eventName, *args, **kwargs):
+        pass
+
+
+class HelperIRCFactory(IRCFactory):
+    protocol = HelperIRCProtocol
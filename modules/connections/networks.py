@@ -0,0 +1,111 @@
+"""
+Support for connecting to several IRC networks at once.
+
+`connection` in the configuration can be a single network or a list of them.
+Each network gets its own connection (and flood limits), and every event
+from the connection is handled with its network as the current network, so
+replies go back to the network the event came from.
+"""
+
+from twisted.python import context
+
+from tools import util
+
+
+class Network(object):
+    """One IRC network and yaib's connection to it."""
+
+    def __init__(self, name, config, primary=False):
+        self.name = name
+        self.config = config
+        self.primary = primary
+
+        self.factory = None
+        self.connection = None
+        self.channels = []
+
+        # signed on helper connections (see the `helpers` config)
+        self.helpers = []
+
+    @property
+    def channels_key(self):
+        """The setting holding the channels to join on this network."""
+        if self.primary:
+            return 'default_channels'
+        return 'networks.%s.default_channels' % self.name.replace('.', '_')
+
+    @property
+    def helper_nicks(self):
+        """The nicks of the helper connections from the config."""
+        return util.toList(self.config.helpers or [])
+
+    def addHelper(self, helper):
+        """Called when a helper signs on, joins it to our channels."""
+        self.helpers.append(helper)
+        for channel in self.channels:
+            if channel.lower() not in helper.channels:
+                helper.join(channel)
+
+    def removeHelper(self, helper):
+        if helper in self.helpers:
+            self.helpers.remove(helper)
+
+    def joinHelpers(self, channel):
+        for helper in self.helpers:
+            helper.join(channel)
+
+    def leaveHelpers(self, channel):
+        for helper in self.helpers:
+            helper.leave(channel)
+
+    def getSender(self, channel):
+        """
+        Returns the connection to send a message to the target with. Private
+        messages use the main connection, channel messages use whichever of
+        the main connection and the helpers in the channel has the lowest
+        load: the fewest queued messages, then the fewest sent in the flood
+        interval (see getLoad), the main connection on ties. Returns None
+        if there is no connection to send with, eg while the main connection
+        is down.
+        """
+        sender = self.connection
+        if not self.helpers or channel[:1] not in '&#!+':
+            return sender
+
+        channel = channel.lower()
+        load = sender.getLoad() if sender is not None else None
+        for helper in self.helpers:
+            if channel in helper.channels:
+                helper_load = helper.getLoad()
+                if sender is None or helper_load < load:
+                    sender, load = helper, helper_load
+        return sender
+
+    def __repr__(self):
+        return '<Network %s>' % self.name
+
+
+def getNetworkConfigs(connection_config):
+    """
+    Returns a list of (name, config) for every network in the connection
+    configuration, which can be a single network or a list of them. Networks
+    are named by their `name`, defaulting to their host.
+    """
+    if isinstance(connection_config, list):
+        configs = [util.dictToObject(c) for c in connection_config]
+    else:
+        configs = [connection_config]
+    return [(c.name or c.host, c) for c in configs]
+
+
+def getCurrentNetwork():
+    """Returns the network the current event came from, if any."""
+    return context.get(Network)
+
+
+def callInNetwork(network, func, *args, **kwargs):
+    """
+    Call func with network as the current network. Blocking handlers started
+    from func (see ThreadOffloader) keep the same current network.
+    """
+    return context.call({Network: network}, func, *args, **kwargs)
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import socket
+import tempfile
+import subprocess
+
+from .. import handoff
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__)
+))))
+
+
+class FakeTransport(object):
+
+    def __init__(self, data=''):
+        self.dataBuffer = data
+        self._tempDataBuffer = []
+
+
+class FakeConnection(object):
+
+    def __init__(self, queued=0, data=''):
+        self.queued = queued
+        self.transport = FakeTransport(data)
+
+
+class TestHandoff(object):
+
+    def test_keep_open_on_exec(self):
+        """Test descriptors are made to survive exec."""
+        read, write = os.pipe()
+        try:
+            fcntl.fcntl(read, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+            handoff.keepOpenOnExec(read)
+            assert(not fcntl.fcntl(read, fcntl.F_GETFD) & fcntl.FD_CLOEXEC)
+        finally:
+            os.close(read)
+            os.close(write)
+
+    def test_state_round_trip(self):
+        """Test the state file is loaded once then removed."""
+        state = {'admins': {'keeyai': ('user', 100)}, 'networks': {}}
+        path = handoff.saveState(state)
+        assert(handoff.loadState(path) == state)
+        assert(not os.path.exists(path))
+
+    def test_drained(self):
+        """Test connections are drained once nothing is left to send."""
+        assert(handoff.isDrained(FakeConnection()))
+        assert(not handoff.isDrained(FakeConnection(queued=1)))
+        assert(not handoff.isDrained(FakeConnection(data='PRIVMSG')))
+
+
+class FakeServer(object):
+    """Just enough of an IRC server to talk to a real yaib process."""
+
+    def __init__(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.server.settimeout(30)
+        self.port = self.server.getsockname()[1]
+        self.client = None
+        self.buffer = ''
+        self.received = []
+
+    def accept(self):
+        self.client, address = self.server.accept()
+        self.client.settimeout(30)
+
+    def send(self, line):
+        self.client.sendall(line + '\r\n')
+
+    def readUntil(self, text):
+        """Read lines until one containing text, returns the lines read."""
+        lines = []
+        while True:
+            while '\n' not in self.buffer:
+                data = self.client.recv(4096)
+                assert(data), 'connection closed waiting for %r' % text
+                self.buffer += data
+            line, self.buffer = self.buffer.split('\n', 1)
+            lines.append(line.rstrip('\r'))
+            if text in line:
+                self.received.extend(lines)
+                return lines
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.server.close()
+
+
+class TestUpgrade(object):
+    """Upgrades a real yaib process connected to a fake server."""
+
+    def setup(self):
+        self.server = FakeServer()
+        self.directory = tempfile.mkdtemp(prefix='yaib-test-')
+        with open(os.path.join(self.directory, 'config.json'), 'w') as f:
+            f.write(json.dumps({
+                'settings': {'module': 'json'},
+                'persistence': {
+                    'connection': 'sqlite:///%s' % os.path.join(
+                        self.directory, 'yaib.db'
+                    )
+                },
+                'plugins': {'root': os.path.join(ROOT, 'plugins')},
+                'connection': {
+                    'host': '127.0.0.1',
+                    'port': self.server.port,
+                    'max_flood': 10,
+                    'flood_interval': 1,
+                    'flood_wait': 1,
+                    'keepalive_delay': 60,
+                    'command_prefix': '!',
+                    'nick_command_delimiters': ' ,:'
+                },
+                'admin': {'enabled': True, 'admin_type': 'test'},
+                'nick': 'yaib',
+                'default_channels': ['#yaib']
+            }))
+
+        self.log = open(os.path.join(self.directory, 'yaib.log'), 'w+')
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'yaib.py')],
+            cwd=self.directory,
+            stdout=self.log,
+            stderr=subprocess.STDOUT
+        )
+
+    def teardown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.server.close()
+        self.log.close()
+        shutil.rmtree(self.directory)
+
+    def test_upgrade_keeps_connection(self):
+        """Test upgrading hands the connection to the new process."""
+        server = self.server
+        server.accept()
+        server.readUntil('USER')
+        server.send(':server 001 yaib :Welcome')
+        server.readUntil('JOIN #yaib')
+        server.send(':yaib!y@h JOIN #yaib')
+
+        server.send(':admin!u@h PRIVMSG #yaib :!upgrade')
+        server.readUntil('Upgrading...')
+
+        # read by the new process
+        server.send(':admin!u@h PRIVMSG #yaib :!plugins')
+        lines = server.readUntil('CorePlugin')
+
+        # the same connection is used without registering or joining again
+        for line in lines:
+            assert(not line.startswith(('NICK', 'USER', 'JOIN'))), line
+        server.server.settimeout(0.5)
+        try:
+            server.server.accept()
+            assert(False), 'yaib reconnected'
+        except socket.timeout:
+            pass
+
+        # still running, as the new process
+        assert(self.process.poll() is None)
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            self.log.seek(0)
+            if 'Resumed the connection' in self.log.read():
+                break
+            time.sleep(0.1)
+        else:
+            assert(False), 'yaib did not resume'
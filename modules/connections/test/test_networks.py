@@ -0,0 +1,110 @@
+from tools import util
+
+from .. import irc
+from ..networks import Network, getNetworkConfigs
+from ..networks import getCurrentNetwork, callInNetwork
+
+
+class TestNetworks(object):
+
+    def test_single_network(self):
+        """Test a single connection config is one network named by host."""
+        config = util.dictToObject({
+            'connection': {'host': 'irc.afternet.org', 'port': 6667}
+        })
+        networks = getNetworkConfigs(config.connection)
+        assert(len(networks) == 1)
+        assert(networks[0][0] == 'irc.afternet.org')
+        assert(networks[0][1].port == 6667)
+
+    def test_network_list(self):
+        """Test a list of connection configs are separate networks."""
+        config = util.dictToObject({
+            'connection': [
+                {'host': 'irc.afternet.org'},
+                {'host': 'irc.example.com', 'name': 'example'}
+            ]
+        })
+        names = [name for name, c in getNetworkConfigs(config.connection)]
+        assert(names == ['irc.afternet.org', 'example'])
+
+    def test_channels_key(self):
+        """Test only the primary network uses the default_channels key."""
+        assert(Network('a', None, True).channels_key == 'default_channels')
+        assert(
+            Network('irc.example.com', None).channels_key ==
+            'networks.irc_example_com.default_channels'
+        )
+
+    def test_current_network(self):
+        """Test the current network is set while calling a function."""
+        network = Network('example', None)
+        assert(getCurrentNetwork() is None)
+        assert(callInNetwork(network, getCurrentNetwork) is network)
+        assert(getCurrentNetwork() is None)
+
+
+class FakeConnection(object):
+
+    def __init__(self, load, channels=()):
+        self.load = load
+        self.channels = set(channels)
+
+    def getLoad(self):
+        return self.load
+
+    def join(self, channel):
+        self.channels.add(channel)
+
+
+class TestHelpers(object):
+
+    def setup(self):
+        self.network = Network('example', None, True)
+        self.network.connection = FakeConnection((0, 3))
+        self.network.channels = ['#yaib']
+
+    def test_no_helpers(self):
+        """Test everything is sent with the main connection by default."""
+        assert(self.network.getSender('#yaib') is self.network.connection)
+
+    def test_helpers_join_channels(self):
+        """Test helpers join the network's channels when they sign on."""
+        helper = FakeConnection((0, 0))
+        self.network.addHelper(helper)
+        assert(helper.channels == set(['#yaib']))
+
+    def test_least_loaded_sender(self):
+        """Test channel messages use the least loaded connection."""
+        busy = FakeConnection((1, 0), ['#yaib'])
+        idle = FakeConnection((0, 1), ['#yaib'])
+        elsewhere = FakeConnection((0, 0), ['#other'])
+        self.network.helpers = [busy, idle, elsewhere]
+        assert(self.network.getSender('#YAIB') is idle)
+        assert(self.network.getSender('#other') is elsewhere)
+
+    def test_private_messages(self):
+        """Test private messages always use the main connection."""
+        self.network.helpers = [FakeConnection((0, 0), ['#yaib'])]
+        assert(self.network.getSender('nick') is self.network.connection)
+
+    def test_main_connection_down(self):
+        """Test helpers are used while the main connection is down."""
+        helper = FakeConnection((2, 0), ['#yaib'])
+        self.network.addHelper(helper)
+        self.network.connection = None
+        assert(self.network.getSender('#yaib') is helper)
+        assert(self.network.getSender('#other') is None)
+        assert(self.network.getSender('nick') is None)
+
+    def test_factories_share_network(self):
+        """Test main and helper factories hold the Network, events its name."""
+        config = util.dictToObject({'host': 'irc.example.com', 'port': 6667})
+        network = Network('example', config)
+        for factory_class in [irc.IRCFactory, irc.HelperIRCFactory]:
+            factory = irc.createFactory(factory_class, config, 'yaib', network)
+            assert(factory.network is network)
+            assert(factory.network_name == 'example')
+        assert(irc.createFactory(
+            irc.IRCFactory, config, 'yaib', None
+        ).network_name is None)
@@ -0,0 +1,14 @@
+from command_registry import CommandRegistry
+from hook_registry import HookRegistry, STOP_PROPAGATION
+from channel_router import ChannelRouter
+from event import Event
+from batching import EventBatcher
+from threads import ThreadOffloader, blocking, inReactorThread
+from process_plugin import ProcessPlugin
+from lazy_plugin import LazyPlugin, PluginManifest
+from plugin_loader import PluginLoader
+from help_index import HelpIndex
+from inflight import InFlightTracker
+from memoize import MemoCache, memoize, getCaches, normalizeArgument
+from watchdog import Watchdog
+from circuit_breaker import CircuitBreaker
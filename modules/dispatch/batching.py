@@ -0,0 +1,145 @@
+import logging
+
+from event import Event
+
+
+class BatchBuffer(object):
+    """
+    Buffers the events for one batched hook of one plugin.
+
+    The buffer is subscribed to the underlying hook like any other handler
+    and calls the batch handler with the list of buffered items when it is
+    full or when `interval` seconds have passed since the first buffered
+    item. Items are Event records for hooks that have them, otherwise the
+    tuple of positional arguments.
+    """
+
+    def __init__(self, owner, hook, handler, clock, size, interval,
+                 track=None, schedule=None):
+        self.owner = owner
+        self.hook = hook
+        self.takes_event = hook in Event.HOOK_FIELDS
+        self.handler = handler
+        self.clock = clock
+        self.size = size
+        self.interval = interval
+        # optional track(owner, name, result) for asynchronous results
+        self.track = track
+        # optional schedule(owner, delay, func) used instead of the clock
+        self.schedule = schedule
+
+        self.items = []
+        self.timer = None
+
+    def __call__(self, *args):
+        self.items.append(args[0] if self.takes_event else args)
+
+        if len(self.items) >= self.size:
+            self.flush()
+        elif self.timer is None:
+            if self.schedule is not None:
+                self.timer = self.schedule(
+                    self.owner, self.interval, self.flush
+                )
+            else:
+                self.timer = self.clock.callLater(self.interval, self.flush)
+
+    def cancel(self):
+        if self.timer is not None:
+            if self.timer.active():
+                self.timer.cancel()
+            self.timer = None
+
+    def flush(self):
+        """Deliver the buffered items to the batch handler."""
+        self.cancel()
+        if not self.items:
+            return
+
+        items, self.items = self.items, []
+        try:
+            result = self.handler(items)
+        # running plugin command - catch everything
+        except Exception as e:
+            logging.error(
+                "Exception running {} in plugin {}: {}".format(
+                    self.hook + 'Batch',
+                    self.owner.name,
+                    repr(e)
+                )
+            )
+        else:
+            if result is not None and self.track is not None:
+                self.track(self.owner, self.hook + 'Batch', result)
+
+
+class EventBatcher(object):
+    """
+    Opt in micro-batching for plugins that log, count or index events.
+
+    A plugin that implements `<hook>Batch(items)`, eg `onMessageBatch`, gets
+    a BatchBuffer subscribed to `<hook>` in the hook registry. Events are
+    buffered per plugin and delivered together when `batch_size` events are
+    waiting or `batch_interval` seconds after the first one arrived, using
+    the reactor clock, or `schedule` if given (eg Yaib.callLaterFor, so
+    the flush runs in the network of the first event and is cancelled with
+    its plugin). Buffers are always flushed before their plugin is
+    unregistered (reload) and on shutdown.
+    """
+
+    SUFFIX = 'Batch'
+    DEFAULT_SIZE = 100
+    DEFAULT_INTERVAL = 5
+
+    def __init__(self, hooks, clock, wrap=None, track=None, schedule=None):
+        self._hooks = hooks
+        self._clock = clock
+        # optional wrap(owner, handler) applied to each batch handler
+        self._wrap = wrap
+        # optional track(owner, name, result), eg InFlightTracker.track
+        self._track = track
+        # optional schedule(owner, delay, func) for the flush timers
+        self._schedule = schedule
+        self._buffers = {}
+
+    def register(self, owner):
+        """Subscribe a buffer for every batched hook owner implements."""
+        size = getattr(owner, 'batch_size', self.DEFAULT_SIZE)
+        interval = getattr(owner, 'batch_interval', self.DEFAULT_INTERVAL)
+
+        for attribute in dir(owner):
+            if (not attribute.startswith('on') or
+                    not attribute.endswith(self.SUFFIX)):
+                continue
+            handler = getattr(owner, attribute)
+            if not callable(handler):
+                continue
+
+            if self._wrap is not None:
+                handler = self._wrap(owner, handler)
+
+            hook = attribute[:-len(self.SUFFIX)]
+            buffer = BatchBuffer(
+                owner, hook, handler, self._clock, size, interval,
+                self._track, self._schedule
+            )
+            self._buffers.setdefault(owner, []).append(buffer)
+            self._hooks.subscribe(
+                hook, owner, buffer, takes_event=buffer.takes_event
+            )
+
+    def unregister(self, owner):
+        """Flush and forget owner's buffers."""
+        for buffer in self._buffers.pop(owner, []):
+            buffer.flush()
+
+    def flush(self):
+        """Flush every buffer."""
+        for buffers in self._buffers.values():
+            for buffer in buffers:
+                buffer.flush()
+
+    def clear(self):
+        """Flush and forget every buffer."""
+        self.flush()
+        self._buffers = {}
@@ -0,0 +1,78 @@
+from fnmatch import fnmatchcase
+
+
+class ChannelRouter(object):
+    """
+    Tracks which channels each plugin is active in.
+
+    Plugins without any configured channels are active everywhere. Plugins
+    with channels (or fnmatch style patterns like '#yaib*') only receive
+    events and commands from matching channels. Private messages are never
+    filtered.
+
+    Filtered entry lists are cached per (key, channel), so routing an event
+    is a single dict lookup after the first event in each channel. The cache
+    must be invalidated whenever the underlying entries change.
+    """
+
+    CHANNEL_PREFIXES = '&#!+'
+
+    def __init__(self):
+        self._patterns = {}
+        self._cache = {}
+
+    def setChannels(self, owner, channels):
+        """
+        Restrict owner to the given channels or patterns. Passing None or an
+        empty list makes owner active everywhere.
+        """
+        if channels:
+            self._patterns[owner] = tuple(c.strip().lower() for c in channels)
+        else:
+            self._patterns.pop(owner, None)
+        self.invalidate()
+
+    def remove(self, owner):
+        """Forget any channel restrictions for owner."""
+        self._patterns.pop(owner, None)
+        self.invalidate()
+
+    def clear(self):
+        """Forget every channel restriction."""
+        self._patterns = {}
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop all the cached routing decisions."""
+        self._cache = {}
+
+    def isChannel(self, name):
+        return bool(name) and name[0] in self.CHANNEL_PREFIXES
+
+    def isActive(self, owner, channel):
+        """Returns True if owner should receive events from channel."""
+        patterns = self._patterns.get(owner)
+        if patterns is None or not self.isChannel(channel):
+            return True
+        channel = channel.lower()
+        for pattern in patterns:
+            if fnmatchcase(channel, pattern):
+                return True
+        return False
+
+    def filter(self, key, channel, entries):
+        """
+        Returns the entries whose owner (the first item of each entry) is
+        active in channel. Results are cached by key and channel, for
+        channels only: private messages are not filtered, and caching them
+        by nick would grow the cache with every user.
+        """
+        if not self._patterns or not self.isChannel(channel):
+            return entries
+
+        cache_key = (key, channel)
+        filtered = self._cache.get(cache_key)
+        if filtered is None:
+            filtered = [e for e in entries if self.isActive(e[0], channel)]
+            self._cache[cache_key] = filtered
+        return filtered
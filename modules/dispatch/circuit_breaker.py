@@ -0,0 +1,130 @@
+import time
+import logging
+from collections import deque
+
+
+class CircuitBreaker(object):
+    """
+    Stops calling plugin hooks that keep raising exceptions. After
+    `failures` exceptions within `window` seconds the breaker for that
+    (plugin, hook) opens and the hook is skipped. After `cooldown` seconds it
+    half-opens: the next call is let through, closing the breaker if it
+    succeeds and opening it again if it fails.
+
+    Configured with the `breaker` config section:
+    - `failures` (int) - exceptions that open a breaker, defaults to 5
+    - `window` (float) - seconds the exceptions are counted over,
+                         defaults to 60
+    - `cooldown` (float) - seconds before retrying, defaults to 300
+    """
+
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    DEFAULT_FAILURES = 5
+    DEFAULT_WINDOW = 60
+    DEFAULT_COOLDOWN = 300
+
+    def __init__(self, timer=time.time):
+        self._timer = timer
+
+        self.failures = self.DEFAULT_FAILURES
+        self.window = self.DEFAULT_WINDOW
+        self.cooldown = self.DEFAULT_COOLDOWN
+
+        # (plugin name, hook) -> timestamps of the recent failures
+        self._recent = {}
+
+        # (plugin name, hook) -> [state, time opened, times opened]. Empty
+        # while every hook behaves, so the dispatch loop can skip checking.
+        self.tripped = {}
+
+    def configure(self, configuration):
+        """Called with the bot configuration."""
+        if configuration.breaker:
+            self.failures = (
+                configuration.breaker.failures or self.DEFAULT_FAILURES
+            )
+            self.window = configuration.breaker.window or self.DEFAULT_WINDOW
+            self.cooldown = (
+                configuration.breaker.cooldown or self.DEFAULT_COOLDOWN
+            )
+
+    def allow(self, plugin_name, name):
+        """Returns False if the hook should be skipped."""
+        breaker = self.tripped.get((plugin_name, name))
+        if breaker is None:
+            return True
+
+        if breaker[0] == self.OPEN:
+            if self._timer() - breaker[1] < self.cooldown:
+                return False
+            breaker[0] = self.HALF_OPEN
+            logging.info("Retrying {} in plugin {}".format(name, plugin_name))
+        return True
+
+    def success(self, plugin_name, name):
+        """Called after a hook returns normally."""
+        breaker = self.tripped.get((plugin_name, name))
+        if breaker is not None and breaker[0] == self.HALF_OPEN:
+            del self.tripped[(plugin_name, name)]
+            self._recent.pop((plugin_name, name), None)
+            logging.info(
+                "Closed the circuit breaker for {} in plugin {}".format(
+                    name, plugin_name
+                )
+            )
+
+    def failure(self, plugin_name, name):
+        """Called after a hook raises an exception."""
+        key = (plugin_name, name)
+        now = self._timer()
+
+        breaker = self.tripped.get(key)
+        if breaker is not None:
+            # failed the retry, wait for another cooldown
+            breaker[0] = self.OPEN
+            breaker[1] = now
+            breaker[2] += 1
+            return
+
+        recent = self._recent.get(key)
+        if recent is None:
+            recent = self._recent[key] = deque()
+        recent.append(now)
+        while recent and now - recent[0] > self.window:
+            recent.popleft()
+
+        if len(recent) >= self.failures:
+            self.tripped[key] = [self.OPEN, now, 1]
+            logging.error(
+                "Opened the circuit breaker for {} in plugin {} after {} "
+                "exceptions in {} seconds, skipping it for {} seconds".format(
+                    name, plugin_name, len(recent), self.window, self.cooldown
+                )
+            )
+
+    def reset(self, plugin_name=None):
+        """Close every breaker, or just the ones for the given plugin."""
+        for store in (self.tripped, self._recent):
+            for key in list(store):
+                if plugin_name is None or key[0] == plugin_name:
+                    del store[key]
+
+    def states(self):
+        """
+        Returns a list of (plugin name, hook, state, seconds until retry,
+        times opened) for every tripped breaker.
+        """
+        now = self._timer()
+        return sorted([
+            (
+                plugin_name,
+                name,
+                state,
+                max(0, self.cooldown - (now - opened)),
+                count
+            )
+            for (plugin_name, name), (state, opened, count)
+            in self.tripped.items()
+        ])
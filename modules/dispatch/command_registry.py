@@ -0,0 +1,78 @@
+class CommandRegistry(object):
+    """
+    Dispatch table mapping command names to the objects that provide them.
+
+    Yaib registers itself and each plugin once when they are loaded. Every
+    `admin_*`, `op_*` and `command_*` method is indexed by its command name,
+    so dispatching a command is a single dict lookup instead of probing every
+    plugin with hasattr on every line.
+
+    Each command maps to a list of entries in registration order, one per
+    owner providing that command, in the form
+    (owner, admin_handler, op_handler, command_handler). If multiple owners
+    provide the same command, the first one registered wins.
+    """
+
+    PREFIXES = ('admin_', 'op_', 'command_')
+
+    def __init__(self, wrap=None):
+        # optional wrap(owner, handler) applied to each handler on register
+        self._wrap = wrap
+        self._commands = {}
+
+    def register(self, owner):
+        """Index every command provided by owner."""
+        handlers = {}
+        for attribute in dir(owner):
+            for index, prefix in enumerate(self.PREFIXES):
+                if attribute.startswith(prefix):
+                    func = getattr(owner, attribute)
+
+                    # skip properties like BasePlugin.command_prefix
+                    if callable(func):
+                        if self._wrap is not None:
+                            func = self._wrap(owner, func)
+                        name = attribute[len(prefix):]
+                        entry = handlers.setdefault(name, [None, None, None])
+                        entry[index] = func
+                    break
+
+        for name, (admin, op, command) in handlers.items():
+            self._commands.setdefault(name, []).append(
+                (owner, admin, op, command)
+            )
+
+    def unregister(self, owner):
+        """Remove every command provided by owner."""
+        for name in self._commands.keys():
+            entries = [e for e in self._commands[name] if e[0] is not owner]
+            if entries:
+                self._commands[name] = entries
+            else:
+                del self._commands[name]
+
+    def clear(self):
+        """Remove all the registered commands."""
+        self._commands = {}
+
+    def get(self, command):
+        """Returns the entries for the given command name, or None."""
+        return self._commands.get(command)
+
+    def select(self, entries, is_admin, is_op):
+        """
+        Returns (owner, handler, is_admin_command) for the first entry the
+        user has permission to call, or (None, None, False).
+        """
+        for owner, admin, op, command in entries:
+            if is_admin and admin is not None:
+                return owner, admin, True
+            if is_op and op is not None:
+                return owner, op, False
+            if command is not None:
+                return owner, command, False
+        return None, None, False
+
+    def names(self):
+        """Returns the names of all the registered commands."""
+        return self._commands.keys()
@@ -0,0 +1,92 @@
+import time
+import inspect
+
+
+class Event(object):
+    """
+    Compact record for a single event from the server.
+
+    The connection creates one Event per inbound line and the same object is
+    passed by reference through yaib to every plugin, instead of building and
+    unpacking a kwargs dict at every step.
+
+    Plugins opt in to receiving the record by declaring the hook with a
+    single `event` argument, eg `def onMessage(self, event)`. Every other hook
+    signature keeps working - the record is unpacked into the documented
+    positional arguments (see HOOK_FIELDS) once per event.
+    """
+
+    __slots__ = (
+        'user', 'nick', 'host', 'channel', 'message', 'highlight',
+        'timestamp', 'command', 'more', 'network'
+    )
+
+    # hook name -> the positional arguments legacy hooks receive
+    HOOK_FIELDS = {
+        'onMessage': ('user', 'nick', 'channel', 'message', 'highlight'),
+        'onPrivateMessage': ('user', 'nick', 'message'),
+        'onUserAction': ('user', 'nick', 'channel', 'message'),
+        'onNotification': ('user', 'nick', 'channel', 'message'),
+        'onUserJoined': ('user', 'nick', 'channel'),
+        'onUserLeft': ('user', 'nick', 'channel'),
+        'onUserQuit': ('user', 'nick', 'message'),
+        'onCommand': ('user', 'nick', 'channel', 'command', 'more'),
+        'onAdminCommand': ('user', 'nick', 'channel', 'command', 'more'),
+    }
+
+    def __init__(
+            self, user=None, nick=None, host=None, channel=None,
+            message=None, highlight=False, command=None, more=None,
+            timestamp=None, network=None):
+        self.user = user
+        self.nick = nick
+        self.host = host
+        self.channel = channel
+        self.message = message
+        self.highlight = highlight
+        self.command = command
+        self.more = more
+        self.timestamp = timestamp or time.time()
+        self.network = network
+
+    @classmethod
+    def fromUser(cls, user, **kwargs):
+        """Create an event, splitting the nick and host out of user."""
+        nick, x, rest = user.partition('!')
+        host = rest.rpartition('@')[2]
+        return cls(user=user, nick=nick, host=host, **kwargs)
+
+    @classmethod
+    def fromHookArgs(cls, hook, args, kwargs):
+        """Create an event from the legacy arguments for the given hook."""
+        event = cls()
+        for field, value in zip(cls.HOOK_FIELDS[hook], args):
+            setattr(event, field, value)
+        for field, value in kwargs.items():
+            setattr(event, field, value)
+        return event
+
+    def __getstate__(self):
+        return tuple([getattr(self, f) for f in self.__slots__])
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
+
+    def fields(self, hook):
+        """Returns the legacy positional arguments for the given hook."""
+        return tuple([getattr(self, f) for f in self.HOOK_FIELDS[hook]])
+
+    def __repr__(self):
+        return '<Event %s %s: %r>' % (self.channel, self.nick, self.message)
+
+
+def takesEvent(func):
+    """Returns True if func wants the Event record instead of arguments."""
+    try:
+        args, varargs, keywords, defaults = inspect.getargspec(func)
+    except TypeError:
+        return False
+    if inspect.ismethod(func):
+        args = args[1:]
+    return args == ['event'] and varargs is None and keywords is None
@@ -0,0 +1,128 @@
+class HelpIndex(object):
+    """
+    Pre-rendered output of the help command.
+
+    Built once from the commands' docstrings instead of scanning every
+    plugin with dir() on each request. For each category (a plugin name or
+    an alias for one) it keeps the lines to send to users and to admins,
+    with {nick} and {command_prefix} already filled in. The index has to be
+    built again when the plugins change (see invalidate) or when the values
+    the docstrings were formatted with change (see isCurrent).
+    """
+
+    COMMAND_PREFIX = 'command_'
+    ADMIN_PREFIX = 'admin_'
+
+    OVERVIEW = (
+        "The following help categories are available. "
+        "Select a category with '{command_prefix}help category'.\n"
+        "--------------------------------"
+    )
+
+    HEADER = (
+        "Commands can be issued with a '{command_prefix}' or by "
+        "starting with '{nick}'. Example: '{command_prefix}help' "
+        "or '{nick}: help'.\n"
+        "The following commands are available in the category '%s'"
+    )
+
+    def __init__(self, format):
+        # format(doc) fills in {nick} and {command_prefix}
+        self._format = format
+        self._key = None
+
+        self.overview = []
+        self._categories = []
+        self._lines = {}
+        self._names = {}
+
+    def invalidate(self):
+        """Build the index again on next use."""
+        self._key = None
+
+    def isCurrent(self, key):
+        """
+        Returns True if the index was built with the same key, which stands
+        for whatever the text was formatted with, eg (nick, command_prefix).
+        """
+        return self._key is not None and self._key == key
+
+    def build(self, plugins, key, aliases=()):
+        """
+        Index the commands of the plugins. aliases is a list of (category,
+        plugin name) for extra category names, listed before the plugins.
+        """
+        self._categories = []
+        self._lines = {}
+        self._names = {}
+
+        entries = {}
+        for plugin in plugins:
+            entries[plugin.name] = self._render(plugin)
+            self._categories.append(plugin.name)
+        for index, (alias, name) in enumerate(aliases):
+            if name in entries:
+                entries[alias] = entries[name]
+                self._categories.insert(index, alias)
+
+        header = self._format(self.HEADER)
+        for category in self._categories:
+            admin_commands, commands = entries[category]
+            lines = (header % category).split('\n')
+            self._lines[category] = (
+                lines + commands,
+                lines + admin_commands + commands
+            )
+            self._names.setdefault(category.lower(), category)
+
+        self.overview = self._format(self.OVERVIEW).split('\n') + [
+            ', '.join(self._categories)
+        ]
+        self._key = key
+
+    def _render(self, plugin):
+        """Returns the admin and the other command lines of the plugin."""
+        admin_commands, commands = [], []
+        for attribute in sorted(dir(plugin)):
+            if attribute.startswith(self.COMMAND_PREFIX):
+                name = attribute[len(self.COMMAND_PREFIX):]
+                line, lines = '- %s: %s', commands
+            elif attribute.startswith(self.ADMIN_PREFIX):
+                name = attribute[len(self.ADMIN_PREFIX):]
+                line, lines = '- %s (Admin only): %s', admin_commands
+            else:
+                continue
+
+            func = getattr(plugin, attribute, None)
+            if callable(func) and func.__doc__:
+                # a stray brace only costs the formatting of that command
+                try:
+                    doc = self._format(func.__doc__)
+                except (KeyError, IndexError, ValueError):
+                    doc = func.__doc__
+                lines.extend((line % (name, doc)).split('\n'))
+        return admin_commands, commands
+
+    def getCategories(self):
+        return list(self._categories)
+
+    def find(self, category):
+        """
+        Returns the categories matching the given name, ignoring case: the
+        one with that exact name or else every category starting with it.
+        """
+        category = category.strip().lower()
+        if category in self._names:
+            return [self._names[category]]
+        return [
+            c for c in self._categories
+            if c.lower().startswith(category) and
+            self._names[c.lower()] == c
+        ]
+
+    def getLines(self, category, is_admin=False):
+        """Returns the help lines of the category, or None."""
+        lines = self._lines.get(category)
+        if lines is None:
+            return None
+        return lines[1] if is_admin else lines[0]
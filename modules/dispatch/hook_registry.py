@@ -0,0 +1,110 @@
+from event import Event, takesEvent
+
+
+class StopPropagation(object):
+    """Sentinel type, see STOP_PROPAGATION."""
+
+    def __repr__(self):
+        return 'STOP_PROPAGATION'
+
+# return this from a hook to stop delivering the event to other plugins
+STOP_PROPAGATION = StopPropagation()
+
+
+class HookRegistry(object):
+    """
+    Subscriber index for plugin event hooks.
+
+    The base plugin class defines a no-op version of every `on*` hook, so
+    calling every hook on every plugin wastes most of its time on methods
+    that do nothing. When a plugin is registered, each of its `on*` and
+    `irc_*` methods is compared against the default from the base class and
+    only the ones the plugin actually overrides are subscribed.
+
+    Each hook maps to a list of (owner, handler, takes_event) where
+    takes_event is True if the handler wants the Event record (see
+    event.Event) instead of positional arguments. Lists are ordered by
+    priority, highest first, then by registration order. Owners declare a
+    default `priority` and can override it per hook with a `priorities`
+    dict, eg:
+        priority = 0
+        priorities = {'onMessage': 100}
+    The order is computed once at registration, not per event.
+    """
+
+    HOOK_PREFIXES = ('on', 'irc_')
+
+    # batched hooks (eg onMessageBatch) are subscribed by the EventBatcher
+    BATCH_SUFFIX = 'Batch'
+
+    def __init__(self, base=None, wrap=None):
+        self.base = base
+        # optional wrap(owner, handler) applied to each handler on register
+        self._wrap = wrap
+        self._hooks = {}
+
+    def isOverridden(self, owner, name):
+        """Returns True if owner implements the hook itself."""
+        if self.base is None:
+            return True
+        default = getattr(self.base, name, None)
+        if default is None:
+            return True
+        implementation = getattr(owner, name)
+        return (
+            getattr(implementation, '__func__', implementation) is not
+            getattr(default, '__func__', default)
+        )
+
+    def getPriority(self, owner, name):
+        """Returns the priority owner declared for the given hook."""
+        priorities = getattr(owner, 'priorities', None) or {}
+        return priorities.get(name, getattr(owner, 'priority', 0))
+
+    def register(self, owner):
+        """Subscribe owner to every hook it implements."""
+        for attribute in dir(owner):
+            if (not attribute.startswith(self.HOOK_PREFIXES) or
+                    attribute.endswith(self.BATCH_SUFFIX)):
+                continue
+            func = getattr(owner, attribute)
+            if callable(func) and self.isOverridden(owner, attribute):
+                self.subscribe(attribute, owner, func)
+
+    def subscribe(self, name, owner, func, takes_event=None):
+        """
+        Subscribe a single handler on behalf of owner. The handler is
+        inserted after every subscriber with the same or higher priority.
+        """
+        subscribers = self._hooks.setdefault(name, [])
+        priority = self.getPriority(owner, name)
+        index = len(subscribers)
+        while (index > 0 and
+                self.getPriority(subscribers[index - 1][0], name) < priority):
+            index -= 1
+        if takes_event is None:
+            takes_event = name in Event.HOOK_FIELDS and takesEvent(func)
+        if self._wrap is not None:
+            func = self._wrap(owner, func)
+        subscribers.insert(index, (owner, func, takes_event))
+
+    def unregister(self, owner):
+        """Remove owner from every hook."""
+        for name in self._hooks.keys():
+            subscribers = [s for s in self._hooks[name] if s[0] is not owner]
+            if subscribers:
+                self._hooks[name] = subscribers
+            else:
+                del self._hooks[name]
+
+    def clear(self):
+        """Remove all the subscribers."""
+        self._hooks = {}
+
+    def get(self, hook):
+        """Returns the subscribers for the given hook."""
+        return self._hooks.get(hook, ())
+
+    def names(self):
+        """Returns the names of all the hooks with subscribers."""
+        return self._hooks.keys()
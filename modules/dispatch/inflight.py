@@ -0,0 +1,102 @@
+import time
+import types
+import logging
+
+from twisted.internet import defer
+
+
+def asDeferred(result):
+    """
+    Returns a Deferred for an asynchronous handler result, or None if the
+    handler finished synchronously. Generators (coroutines written for
+    `defer.inlineCallbacks`) are started with inlineCallbacks.
+    """
+    if isinstance(result, defer.Deferred):
+        return result
+    if isinstance(result, types.GeneratorType):
+        return defer.inlineCallbacks(lambda: result)()
+    return None
+
+
+class InFlightTracker(object):
+    """
+    Keeps track of plugin commands and hooks that return a Deferred (or an
+    inlineCallbacks style generator) and are still running. Each call is
+    timed (and recorded as '<name> (async)' in stats, if given), and failures
+    are logged the same way as exceptions raised by synchronous handlers.
+    """
+
+    def __init__(self, timer=time.time, stats=None):
+        self._timer = timer
+        self.stats = stats
+        self._next_id = 0
+
+        # call id -> (plugin name, command, start time)
+        self.calls = {}
+        self.finished = 0
+        self.failed = 0
+
+    def track(self, owner, name, result):
+        """
+        Track the result of calling name on owner. Returns the Deferred if
+        the call is asynchronous, otherwise the result unchanged.
+        """
+        d = asDeferred(result)
+        if d is None:
+            return result
+
+        self._next_id += 1
+        call_id = self._next_id
+        self.calls[call_id] = (
+            getattr(owner, 'name', None), name, self._timer()
+        )
+
+        # already finished deferreds run the callbacks immediately
+        d.addCallbacks(
+            self._finished, self._failed,
+            callbackArgs=(call_id,), errbackArgs=(call_id,)
+        )
+        return d
+
+    def _finished(self, result, call_id):
+        plugin_name, name, elapsed = self._done(call_id)
+        self.finished += 1
+        logging.debug("{} in plugin {} finished in {:.3f} seconds".format(
+            name, plugin_name, elapsed
+        ))
+        return result
+
+    def _failed(self, failure, call_id):
+        plugin_name, name, elapsed = self._done(call_id)
+        self.failed += 1
+        logging.error("Exception running {} in plugin {}: {}".format(
+            name, plugin_name, repr(failure.value)
+        ))
+
+    def _done(self, call_id):
+        plugin_name, name, started = self.calls.pop(call_id)
+        elapsed = self._timer() - started
+        if self.stats is not None:
+            self.stats.record(plugin_name, '%s (async)' % name, elapsed)
+        return plugin_name, name, elapsed
+
+    def count(self, plugin_name=None):
+        """Returns the number of calls in flight, optionally for one plugin."""
+        if plugin_name is None:
+            return len(self.calls)
+        return len([
+            c for c in self.calls.values() if c[0] == plugin_name
+        ])
+
+    def pending(self):
+        """
+        Returns a list of (plugin name, command, seconds running) for every
+        call in flight, longest running first.
+        """
+        now = self._timer()
+        return sorted(
+            [(p, name, now - started) for p, name, started in
+                self.calls.values()],
+            key=lambda c: c[2],
+            reverse=True
+        )
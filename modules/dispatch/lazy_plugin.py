@@ -0,0 +1,179 @@
+import os
+import json
+import logging
+
+from event import takesEvent
+from hook_registry import HookRegistry
+from command_registry import CommandRegistry
+
+
+# copied from the plugin class, they control dispatch
+DISPATCH_ATTRIBUTES = ['priority', 'priorities', 'batch_size', 'batch_interval']
+
+
+def describePlugin(plugin_class, hooks):
+    """
+    Returns a manifest entry listing everything needed to register the
+    plugin class without importing it again: its name, dispatch settings,
+    commands with their docstrings and the hooks it overrides.
+    """
+    entry = {
+        'name': plugin_class.name,
+        'commands': {},
+        'hooks': {}
+    }
+    for attribute in DISPATCH_ATTRIBUTES:
+        if hasattr(plugin_class, attribute):
+            entry[attribute] = getattr(plugin_class, attribute)
+
+    for attribute in dir(plugin_class):
+        func = getattr(plugin_class, attribute, None)
+        if not callable(func):
+            continue
+        blocking = bool(getattr(func, 'blocking', False))
+        if attribute.startswith(CommandRegistry.PREFIXES):
+            entry['commands'][attribute] = {
+                'doc': func.__doc__,
+                'blocking': blocking
+            }
+        elif (attribute.startswith(HookRegistry.HOOK_PREFIXES) and
+                hooks.isOverridden(plugin_class, attribute)):
+            entry['hooks'][attribute] = {
+                'event': takesEvent(func),
+                'blocking': blocking
+            }
+    return entry
+
+
+class PluginManifest(object):
+    """
+    Cache of describePlugin entries, saved as json. Entries are keyed by the
+    plugin file and only used while the file's modification time and size
+    are unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._dirty = False
+
+    def load(self):
+        self._entries = {}
+        self._dirty = False
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                self._entries = json.loads(f.read())
+        except (IOError, ValueError) as e:
+            logging.warning(
+                "Ignoring plugin manifest %s: %s" % (self.path, repr(e))
+            )
+
+    def save(self):
+        """Write the manifest if it changed."""
+        if not self._dirty:
+            return
+        try:
+            with open(self.path, 'wb') as f:
+                f.write(json.dumps(self._entries))
+            self._dirty = False
+        except IOError as e:
+            logging.error(
+                "Could not save plugin manifest %s: %s" % (self.path, repr(e))
+            )
+
+    def _getStamp(self, plugin_file_path):
+        stat = os.stat(plugin_file_path)
+        return [stat.st_mtime, stat.st_size]
+
+    def get(self, plugin_file_path):
+        """Returns the entry for the plugin file, or None if it is stale."""
+        key = os.path.realpath(plugin_file_path)
+        entry = self._entries.get(key)
+        if entry is None or entry['stamp'] != self._getStamp(key):
+            return None
+        return entry
+
+    def update(self, plugin_file_path, plugin_class, hooks):
+        """Describe the plugin class loaded from the file."""
+        key = os.path.realpath(plugin_file_path)
+        entry = describePlugin(plugin_class, hooks)
+        entry['stamp'] = self._getStamp(key)
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._dirty = True
+        return entry
+
+
+class LazyPlugin(object):
+    """
+    Stands in for a plugin that has not been imported yet, built from its
+    manifest entry. It has a proxy for every command and hook of the real
+    plugin, with the same docstrings so help still works. The first call to
+    any of them calls activate(stub), which imports and creates the real
+    plugin and swaps it in for the stub, and the call is passed on to it.
+
+    Enable with `plugins.lazy: true` (or `plugins.<name>.lazy`) in the
+    configuration.
+    """
+
+    # run by yaib on the real plugin when it is activated, if ever
+    DEFERRED_HOOKS = ('onPluginsLoaded', 'onShutdown', 'onUnload')
+
+    def __init__(self, entry, path, activate, wrap=None):
+        self.name = entry['name']
+        self.path = path
+        self.plugin = None
+        self.failed = False
+
+        self._activate = activate
+        self._wrap = wrap
+
+        # restored before the real plugin is loaded (see restoreState)
+        self._state = None
+
+        for attribute in DISPATCH_ATTRIBUTES:
+            if attribute in entry:
+                setattr(self, attribute, entry[attribute])
+
+        for name, info in entry['commands'].items():
+            setattr(self, name, self._createProxy(name, info))
+        for name, info in entry['hooks'].items():
+            if name not in self.DEFERRED_HOOKS:
+                setattr(self, name, self._createProxy(name, info))
+
+    def _createProxy(self, name, info):
+        blocking = info['blocking']
+
+        def call(*args, **kwargs):
+            plugin = self.activate()
+            if plugin is None:
+                return None
+            func = getattr(plugin, name)
+            if blocking and self._wrap is not None:
+                func = self._wrap(plugin, func)
+            return func(*args, **kwargs)
+
+        if info.get('event'):
+            def proxy(event):
+                return call(event)
+        else:
+            proxy = call
+
+        proxy.__name__ = str(name)
+        proxy.__doc__ = info.get('doc')
+        return proxy
+
+    def activate(self):
+        """Returns the real plugin, loading it if needed."""
+        if self.plugin is None and not self.failed:
+            self.plugin = self._activate(self)
+            self.failed = self.plugin is None
+        return self.plugin
+
+    def serializeState(self):
+        return self._state
+
+    def restoreState(self, state):
+        self._state = state
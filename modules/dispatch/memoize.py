@@ -0,0 +1,220 @@
+import time
+import functools
+from collections import OrderedDict
+
+from twisted.internet import defer
+from twisted.python import failure
+
+from command_registry import CommandRegistry
+from inflight import asDeferred
+
+
+# plugin attribute holding the caches of its memoized methods, by name
+CACHES_ATTRIBUTE = '_memo_caches'
+
+
+def normalizeArgument(value):
+    """
+    Normalization for the arguments of case insensitive commands, see
+    memoize: strings are lowercased with runs of whitespace collapsed, so
+    '!weather  Paris' and '!weather paris' share a result.
+    """
+    if isinstance(value, basestring):
+        return ' '.join(value.lower().split())
+    if isinstance(value, (list, tuple)):
+        return tuple(normalizeArgument(v) for v in value)
+    return value
+
+
+class MemoCache(object):
+    """
+    Results of a memoized method, kept for `ttl` seconds, at most `size` of
+    them (least recently used dropped first).
+
+    Results that arrive later (a Deferred or an inlineCallbacks style
+    generator) are shared while they are still running: calls with the same
+    key get a Deferred firing with the first call's result instead of
+    starting their own. Failures and None are not cached.
+    """
+
+    def __init__(self, name, ttl=60, size=100, timer=time.time):
+        self.name = name
+        self.ttl = ttl
+        self.size = size
+        self._timer = timer
+
+        # key -> (expiry time, result, whether it arrived later)
+        self._entries = OrderedDict()
+        # key -> Deferreds waiting for the running call
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drop the cached results and the statistics."""
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def hitRate(self):
+        """Returns the share of calls answered without computing, 0 to 1."""
+        calls = self.hits + self.coalesced + self.misses
+        if not calls:
+            return 0.0
+        return float(self.hits + self.coalesced) / calls
+
+    def call(self, key, compute):
+        """
+        Returns the result cached for key, calling compute() for it if there
+        is none. Asynchronous results are returned as Deferreds.
+        """
+        try:
+            hash(key)
+        except TypeError:
+            # can't be cached, eg a dict argument
+            self.misses += 1
+            return compute()
+
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            expires, result, later = entry
+            if expires > self._timer():
+                # put it back as the most recently used
+                self._entries[key] = entry
+                self.hits += 1
+                return defer.succeed(result) if later else result
+
+        waiters = self._pending.get(key)
+        if waiters is not None:
+            self.coalesced += 1
+            d = defer.Deferred()
+            waiters.append(d)
+            return d
+
+        self.misses += 1
+        result = compute()
+        d = asDeferred(result)
+        if d is None:
+            self._store(key, result, False)
+            return result
+
+        # the first caller waits like the others, so they are answered in
+        # the order they called
+        first = defer.Deferred()
+        self._pending[key] = [first]
+        d.addBoth(self._settle, key)
+        return first
+
+    def _settle(self, result, key):
+        waiters = self._pending.pop(key, [])
+        if isinstance(result, failure.Failure):
+            for waiter in waiters:
+                waiter.errback(result)
+        else:
+            self._store(key, result, True)
+            for waiter in waiters:
+                waiter.callback(result)
+
+    def _store(self, key, result, later):
+        if result is None:
+            return
+        self._entries[key] = (self._timer() + self.ttl, result, later)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+def _exact(value):
+    return value
+
+
+def getCaches(plugin):
+    """Returns the caches of the plugin's memoized methods, by name."""
+    caches = getattr(plugin, '__dict__', {}).get(CACHES_ATTRIBUTE, {})
+    return [caches[name] for name in sorted(caches)]
+
+
+def _reply(plugin, channel, nick, output):
+    """Sends a memoized command's output (a line or a list of lines)."""
+    if output is None:
+        return
+    if isinstance(output, basestring):
+        output = [output]
+    for line in output:
+        plugin.reply(channel, nick, line)
+
+
+def memoize(ttl=60, size=100, per_channel=False, normalize=None,
+            timer=time.time):
+    """
+    Decorator caching the results of a plugin method for `ttl` seconds, with
+    at most `size` results per method, keyed by the arguments. Arguments
+    that should share a result are mapped to the same key by `normalize`,
+    eg normalizeArgument for case insensitive commands. Each plugin instance
+    has its own caches, so a reload starts with empty ones.
+
+    Memoized commands (command_*, admin_*, op_*) return their output, a line
+    or a list of lines (or a Deferred firing with them), instead of sending
+    it. The output is replied to whoever called the command, and cached by
+    the command's arguments, and the channel if `per_channel` is set. Other
+    methods just return the cached value.
+
+    While a result that arrives later is still running, identical calls wait
+    for it instead of starting their own. Put @memoize above @blocking: the
+    cache is checked on the reactor thread and only misses use the pool.
+    """
+    if normalize is None:
+        normalize = _exact
+
+    def decorator(func):
+        name = func.__name__
+        blocking = getattr(func, 'blocking', False)
+
+        def getCache(plugin):
+            caches = plugin.__dict__.setdefault(CACHES_ATTRIBUTE, {})
+            cache = caches.get(name)
+            if cache is None:
+                cache = caches[name] = MemoCache(name, ttl, size, timer)
+            return cache
+
+        def compute(plugin, args, kwargs):
+            if blocking:
+                return plugin.yaib.threads.run(
+                    plugin, func, plugin, *args, **kwargs
+                )
+            return func(plugin, *args, **kwargs)
+
+        if name.startswith(CommandRegistry.PREFIXES):
+            @functools.wraps(func)
+            def memoized(self, user, nick, channel, more):
+                key = (normalize(more), channel if per_channel else None)
+                result = getCache(self).call(key, lambda: compute(
+                    self, (user, nick, channel, more), {}
+                ))
+                if isinstance(result, defer.Deferred):
+                    return result.addCallback(
+                        lambda output: _reply(self, channel, nick, output)
+                    )
+                _reply(self, channel, nick, result)
+        else:
+            @functools.wraps(func)
+            def memoized(self, *args, **kwargs):
+                key = (
+                    tuple(normalize(a) for a in args),
+                    tuple(sorted(
+                        (k, normalize(v)) for k, v in kwargs.items()
+                    ))
+                )
+                return getCache(self).call(
+                    key, lambda: compute(self, args, kwargs)
+                )
+
+        # misses are sent to the thread pool by compute, not the dispatcher
+        memoized.blocking = False
+        return memoized
+    return decorator
@@ -0,0 +1,153 @@
+import os
+import imp
+import sys
+import struct
+import hashlib
+import logging
+import marshal
+
+
+class PluginSource(object):
+    """What a plugin module was last loaded from."""
+
+    def __init__(self, stamp, digest, code):
+        self.stamp = stamp
+        self.digest = digest
+        self.code = code
+
+
+class PluginLoader(object):
+    """
+    Imports plugin modules and remembers the source each one was loaded
+    from, so reloading can skip the plugins that did not change.
+
+    A file counts as changed when its contents change: its modification
+    time and size are checked first, and its sha1 only when they differ.
+    The compiled code of each file is kept and reused while its contents
+    stay the same. On the first load the .pyc next to the plugin is used if
+    it is up to date, and written otherwise.
+
+    Loading is done in two steps, so a failed reload keeps the version that
+    is running: load runs the file in a new module, and install makes it the
+    module in sys.modules once the plugin was created from it.
+    """
+
+    def __init__(self):
+        self._sources = {}
+        # loaded but not installed yet
+        self._pending = {}
+
+    def _getStamp(self, plugin_file_path):
+        stat = os.stat(plugin_file_path)
+        return (stat.st_mtime, stat.st_size)
+
+    def _read(self, plugin_file_path):
+        with open(plugin_file_path, 'rU') as f:
+            source = f.read()
+        return source, hashlib.sha1(source).hexdigest()
+
+    def isLoaded(self, plugin_file_path):
+        return os.path.realpath(plugin_file_path) in self._sources
+
+    def isChanged(self, plugin_file_path):
+        """
+        Returns True if the file changed since it was loaded, or was never
+        loaded.
+        """
+        key = os.path.realpath(plugin_file_path)
+        loaded = self._sources.get(key)
+        if loaded is None:
+            return True
+        try:
+            stamp = self._getStamp(key)
+        except OSError:
+            return True
+        if stamp == loaded.stamp:
+            return False
+
+        # touched or saved without changes
+        if self._read(key)[1] == loaded.digest:
+            loaded.stamp = stamp
+            return False
+        return True
+
+    def load(self, module_name, plugin_file_path):
+        """
+        Run the plugin file in a new module and return it, like
+        imp.load_source but without adding it to sys.modules (see install).
+        """
+        key = os.path.realpath(plugin_file_path)
+        stamp = self._getStamp(key)
+        source, digest = self._read(key)
+
+        loaded = self._sources.get(key)
+        if loaded is not None and loaded.digest == digest:
+            code = loaded.code
+        else:
+            code = None
+            if loaded is None:
+                code = self._readBytecode(key, stamp[0])
+            if code is None:
+                logging.debug("Compiling plugin %s" % plugin_file_path)
+                code = compile(source, plugin_file_path, 'exec')
+                self._writeBytecode(key, stamp[0], code)
+
+        module = imp.new_module(module_name)
+        module.__file__ = plugin_file_path
+        # python 2 clears the globals of a module once the module object is
+        # gone, the functions of the module keep it alive for the plugins
+        # still running them after a reload
+        module.__plugin_module__ = module
+        exec code in module.__dict__
+
+        self._pending[key] = PluginSource(stamp, digest, code)
+        return module
+
+    def install(self, module_name, module):
+        """
+        Make the module returned by load the plugin's module, replacing the
+        version loaded before, and remember the source it was loaded from.
+        """
+        key = os.path.realpath(module.__file__)
+        sys.modules[module_name] = module
+        self._sources[key] = self._pending.pop(key)
+
+    def forget(self, module_name, plugin_file_path):
+        """
+        Drop the module and what is kept for the file, once the plugin is
+        unloaded for good.
+        """
+        key = os.path.realpath(plugin_file_path)
+        sys.modules.pop(module_name, None)
+        self._sources.pop(key, None)
+        self._pending.pop(key, None)
+
+    def _readBytecode(self, plugin_file_path, mtime):
+        """Returns the code from an up to date .pyc, or None."""
+        try:
+            with open(plugin_file_path + 'c', 'rb') as f:
+                data = f.read()
+        except IOError:
+            return None
+        if (data[:4] != imp.get_magic() or
+                data[4:8] != struct.pack('<I', int(mtime))):
+            return None
+        try:
+            return marshal.loads(data[8:])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def _writeBytecode(self, plugin_file_path, mtime, code):
+        if sys.dont_write_bytecode:
+            return
+        try:
+            with open(plugin_file_path + 'c', 'wb') as f:
+                # the magic goes in last so a partial file is never used
+                f.write('\0\0\0\0')
+                f.write(struct.pack('<I', int(mtime)))
+                marshal.dump(code, f)
+                f.seek(0)
+                f.write(imp.get_magic())
+        # the plugin folder may be read only
+        except IOError:
+            pass
@@ -0,0 +1,268 @@
+"""
+Entry point for plugins running in their own process. Started by
+process_plugin.ProcessPlugin, not meant to be run directly:
+
+    python -m modules.dispatch.plugin_worker
+
+Reads messages from stdin and writes messages to the original stdout. Anything
+the plugin prints goes to stderr, which yaib logs.
+"""
+
+import os
+import imp
+import sys
+import time
+import heapq
+import select
+import logging
+import traceback
+import cPickle as pickle
+
+from tools import util
+from tools.templates import TemplateCache
+from modules import persistence
+from modules.dispatch.process_plugin import encodeMessage, MessageDecoder
+from modules.dispatch.inflight import asDeferred
+
+
+class WorkerChannel(object):
+    """Blocking message pipe back to yaib."""
+
+    def __init__(self, fd_in, fd_out):
+        self.fd_in = fd_in
+        self.fd_out = fd_out
+        self.decoder = MessageDecoder()
+
+    def send(self, message):
+        data = encodeMessage(message)
+        while data:
+            written = os.write(self.fd_out, data)
+            data = data[written:]
+
+    def read(self, timeout=None):
+        """
+        Wait up to timeout seconds for messages. Returns a list of messages,
+        or None if yaib closed the pipe.
+        """
+        readable, x, y = select.select([self.fd_in], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd_in, 65536)
+        if not data:
+            return None
+        return self.decoder.feed(data)
+
+
+class WorkerDelayedCall(object):
+    """Minimal stand in for twisted's DelayedCall."""
+
+    def __init__(self, time, func, args, kwargs):
+        self.time = time
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.called = False
+
+    def __lt__(self, other):
+        return self.time < other.time
+
+    def active(self):
+        return not (self.cancelled or self.called)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def getTime(self):
+        return self.time
+
+
+class WorkerSettings(object):
+    """Plugin settings proxied to yaib."""
+
+    def __init__(self, worker):
+        self._worker = worker
+
+    def set(self, key, *args, **kwargs):
+        return self._worker.request('settings.set', (key,) + args)
+
+    def setMulti(self, settingsDict, initial=False):
+        return self._worker.request(
+            'settings.setMulti', (settingsDict, initial)
+        )
+
+    def get(self, key, default=None):
+        return self._worker.request('settings.get', (key, default))
+
+    def getMulti(self, keys, default=None):
+        return self._worker.request('settings.getMulti', (keys, default))
+
+
+class WorkerYaib(object):
+    """Stands in for yaib inside the worker process."""
+
+    DONT_NOTIFY_PLUGINS_FLAG = '**does_not_notify_plugins**'
+
+    def __init__(self, worker, config, nick, command_prefix):
+        self._worker = worker
+        self._persistence = None
+        self.config = config
+        self.templates = TemplateCache(
+            remove=(self.DONT_NOTIFY_PLUGINS_FLAG,),
+            nick=nick,
+            command_prefix=command_prefix
+        )
+        self.nick = nick
+        self.command_prefix = command_prefix
+
+    @property
+    def persistence(self):
+        # each worker has its own connection pool
+        if self._persistence is None:
+            self._persistence = persistence.default(self.config)
+        return self._persistence
+
+    def getPluginSettings(self, pluginName):
+        return WorkerSettings(self._worker)
+
+    def sendMessage(self, channel, message):
+        self._worker.channel.send(('send', channel, message))
+
+    def action(self, channel, action):
+        self._worker.channel.send(('action', channel, action))
+
+    def isAdmin(self, user, nick):
+        return self._worker.request('isAdmin', (user, nick))
+
+    def formatDoc(self, message, *args, **values):
+        return self.templates.format(message, *args, **values)
+
+    def callLater(self, delay, func, *args, **kwargs):
+        return self._worker.schedule(delay, func, args, kwargs)
+
+
+class Worker(object):
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.plugin = None
+        self.yaib = None
+        self.running = True
+
+        self._timers = []
+        self._pending = []
+        self._next_request_id = 0
+
+    def schedule(self, delay, func, args, kwargs):
+        call = WorkerDelayedCall(time.time() + delay, func, args, kwargs)
+        heapq.heappush(self._timers, call)
+        return call
+
+    def request(self, method, args):
+        """Ask yaib for something and wait for the answer."""
+        self._next_request_id += 1
+        request_id = self._next_request_id
+        self.channel.send(('request', request_id, method, args))
+
+        while True:
+            messages = self.channel.read()
+            if messages is None:
+                raise EOFError("yaib closed the worker pipe")
+            for message in messages:
+                if message[0] == 'response' and message[1] == request_id:
+                    # keep anything after the response for the main loop
+                    index = messages.index(message)
+                    self._pending.extend(messages[index + 1:])
+                    return message[2]
+                self._pending.append(message)
+
+    def run(self):
+        while self.running:
+            self._runTimers()
+
+            if self._pending:
+                messages, self._pending = self._pending, []
+            else:
+                timeout = None
+                if self._timers:
+                    timeout = max(0, self._timers[0].time - time.time())
+                messages = self.channel.read(timeout)
+                if messages is None:
+                    break
+
+            for message in messages:
+                self.handle(message)
+
+    def _runTimers(self):
+        now = time.time()
+        while self._timers and self._timers[0].time <= now:
+            call = heapq.heappop(self._timers)
+            if call.cancelled:
+                continue
+            call.called = True
+            try:
+                call.func(*call.args, **call.kwargs)
+            # running plugin code - catch everything
+            except Exception:
+                traceback.print_exc()
+
+    def handle(self, message):
+        kind = message[0]
+
+        if kind == 'init':
+            config, plugin_file_path, module_name, nick, prefix = message[1:]
+            config = util.dictToObject(config)
+            self.yaib = WorkerYaib(self, config, nick, prefix)
+            plugin_module = imp.load_source(module_name, plugin_file_path)
+            self.plugin = plugin_module.Plugin(self.yaib, config)
+            self.channel.send(('ready',))
+
+        elif kind == 'call':
+            call_id, name, args, kwargs = message[1:]
+            if name == 'onNickChange':
+                self.yaib.nick = args[0]
+                self.yaib.templates.update(nick=args[0])
+
+            try:
+                result = getattr(self.plugin, name)(*args, **kwargs)
+            # running plugin code - catch everything
+            except Exception as e:
+                traceback.print_exc()
+                return self.sendResult(None, call_id, repr(e))
+
+            # asynchronous calls answer when they finish
+            d = asDeferred(result)
+            if d is None:
+                self.sendResult(result, call_id)
+            else:
+                d.addCallbacks(
+                    self.sendResult, self._sendFailure,
+                    callbackArgs=(call_id,), errbackArgs=(call_id,)
+                )
+
+        elif kind == 'stop':
+            self.running = False
+
+    def sendResult(self, result, call_id, error=None):
+        try:
+            pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            result = None
+        self.channel.send(('result', call_id, result, error))
+
+    def _sendFailure(self, failure, call_id):
+        failure.printTraceback(file=sys.stderr)
+        self.sendResult(None, call_id, repr(failure.value))
+
+
+def main():
+    # keep the real stdout for messages, send prints to stderr
+    fd_out = os.dup(1)
+    os.dup2(2, 1)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    Worker(WorkerChannel(0, fd_out)).run()
+
+
+if __name__ == '__main__':
+    main()
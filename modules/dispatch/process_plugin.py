@@ -0,0 +1,290 @@
+import os
+import sys
+import struct
+import logging
+import cPickle as pickle
+
+from twisted.internet import defer, protocol
+
+from event import Event, takesEvent
+from hook_registry import HookRegistry
+from command_registry import CommandRegistry
+from tools import util
+
+
+# messages are pickled and prefixed with their length
+HEADER = struct.Struct('!I')
+PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def encodeMessage(message):
+    """Serialize a message tuple for the worker pipe."""
+    data = pickle.dumps(message, PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+
+class MessageDecoder(object):
+    """Reassembles messages from the chunks read from a worker pipe."""
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, data):
+        """Add data from the pipe and return any complete messages."""
+        self._buffer += data
+        messages = []
+        while len(self._buffer) >= HEADER.size:
+            length, = HEADER.unpack_from(self._buffer)
+            end = HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            messages.append(pickle.loads(self._buffer[HEADER.size:end]))
+            self._buffer = self._buffer[end:]
+        return messages
+
+
+class WorkerProcessProtocol(protocol.ProcessProtocol):
+    """Pipes messages between a ProcessPlugin and its worker process."""
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.decoder = MessageDecoder()
+
+    def connectionMade(self):
+        self.plugin.workerStarted(self)
+
+    def send(self, message):
+        self.transport.write(encodeMessage(message))
+
+    def outReceived(self, data):
+        for message in self.decoder.feed(data):
+            self.plugin.messageReceived(message)
+
+    def errReceived(self, data):
+        for line in data.rstrip('\n').split('\n'):
+            logging.info("[%s worker] %s" % (self.plugin.name, line))
+
+    def processEnded(self, reason):
+        self.plugin.workerEnded(self, reason)
+
+
+class ProcessPlugin(object):
+    """
+    Runs a plugin in a separate worker process.
+
+    Yaib registers the ProcessPlugin in place of the real plugin. It exposes
+    a proxy for every command and hook the plugin class implements, which
+    forwards the call over a pipe to the worker. The worker proxies send,
+    action, settings and admin checks back. Calls return a Deferred that
+    fires with the result, so priorities and STOP_PROPAGATION do not apply
+    to process plugins.
+
+    If the worker dies it is restarted with exponential backoff, without
+    affecting the rest of the bot. Calls made while the worker is starting
+    are queued until it is ready.
+
+    Enable with `plugins.<name>.process: true` in the configuration.
+    """
+
+    MAX_RESTART_DELAY = 60
+
+    def __init__(self, yaib, plugin_class, plugin_file_path, module_name):
+        self.yaib = yaib
+        self.name = plugin_class.name
+        self.plugin_class = plugin_class
+        self.plugin_file_path = plugin_file_path
+        self.module_name = module_name
+
+        self.worker = None
+        self.ready = False
+        self.stopping = False
+        self.crashes = 0
+        self._restart = None
+
+        self._queue = []
+        self._calls = {}
+        self._next_call_id = 0
+
+        self._createProxies()
+        self.spawn()
+
+    def _createProxies(self):
+        """Create a proxy for each command and hook of the plugin class."""
+        hooks = HookRegistry(base=self.yaib.hooks.base)
+        names = set()
+        for attribute in dir(self.plugin_class):
+            if attribute.startswith(CommandRegistry.PREFIXES):
+                names.add(attribute)
+            elif (attribute.startswith(HookRegistry.HOOK_PREFIXES) and
+                    hooks.isOverridden(self.plugin_class, attribute)):
+                names.add(attribute)
+
+        # the worker keeps {nick} up to date for formatDoc
+        names.add('onNickChange')
+
+        # always forwarded by ProcessPlugin.onShutdown
+        names.discard('onShutdown')
+
+        for name in names:
+            func = getattr(self.plugin_class, name, None)
+            if func is None or callable(func):
+                setattr(self, name, self._createProxy(name, func))
+
+        # copy the settings that control dispatch
+        for attribute in ['priority', 'priorities']:
+            if hasattr(self.plugin_class, attribute):
+                setattr(self, attribute, getattr(self.plugin_class, attribute))
+
+    def _createProxy(self, name, func):
+        if (name in Event.HOOK_FIELDS and func is not None and
+                takesEvent(func)):
+            def proxy(event):
+                return self.call(name, (event,), {})
+        else:
+            def proxy(*args, **kwargs):
+                return self.call(name, args, kwargs)
+
+        proxy.__name__ = name
+        proxy.__doc__ = getattr(func, '__doc__', None)
+        return proxy
+
+    def spawn(self):
+        """Start the worker process."""
+        self._restart = None
+        if self.stopping:
+            return
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.realpath(__file__)
+        )))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [root] + [p for p in [env.get('PYTHONPATH')] if p]
+        )
+        self.yaib.clock.spawnProcess(
+            WorkerProcessProtocol(self),
+            sys.executable,
+            [sys.executable, '-m', 'modules.dispatch.plugin_worker'],
+            env=env,
+            path=os.getcwd()
+        )
+
+    def workerStarted(self, worker):
+        if self.stopping:
+            # started before the plugin was stopped
+            worker.transport.closeStdin()
+            return
+        self.worker = worker
+        worker.send((
+            'init',
+            util.objectToDict(self.yaib.config),
+            self.plugin_file_path,
+            self.module_name,
+            self.yaib.nick,
+            self.yaib.command_prefix
+        ))
+
+    def workerEnded(self, worker, reason):
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.ready = False
+
+        # fail everything the dead worker was running
+        calls, self._calls = self._calls, {}
+        for d in calls.values():
+            d.errback(reason)
+
+        if self.stopping:
+            return
+
+        self.crashes += 1
+        delay = min(2 ** self.crashes, self.MAX_RESTART_DELAY)
+        logging.error(
+            "Worker for plugin %s died (%s). Restarting in %d seconds" % (
+                self.name, reason.value, delay
+            )
+        )
+        # not yaib.callLater: the restart is not one of the plugin's calls
+        # to keep in its delayed calls and snapshots
+        self._restart = self.yaib.clock.callLater(delay, self.spawn)
+
+    def call(self, name, args, kwargs):
+        """
+        Call the named method of the plugin in the worker. Returns a
+        Deferred firing with the result, failures are left to the caller
+        (see InFlightTracker) to log and count.
+        """
+        self._next_call_id += 1
+        call_id = self._next_call_id
+        d = self._calls[call_id] = defer.Deferred()
+        self._send(('call', call_id, name, args, kwargs))
+        return d
+
+    def _send(self, message):
+        if self.ready:
+            self.worker.send(message)
+        else:
+            self._queue.append(message)
+
+    def messageReceived(self, message):
+        kind = message[0]
+
+        if kind == 'ready':
+            self.ready = True
+            self.crashes = 0
+            queue, self._queue = self._queue, []
+            for queued in queue:
+                self.worker.send(queued)
+
+        elif kind == 'result':
+            call_id, result, error = message[1:]
+            d = self._calls.pop(call_id, None)
+            if d is None:
+                return
+            if error is None:
+                d.callback(result)
+            else:
+                d.errback(Exception(error))
+
+        elif kind == 'send':
+            self.yaib.sendMessage(*message[1:])
+
+        elif kind == 'action':
+            self.yaib.action(*message[1:])
+
+        elif kind == 'request':
+            request_id, method, args = message[1:]
+            try:
+                response = self._handleRequest(method, args)
+            # answering for external code - catch everything
+            except Exception as e:
+                logging.error(
+                    "Error answering %s for plugin %s worker: %s" % (
+                        method, self.name, repr(e)
+                    )
+                )
+                response = None
+            self.worker.send(('response', request_id, response))
+
+    def _handleRequest(self, method, args):
+        if method == 'isAdmin':
+            return self.yaib.isAdmin(*args)
+        if method.startswith('settings.'):
+            settings = self.yaib.getPluginSettings(self.name)
+            return getattr(settings, method[len('settings.'):])(*args)
+        raise ValueError("Unknown request %s" % method)
+
+    def stop(self):
+        """Stop the worker without restarting it."""
+        self.stopping = True
+        if self._restart is not None:
+            self._restart.cancel()
+            self._restart = None
+        if self.worker is not None:
+            self.worker.send(('stop',))
+            self.worker.transport.closeStdin()
+
+    def onShutdown(self):
+        d = self.call('onShutdown', (), {})
+        self.stop()
+        return d
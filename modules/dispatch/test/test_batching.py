@@ -0,0 +1,125 @@
+from ..batching import EventBatcher
+from ..event import Event
+from ..hook_registry import HookRegistry
+
+
+class FakeDelayedCall(object):
+
+    def __init__(self, delay, func):
+        self.delay = delay
+        self.func = func
+        self.cancelled = False
+
+    def active(self):
+        return not self.cancelled
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def callLater(self, delay, func, *args, **kwargs):
+        call = FakeDelayedCall(delay, func)
+        self.calls.append(call)
+        return call
+
+
+class Plugin(object):
+    name = 'Plugin'
+    batch_size = 3
+    batch_interval = 10
+
+    def __init__(self):
+        self.batches = []
+
+    def onMessageBatch(self, events):
+        self.batches.append(events)
+
+    def onJoinedBatch(self, items):
+        self.batches.append(items)
+
+
+class TestEventBatcher(object):
+
+    def setup(self):
+        self.clock = FakeClock()
+        self.hooks = HookRegistry()
+        self.batcher = EventBatcher(self.hooks, self.clock)
+        self.plugin = Plugin()
+        self.hooks.register(self.plugin)
+        self.batcher.register(self.plugin)
+
+    def send(self, hook, *args):
+        for owner, func, takes_event in self.hooks.get(hook):
+            func(*args)
+
+    def test_batch_hooks_not_called_directly(self):
+        """Test batch handlers are only subscribed through buffers."""
+        assert(len(self.hooks.get('onMessageBatch')) == 0)
+        assert(len(self.hooks.get('onMessage')) == 1)
+
+    def test_flush_on_size(self):
+        """Test a full buffer is delivered immediately."""
+        events = [Event(message=str(i)) for i in range(3)]
+        for event in events:
+            self.send('onMessage', event)
+        assert(self.plugin.batches == [events])
+        assert(self.clock.calls[0].cancelled)
+
+    def test_flush_on_timer(self):
+        """Test a partial buffer is delivered by the clock."""
+        event = Event(message='hi')
+        self.send('onMessage', event)
+        assert(self.plugin.batches == [])
+        assert(self.clock.calls[0].delay == 10)
+        self.clock.calls[0].func()
+        assert(self.plugin.batches == [[event]])
+
+    def test_argument_tuples(self):
+        """Test hooks without records are buffered as argument tuples."""
+        self.send('onJoined', '#yaib')
+        self.batcher.flush()
+        assert(self.plugin.batches == [[('#yaib',)]])
+
+    def test_flush_on_unregister(self):
+        """Test pending events are delivered before unregistering."""
+        event = Event(message='hi')
+        self.send('onMessage', event)
+        self.batcher.unregister(self.plugin)
+        assert(self.plugin.batches == [[event]])
+
+    def test_track_results(self):
+        """Test asynchronous batch results are passed to track."""
+        tracked = []
+        self.batcher = EventBatcher(
+            self.hooks, self.clock,
+            track=lambda owner, name, result: tracked.append((name, result))
+        )
+        plugin = Plugin()
+        plugin.onMessageBatch = lambda events: 'pending'
+        self.batcher.register(plugin)
+        self.batcher.flush()
+        assert(tracked == [])
+
+        for i in range(3):
+            self.send('onMessage', Event(message=str(i)))
+        assert(('onMessageBatch', 'pending') in tracked)
+
+    def test_schedule(self):
+        """Test flush timers can be scheduled for their plugin."""
+        scheduled = []
+
+        def schedule(owner, delay, func):
+            scheduled.append(owner)
+            return self.clock.callLater(delay, func)
+        self.batcher = EventBatcher(self.hooks, self.clock, schedule=schedule)
+        plugin = Plugin()
+        self.batcher.register(plugin)
+        self.send('onMessage', Event(message='hi'))
+        assert(scheduled == [plugin])
+        self.clock.calls[-1].func()
+        assert(len(plugin.batches) == 1)
@@ -0,0 +1,49 @@
+from ..channel_router import ChannelRouter
+
+
+class TestChannelRouter(object):
+
+    def setup(self):
+        self.router = ChannelRouter()
+        self.entries = [('everywhere', 1), ('restricted', 2)]
+        self.router.setChannels('restricted', ['#yaib', '#ludum*'])
+
+    def test_unrestricted(self):
+        """Test owners without channels are active everywhere."""
+        assert(self.router.isActive('everywhere', '#anything'))
+
+    def test_exact_channel(self):
+        """Test owners are active in their channels, ignoring case."""
+        assert(self.router.isActive('restricted', '#YAIB'))
+        assert(not self.router.isActive('restricted', '#other'))
+
+    def test_pattern(self):
+        """Test channel patterns."""
+        assert(self.router.isActive('restricted', '#ludumdare'))
+
+    def test_private_messages(self):
+        """Test private messages are never filtered."""
+        assert(self.router.isActive('restricted', 'some_nick'))
+
+    def test_filter(self):
+        """Test filtering entries by channel."""
+        filtered = self.router.filter('onMessage', '#other', self.entries)
+        assert(filtered == [('everywhere', 1)])
+        filtered = self.router.filter('onMessage', '#yaib', self.entries)
+        assert(filtered == self.entries)
+
+    def test_invalidate_on_change(self):
+        """Test changing channels drops cached decisions."""
+        self.router.filter('onMessage', '#other', self.entries)
+        self.router.setChannels('restricted', None)
+        filtered = self.router.filter('onMessage', '#other', self.entries)
+        assert(filtered == self.entries)
+
+    def test_private_messages_not_cached(self):
+        """Test private message targets do not grow the cache."""
+        for i in range(100):
+            filtered = self.router.filter(
+                'onPrivateMessage', 'nick%d' % i, self.entries
+            )
+            assert(filtered == self.entries)
+        assert(len(self.router._cache) == 0)
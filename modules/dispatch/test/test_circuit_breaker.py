@@ -0,0 +1,80 @@
+from tools import util
+
+from ..circuit_breaker import CircuitBreaker
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(object):
+
+    def setup(self):
+        self.timer = FakeTimer()
+        self.breaker = CircuitBreaker(timer=self.timer)
+        self.breaker.configure(util.dictToObject({
+            'breaker': {'failures': 3, 'window': 10, 'cooldown': 60}
+        }))
+
+    def fail(self, times, plugin_name='Plugin'):
+        for i in range(times):
+            self.breaker.failure(plugin_name, 'onMessage')
+
+    def test_closed_by_default(self):
+        """Test hooks are called while nothing has failed."""
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+        assert(self.breaker.tripped == {})
+
+    def test_opens_after_failures(self):
+        """Test the breaker opens after enough failures in the window."""
+        self.fail(2)
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+        self.fail(1)
+        assert(not self.breaker.allow('Plugin', 'onMessage'))
+        assert(self.breaker.allow('Plugin', 'onJoined'))
+        assert(self.breaker.allow('Other', 'onMessage'))
+
+    def test_window(self):
+        """Test failures older than the window are forgotten."""
+        self.fail(2)
+        self.timer.now = 11
+        self.fail(1)
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+
+    def test_half_open_success_closes(self):
+        """Test a successful retry after the cooldown closes the breaker."""
+        self.fail(3)
+        self.timer.now = 61
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+        self.breaker.success('Plugin', 'onMessage')
+        assert(self.breaker.tripped == {})
+
+        # the old failures don't count towards opening it again
+        self.fail(1)
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+
+    def test_half_open_failure_reopens(self):
+        """Test a failed retry opens the breaker for another cooldown."""
+        self.fail(3)
+        self.timer.now = 61
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+        self.fail(1)
+        assert(not self.breaker.allow('Plugin', 'onMessage'))
+        assert(self.breaker.states() == [
+            ('Plugin', 'onMessage', 'open', 60, 2)
+        ])
+
+    def test_reset(self):
+        """Test resetting a plugin only closes its breakers."""
+        self.fail(3)
+        self.fail(3, 'Other')
+        self.breaker.reset('Plugin')
+        assert(self.breaker.allow('Plugin', 'onMessage'))
+        assert(not self.breaker.allow('Other', 'onMessage'))
+        self.breaker.reset()
+        assert(self.breaker.tripped == {})
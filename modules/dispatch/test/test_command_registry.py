@@ -0,0 +1,83 @@
+from ..command_registry import CommandRegistry
+
+
+class FakePlugin(object):
+    name = 'FakePlugin'
+
+    @property
+    def command_prefix(self):
+        return '!'
+
+    def command_hello(self, user, nick, channel, more):
+        pass
+
+    def admin_hello(self, user, nick, channel, more):
+        pass
+
+    def admin_secret(self, user, nick, channel, more):
+        pass
+
+
+class OtherPlugin(object):
+    name = 'OtherPlugin'
+
+    def command_hello(self, user, nick, channel, more):
+        pass
+
+    def command_other(self, user, nick, channel, more):
+        pass
+
+
+class TestCommandRegistry(object):
+
+    def setup(self):
+        self.registry = CommandRegistry()
+        self.fake = FakePlugin()
+        self.other = OtherPlugin()
+        self.registry.register(self.fake)
+        self.registry.register(self.other)
+
+    def test_regular_command(self):
+        """Test non-admins get the regular handler."""
+        entries = self.registry.get('hello')
+        owner, func, is_admin = self.registry.select(entries, False, False)
+        assert(owner is self.fake)
+        assert(func == self.fake.command_hello)
+        assert(not is_admin)
+
+    def test_admin_command(self):
+        """Test admins get the admin handler."""
+        entries = self.registry.get('hello')
+        owner, func, is_admin = self.registry.select(entries, True, False)
+        assert(func == self.fake.admin_hello)
+        assert(is_admin)
+
+    def test_admin_only_command(self):
+        """Test admin only commands are hidden from non-admins."""
+        entries = self.registry.get('secret')
+        owner, func, is_admin = self.registry.select(entries, False, False)
+        assert(func is None)
+
+    def test_not_found(self):
+        """Test unknown commands are not found."""
+        assert(self.registry.get('nothing') is None)
+
+    def test_properties_skipped(self):
+        """Test non-callable attributes are not registered as commands."""
+        assert(self.registry.get('prefix') is None)
+
+    def test_unregister(self):
+        """Test unregistering falls back to the next owner."""
+        self.registry.unregister(self.fake)
+        entries = self.registry.get('hello')
+        owner, func, is_admin = self.registry.select(entries, True, False)
+        assert(owner is self.other)
+        assert(self.registry.get('secret') is None)
+
+    def test_reregister_goes_last(self):
+        """Test a reloaded owner is searched after the existing owners."""
+        self.registry.unregister(self.fake)
+        self.registry.register(self.fake)
+        entries = self.registry.get('hello')
+        owner, func, is_admin = self.registry.select(entries, False, False)
+        assert(owner is self.other)
@@ -0,0 +1,57 @@
+from ..event import Event, takesEvent
+
+
+class Plugin(object):
+
+    def onMessage(self, event):
+        pass
+
+    def onUserJoined(self, user, nick, channel):
+        pass
+
+    def onUserLeft(self, *args, **kwargs):
+        pass
+
+
+class TestEvent(object):
+
+    def setup(self):
+        self.event = Event.fromUser(
+            'nick!user@some.host',
+            channel='#yaib',
+            message='hello'
+        )
+
+    def test_from_user(self):
+        """Test splitting the nick and host from the user string."""
+        assert(self.event.nick == 'nick')
+        assert(self.event.host == 'some.host')
+        assert(self.event.timestamp > 0)
+
+    def test_fields(self):
+        """Test unpacking the legacy arguments for a hook."""
+        assert(
+            self.event.fields('onMessage') ==
+            ('nick!user@some.host', 'nick', '#yaib', 'hello', False)
+        )
+
+    def test_from_hook_args(self):
+        """Test building an event from legacy hook arguments."""
+        event = Event.fromHookArgs(
+            'onMessage',
+            ('nick!user@some.host', 'nick', '#yaib', 'hello'),
+            {'highlight': True}
+        )
+        assert(event.channel == '#yaib')
+        assert(event.highlight is True)
+
+    def test_slots(self):
+        """Test events do not carry an instance dict."""
+        assert(not hasattr(self.event, '__dict__'))
+
+    def test_takes_event(self):
+        """Test detecting hooks that accept the record."""
+        plugin = Plugin()
+        assert(takesEvent(plugin.onMessage))
+        assert(not takesEvent(plugin.onUserJoined))
+        assert(not takesEvent(plugin.onUserLeft))
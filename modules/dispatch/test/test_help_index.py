@@ -0,0 +1,96 @@
+from ..help_index import HelpIndex
+
+
+class CorePlugin(object):
+    name = 'CorePlugin'
+
+    def command_help(self):
+        """Shows the help for {nick}"""
+
+    def admin_quit(self):
+        """Makes {nick} quit -
+        Usage: {command_prefix}quit"""
+
+    def command_undocumented(self):
+        pass
+
+
+class EchoPlugin(object):
+    name = 'EchoPlugin'
+
+    def command_echo(self):
+        """Echoes {with braces}"""
+
+
+class ExamplePlugin(object):
+    name = 'ExamplePlugin'
+
+    command_prefix = '!'
+
+    def command_plugintest(self):
+        """Sends a test message"""
+
+
+class TestHelpIndex(object):
+
+    def setup(self):
+        self.values = {'nick': 'yaib', 'command_prefix': '!'}
+        self.index = HelpIndex(lambda doc: doc.format(**self.values))
+        self.build()
+
+    def build(self):
+        self.index.build(
+            [CorePlugin(), EchoPlugin(), ExamplePlugin()],
+            (self.values['nick'], self.values['command_prefix']),
+            [(self.values['nick'], 'CorePlugin')]
+        )
+
+    def test_overview(self):
+        """Test the overview lists the aliases, then the plugins."""
+        assert(self.index.overview[-1] ==
+               'yaib, CorePlugin, EchoPlugin, ExamplePlugin')
+        assert("'!help category'" in self.index.overview[0])
+
+    def test_lines(self):
+        """Test the commands are pre-rendered, admin commands first."""
+        lines = self.index.getLines('CorePlugin')
+        assert(lines[2:] == ['- help: Shows the help for yaib'])
+
+        lines = self.index.getLines('CorePlugin', is_admin=True)
+        assert(lines[2:] == [
+            '- quit (Admin only): Makes yaib quit -',
+            '        Usage: !quit',
+            '- help: Shows the help for yaib'
+        ])
+        assert(lines[1].endswith("category 'CorePlugin'"))
+
+    def test_alias(self):
+        """Test aliases have the same commands as their plugin."""
+        assert(self.index.getLines('yaib')[2:] ==
+               self.index.getLines('CorePlugin')[2:])
+
+    def test_find(self):
+        """Test categories are found by exact name or prefix."""
+        assert(self.index.find('echoplugin') == ['EchoPlugin'])
+        assert(self.index.find('core') == ['CorePlugin'])
+        assert(self.index.find('e') == ['EchoPlugin', 'ExamplePlugin'])
+        assert(self.index.find('missing') == [])
+        assert(self.index.getLines('missing') is None)
+
+    def test_bad_docstring(self):
+        """Test a docstring that can not be formatted is kept as is."""
+        assert(self.index.getLines('EchoPlugin')[2:] ==
+               ['- echo: Echoes {with braces}'])
+
+    def test_current(self):
+        """Test the index is out of date once invalidated or renamed."""
+        assert(self.index.isCurrent(('yaib', '!')))
+        assert(not self.index.isCurrent(('yaib2', '!')))
+        self.index.invalidate()
+        assert(not self.index.isCurrent(('yaib', '!')))
+
+        self.values['nick'] = 'yaib2'
+        self.build()
+        assert(self.index.find('yaib2') == ['yaib2'])
+        assert(self.index.getLines('CorePlugin')[2:] ==
+               ['- help: Shows the help for yaib2'])
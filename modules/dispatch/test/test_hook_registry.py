@@ -0,0 +1,95 @@
+from ..hook_registry import HookRegistry
+
+
+class Base(object):
+    def onMessage(self, *args):
+        pass
+
+    def onJoined(self, channel):
+        pass
+
+
+class Plugin(Base):
+    name = 'Plugin'
+
+    def onMessage(self, *args):
+        pass
+
+    def irc_RPL_WHOISUSER(self, *args):
+        pass
+
+
+class TestHookRegistry(object):
+
+    def setup(self):
+        self.registry = HookRegistry(base=Base)
+        self.plugin = Plugin()
+        self.registry.register(self.plugin)
+
+    def test_overridden_hook(self):
+        """Test hooks the plugin implements are subscribed."""
+        subscribers = self.registry.get('onMessage')
+        assert(subscribers == [(self.plugin, self.plugin.onMessage, False)])
+
+    def test_default_hook_skipped(self):
+        """Test hooks only inherited from the base are not subscribed."""
+        assert(len(self.registry.get('onJoined')) == 0)
+
+    def test_irc_hook(self):
+        """Test dynamic irc_ hooks are subscribed."""
+        assert(len(self.registry.get('irc_RPL_WHOISUSER')) == 1)
+
+    def test_unregister(self):
+        """Test unregistering removes every subscription."""
+        self.registry.unregister(self.plugin)
+        assert(len(self.registry.get('onMessage')) == 0)
+        assert(len(self.registry.names()) == 0)
+
+    def test_no_base(self):
+        """Test every hook is subscribed without a base class."""
+        registry = HookRegistry()
+        registry.register(self.plugin)
+        assert(len(registry.get('onJoined')) == 1)
+
+
+class LowPlugin(Plugin):
+    name = 'LowPlugin'
+    priority = -10
+
+
+class HighPlugin(Plugin):
+    name = 'HighPlugin'
+    priorities = {'onMessage': 10}
+
+
+class TestHookPriorities(object):
+
+    def setup(self):
+        self.registry = HookRegistry(base=Base)
+        self.low = LowPlugin()
+        self.normal = Plugin()
+        self.high = HighPlugin()
+        for plugin in [self.low, self.normal, self.high]:
+            self.registry.register(plugin)
+
+    def owners(self, hook):
+        return [owner for owner, func, e in self.registry.get(hook)]
+
+    def test_priority_order(self):
+        """Test higher priority subscribers come first."""
+        assert(
+            self.owners('onMessage') == [self.high, self.normal, self.low]
+        )
+
+    def test_per_hook_priority(self):
+        """Test per hook priorities fall back to the default priority."""
+        assert(
+            self.owners('irc_RPL_WHOISUSER') ==
+            [self.normal, self.high, self.low]
+        )
+
+    def test_same_priority_keeps_order(self):
+        """Test equal priorities keep registration order."""
+        other = Plugin()
+        self.registry.register(other)
+        assert(self.owners('onMessage')[1:3] == [self.normal, other])
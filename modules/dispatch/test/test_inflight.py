@@ -0,0 +1,69 @@
+from twisted.internet import defer
+
+from ..inflight import InFlightTracker
+
+
+class Plugin(object):
+    name = 'Plugin'
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInFlightTracker(object):
+
+    def setup(self):
+        self.timer = FakeTimer()
+        self.tracker = InFlightTracker(timer=self.timer)
+        self.plugin = Plugin()
+
+    def test_synchronous_results_untracked(self):
+        """Test regular return values are passed through."""
+        assert(self.tracker.track(self.plugin, 'test', 'result') == 'result')
+        assert(self.tracker.count() == 0)
+
+    def test_deferred_in_flight(self):
+        """Test deferreds are tracked until they fire."""
+        d = defer.Deferred()
+        self.tracker.track(self.plugin, 'test', d)
+        assert(self.tracker.count() == 1)
+        assert(self.tracker.count('Plugin') == 1)
+        assert(self.tracker.count('Other') == 0)
+
+        self.timer.now = 3
+        assert(self.tracker.pending() == [('Plugin', 'test', 3)])
+
+        d.callback('done')
+        assert(self.tracker.count() == 0)
+        assert(self.tracker.finished == 1)
+
+    def test_failures_consumed(self):
+        """Test failed deferreds are counted and not left unhandled."""
+        d = self.tracker.track(
+            self.plugin, 'test', defer.fail(ValueError('broken'))
+        )
+        assert(self.tracker.failed == 1)
+        assert(self.tracker.count() == 0)
+        assert(d.called and d.result is None)
+
+    def test_generators_run(self):
+        """Test inlineCallbacks style generators are started."""
+        waiting = defer.Deferred()
+        results = []
+
+        def command():
+            result = yield waiting
+            results.append(result)
+
+        d = self.tracker.track(self.plugin, 'test', command())
+        assert(self.tracker.count() == 1)
+        waiting.callback('reply')
+        assert(results == ['reply'])
+        assert(d.called)
+        assert(self.tracker.count() == 0)
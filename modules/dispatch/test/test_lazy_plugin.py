@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+
+from ..command_registry import CommandRegistry
+from ..hook_registry import HookRegistry
+from ..lazy_plugin import LazyPlugin, PluginManifest, describePlugin
+from ..threads import blocking
+
+
+class Base(object):
+    def onMessage(self, *args):
+        pass
+
+    def onJoined(self, channel):
+        pass
+
+    def onPluginsLoaded(self):
+        pass
+
+
+class Plugin(Base):
+    name = 'Plugin'
+    priority = 5
+
+    def command_test(self, user, nick, channel, more):
+        """Test command"""
+        return 'tested %s' % more
+
+    @blocking
+    def admin_slow(self, user, nick, channel, more):
+        pass
+
+    def onMessage(self, event):
+        return event
+
+    def onPluginsLoaded(self):
+        pass
+
+
+class TestDescribePlugin(object):
+
+    def setup(self):
+        self.entry = describePlugin(Plugin, HookRegistry(base=Base))
+
+    def test_commands(self):
+        """Test commands are listed with their docstrings."""
+        assert(self.entry['commands'] == {
+            'command_test': {'doc': 'Test command', 'blocking': False},
+            'admin_slow': {'doc': None, 'blocking': True}
+        })
+
+    def test_hooks(self):
+        """Test only overridden hooks are listed."""
+        assert(self.entry['hooks'] == {
+            'onMessage': {'event': True, 'blocking': False},
+            'onPluginsLoaded': {'event': False, 'blocking': False}
+        })
+
+    def test_dispatch_attributes(self):
+        """Test the name and priority are kept."""
+        assert(self.entry['name'] == 'Plugin')
+        assert(self.entry['priority'] == 5)
+
+
+class TestPluginManifest(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp(prefix='yaib-test-')
+        self.plugin_file = os.path.join(self.directory, 'plugin.py')
+        with open(self.plugin_file, 'w') as f:
+            f.write('# plugin\n')
+        self.path = os.path.join(self.directory, 'manifest.json')
+        self.manifest = PluginManifest(self.path)
+        self.hooks = HookRegistry(base=Base)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        """Test saved entries are used by the next load."""
+        entry = self.manifest.update(self.plugin_file, Plugin, self.hooks)
+        self.manifest.save()
+
+        manifest = PluginManifest(self.path)
+        manifest.load()
+        assert(manifest.get(self.plugin_file) == entry)
+
+    def test_stale(self):
+        """Test entries are dropped when the plugin file changes."""
+        self.manifest.update(self.plugin_file, Plugin, self.hooks)
+        with open(self.plugin_file, 'a') as f:
+            f.write('# changed\n')
+        assert(self.manifest.get(self.plugin_file) is None)
+
+    def test_unchanged_not_saved(self):
+        """Test the manifest is only written when it changes."""
+        self.manifest.update(self.plugin_file, Plugin, self.hooks)
+        self.manifest.save()
+        os.remove(self.path)
+        self.manifest.update(self.plugin_file, Plugin, self.hooks)
+        self.manifest.save()
+        assert(not os.path.exists(self.path))
+
+
+class TestLazyPlugin(object):
+
+    def setup(self):
+        self.activated = []
+        entry = describePlugin(Plugin, HookRegistry(base=Base))
+        self.stub = LazyPlugin(entry, 'plugin', self.activate)
+
+    def activate(self, stub):
+        self.activated.append(stub)
+        return Plugin()
+
+    def test_not_activated(self):
+        """Test the plugin is not loaded until it is used."""
+        registry = CommandRegistry()
+        registry.register(self.stub)
+        assert(self.stub.command_test.__doc__ == 'Test command')
+        assert(self.activated == [])
+
+    def test_activated_once(self):
+        """Test the first call loads the plugin and is passed on."""
+        assert(self.stub.command_test('u', 'n', '#c', 'x') == 'tested x')
+        assert(self.stub.command_test('u', 'n', '#c', 'y') == 'tested y')
+        assert(self.activated == [self.stub])
+
+    def test_event_hooks(self):
+        """Test hooks taking the Event record keep their signature."""
+        registry = HookRegistry(base=Base)
+        registry.register(self.stub)
+        owner, func, takes_event = registry.get('onMessage')[0]
+        assert(takes_event)
+        assert(func('event') == 'event')
+
+    def test_deferred_hooks(self):
+        """Test the stub does not load the plugin for onPluginsLoaded."""
+        registry = HookRegistry(base=Base)
+        registry.register(self.stub)
+        assert(len(registry.get('onPluginsLoaded')) == 0)
+
+    def test_failed(self):
+        """Test a plugin that fails to load is only tried once."""
+        self.stub._activate = lambda stub: self.activated.append(stub)
+        assert(self.stub.command_test('u', 'n', '#c', 'x') is None)
+        assert(self.stub.command_test('u', 'n', '#c', 'x') is None)
+        assert(self.activated == [self.stub])
+
+    def test_state(self):
+        """Test restored state is kept for the real plugin."""
+        self.stub.restoreState({'cache': 1})
+        assert(self.stub.serializeState() == {'cache': 1})
@@ -0,0 +1,210 @@
+from twisted.internet import defer
+
+from ..memoize import MemoCache, memoize, getCaches, normalizeArgument
+from ..threads import blocking
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+timer = FakeTimer()
+
+
+class FakeThreads(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, owner, func, *args, **kwargs):
+        self.calls.append(func.__name__)
+        return defer.succeed(func(*args, **kwargs))
+
+
+class FakeYaib(object):
+
+    def __init__(self):
+        self.threads = FakeThreads()
+
+
+class Plugin(object):
+    name = 'Plugin'
+
+    def __init__(self):
+        self.yaib = FakeYaib()
+        self.replies = []
+        self.calls = 0
+        self.pending = []
+
+    def reply(self, channel, nick, message):
+        self.replies.append((channel, nick, message))
+
+    @memoize(ttl=10, normalize=normalizeArgument, timer=timer)
+    def command_weather(self, user, nick, channel, more):
+        self.calls += 1
+        return ['Weather in %s' % more.strip(), 'Sunny']
+
+    @memoize(ttl=10, per_channel=True, timer=timer)
+    def command_topic(self, user, nick, channel, more):
+        self.calls += 1
+        return 'Topic of %s' % channel
+
+    @memoize(ttl=10, timer=timer)
+    def command_search(self, user, nick, channel, more):
+        self.calls += 1
+        d = defer.Deferred()
+        self.pending.append(d)
+        return d
+
+    @memoize(ttl=10, size=2, normalize=normalizeArgument, timer=timer)
+    def lookup(self, word):
+        self.calls += 1
+        return word.upper() if word else None
+
+    @memoize(timer=timer)
+    @blocking
+    def command_fetch(self, user, nick, channel, more):
+        self.calls += 1
+        return 'Fetched %s' % more
+
+
+class TestMemoize(object):
+
+    def setup(self):
+        timer.now = 0
+        self.plugin = Plugin()
+
+    def test_command_output(self):
+        """Test memoized commands reply with their cached output."""
+        self.plugin.command_weather('u', 'a', '#c', 'Paris')
+        self.plugin.command_weather('u', 'b', '#d', '  paris ')
+        assert(self.plugin.calls == 1)
+        assert(self.plugin.replies == [
+            ('#c', 'a', 'Weather in Paris'), ('#c', 'a', 'Sunny'),
+            ('#d', 'b', 'Weather in Paris'), ('#d', 'b', 'Sunny')
+        ])
+
+        cache = getCaches(self.plugin)[0]
+        assert(cache.name == 'command_weather')
+        assert((cache.hits, cache.misses) == (1, 1))
+        assert(cache.hitRate() == 0.5)
+
+    def test_ttl(self):
+        """Test results expire after ttl seconds."""
+        self.plugin.command_weather('u', 'a', '#c', 'paris')
+        timer.now = 9
+        self.plugin.command_weather('u', 'a', '#c', 'paris')
+        assert(self.plugin.calls == 1)
+        timer.now = 10
+        self.plugin.command_weather('u', 'a', '#c', 'paris')
+        assert(self.plugin.calls == 2)
+
+    def test_exact_arguments(self):
+        """Test arguments are only normalized when asked to."""
+        self.plugin.command_search('u', 'a', '#c', 'Foo')
+        self.plugin.command_search('u', 'b', '#c', 'foo')
+        assert(self.plugin.calls == 2)
+        self.plugin.command_search('u', 'c', '#c', 'Foo')
+        assert(self.plugin.calls == 2)
+
+    def test_per_channel(self):
+        """Test per_channel keeps the output of each channel apart."""
+        self.plugin.command_topic('u', 'a', '#c', '')
+        self.plugin.command_topic('u', 'a', '#d', '')
+        self.plugin.command_topic('u', 'b', '#c', '')
+        assert(self.plugin.calls == 2)
+        assert([r[2] for r in self.plugin.replies] ==
+               ['Topic of #c', 'Topic of #d', 'Topic of #c'])
+
+    def test_coalesced(self):
+        """Test identical requests wait for the running one."""
+        first = self.plugin.command_search('u', 'a', '#c', 'yaib')
+        second = self.plugin.command_search('u', 'b', '#c', 'yaib')
+        assert(self.plugin.calls == 1)
+        assert(self.plugin.replies == [])
+
+        self.plugin.pending[0].callback('Found yaib')
+        assert(first.called and second.called)
+        assert(self.plugin.replies == [
+            ('#c', 'a', 'Found yaib'), ('#c', 'b', 'Found yaib')
+        ])
+
+        # later requests get the result right away
+        third = self.plugin.command_search('u', 'c', '#c', 'yaib')
+        assert(third.called)
+        assert(self.plugin.calls == 1)
+
+        cache = getCaches(self.plugin)[0]
+        assert((cache.hits, cache.coalesced, cache.misses) == (1, 1, 1))
+
+    def test_failures_not_cached(self):
+        """Test failures reach every waiting request and are not cached."""
+        first = self.plugin.command_search('u', 'a', '#c', 'yaib')
+        second = self.plugin.command_search('u', 'b', '#c', 'yaib')
+        errors = []
+        first.addErrback(errors.append)
+        second.addErrback(errors.append)
+
+        self.plugin.pending[0].errback(ValueError('down'))
+        assert(len(errors) == 2)
+        assert(self.plugin.replies == [])
+
+        self.plugin.command_search('u', 'a', '#c', 'yaib')
+        assert(self.plugin.calls == 2)
+
+    def test_methods(self):
+        """Test other methods return the cached value, least recent dropped."""
+        assert(self.plugin.lookup('a') == 'A')
+        assert(self.plugin.lookup(' A') == 'A')
+        assert(self.plugin.lookup('b') == 'B')
+        assert(self.plugin.calls == 2)
+
+        self.plugin.lookup('a')
+        self.plugin.lookup('c')
+        assert(self.plugin.calls == 3)
+        self.plugin.lookup('a')
+        assert(self.plugin.calls == 3)
+        self.plugin.lookup('b')
+        assert(self.plugin.calls == 4)
+
+        # None is not cached
+        self.plugin.lookup('')
+        self.plugin.lookup('')
+        assert(self.plugin.calls == 6)
+
+    def test_per_instance(self):
+        """Test each plugin instance has its own caches."""
+        self.plugin.lookup('a')
+        other = Plugin()
+        other.lookup('a')
+        assert(other.calls == 1)
+        assert(getCaches(Plugin()) == [])
+
+    def test_blocking(self):
+        """Test only misses of blocking commands use the thread pool."""
+        assert(not Plugin.command_fetch.blocking)
+        self.plugin.command_fetch('u', 'a', '#c', 'x')
+        self.plugin.command_fetch('u', 'a', '#c', 'x')
+        assert(self.plugin.yaib.threads.calls == ['command_fetch'])
+        assert([r[2] for r in self.plugin.replies] == ['Fetched x'] * 2)
+
+    def test_clear(self):
+        """Test clear drops the results and the statistics."""
+        cache = MemoCache('test', timer=timer)
+        assert(cache.call('key', lambda: 1) == 1)
+        assert(cache.call('key', lambda: 2) == 1)
+        cache.clear()
+        assert((len(cache), cache.hits, cache.misses) == (0, 0, 0))
+        assert(cache.call('key', lambda: 2) == 2)
+
+    def test_unhashable(self):
+        """Test arguments that can't be hashed are never cached."""
+        cache = MemoCache('test', timer=timer)
+        assert(cache.call({}, lambda: 1) == 1)
+        assert(cache.call({}, lambda: 2) == 2)
+        assert(len(cache) == 0)
@@ -0,0 +1,126 @@
+import os
+import imp
+import sys
+import time
+import shutil
+import struct
+import marshal
+import tempfile
+
+from ..plugin_loader import PluginLoader
+
+
+class TestPluginLoader(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp(prefix='yaib-test-')
+        self.path = os.path.join(self.directory, 'loadertest.py')
+        self.write('VALUE = 1\n\ndef run():\n    return VALUE\n')
+        self.loader = PluginLoader()
+
+    def teardown(self):
+        sys.modules.pop('loadertest', None)
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        module = self.loader.load('loadertest', self.path)
+        self.loader.install('loadertest', module)
+        return module
+
+    def write(self, source, mtime=None):
+        with open(self.path, 'w') as f:
+            f.write(source)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_load(self):
+        """Test the module is imported from the file."""
+        module = self.loader.load('loadertest', self.path)
+        assert(module.run() == 1)
+        assert(module.__file__ == self.path)
+        assert(not self.loader.isLoaded(self.path))
+        assert('loadertest' not in sys.modules)
+
+        self.loader.install('loadertest', module)
+        assert(self.loader.isLoaded(self.path))
+        assert(sys.modules['loadertest'] is module)
+
+    def test_unchanged(self):
+        """Test files are only changed when their contents change."""
+        assert(self.loader.isChanged(self.path))
+        self.load()
+        assert(not self.loader.isChanged(self.path))
+
+        # touched
+        self.write('VALUE = 1\n\ndef run():\n    return VALUE\n', 1000)
+        assert(not self.loader.isChanged(self.path))
+
+        self.write('VALUE = 2\n\ndef run():\n    return VALUE\n', 2000)
+        assert(self.loader.isChanged(self.path))
+
+    def test_reuses_code(self):
+        """Test unchanged files are not compiled again."""
+        first = self.load().run
+        second = self.load().run
+        assert(first is not second)
+        assert(first.func_code is second.func_code)
+
+        self.write('VALUE = 2\n\ndef run():\n    return VALUE\n')
+        third = self.load()
+        assert(third.run() == 2)
+        assert(not self.loader.isChanged(self.path))
+
+    def test_bytecode(self):
+        """Test an up to date .pyc is used on the first load."""
+        mtime = int(time.time()) - 10
+        os.utime(self.path, (mtime, mtime))
+        with open(self.path + 'c', 'wb') as f:
+            f.write(imp.get_magic())
+            f.write(struct.pack('<I', mtime))
+            marshal.dump(compile('VALUE = 3\n', self.path, 'exec'), f)
+        assert(self.loader.load('loadertest', self.path).VALUE == 3)
+
+    def test_stale_bytecode(self):
+        """Test an out of date .pyc is compiled again."""
+        with open(self.path + 'c', 'wb') as f:
+            f.write(imp.get_magic())
+            f.write(struct.pack('<I', 0))
+            marshal.dump(compile('VALUE = 3\n', self.path, 'exec'), f)
+        assert(self.loader.load('loadertest', self.path).VALUE == 1)
+
+    def test_reload(self):
+        """Test reloading replaces the module, and old code keeps working."""
+        run = self.load().run
+        self.write('VALUE = 2\n\ndef run():\n    return VALUE\n')
+        module = self.load()
+        assert(module.run() == 2)
+        assert(run() == 1)
+
+    def test_failed_reload(self):
+        """Test a reload that fails keeps the loaded module."""
+        module = self.load()
+        self.write('VALUE = 2\n\nraise ValueError()\n')
+        try:
+            self.loader.load('loadertest', self.path)
+            assert(False), 'the error was swallowed'
+        except ValueError:
+            pass
+        assert(sys.modules['loadertest'] is module)
+        assert(module.run() == 1)
+
+    def test_forget(self):
+        """Test forgotten modules are dropped."""
+        self.load()
+        self.loader.forget('loadertest', self.path)
+        assert('loadertest' not in sys.modules)
+        assert(not self.loader.isLoaded(self.path))
+
+    def test_failed_load(self):
+        """Test a module that raises is not recorded as loaded."""
+        self.write('raise ValueError()\n')
+        try:
+            self.loader.load('loadertest', self.path)
+            assert(False), 'the error was swallowed'
+        except ValueError:
+            pass
+        assert(self.loader.isChanged(self.path))
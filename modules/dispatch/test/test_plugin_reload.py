@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__)
+))))
+
+PLUGIN = '''
+from sqlalchemy import Column, String
+
+from plugins.baseplugin import BasePlugin
+from modules.persistence import Base, getModelBase
+from tools.eventbus import pub
+
+
+VERSION = %d
+
+
+class LeakyThing(Base, getModelBase('leaky')):
+    name = Column(String(50))
+
+
+class Plugin(BasePlugin):
+    name = 'LeakyPlugin'
+
+    def configure(self, configuration):
+        self.cache = [str(i) * 100 for i in range(100)]
+        self.unloaded = False
+        pub.subscribe(self.onTick, 'core:tick')
+        pub.subscribe(self.onTick, 'leaky:tick')
+        self.callLater(3600, self.onTick)
+
+        # calls of other functions than its methods are cancelled too
+        def tick():
+            self.onTick()
+        self.callLater(3600, tick)
+
+    def command_leaky(self, user, nick, channel, more):
+        return VERSION
+
+    def onTick(self, **kwargs):
+        pass
+
+    def onUnload(self):
+        self.unloaded = True
+'''
+
+# reloads the plugin in a real yaib and reports what is left behind
+SCRIPT = '''
+import gc
+import os
+import sys
+import json
+import heapq
+import weakref
+import logging
+
+sys.path.insert(0, %(root)r)
+logging.disable(logging.CRITICAL)
+
+import yaib
+from twisted.internet import reactor
+from tools.eventbus import pub
+from modules.persistence import Base
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+RELOADS = %(reloads)d
+# the objects are counted after these versions, once caches are warm
+CHECKPOINTS = [RELOADS // 5, RELOADS + 1]
+path = os.path.join('plugins', 'leaky', 'leaky.py')
+
+
+def edit(version):
+    with open(path, 'w') as f:
+        f.write(%(plugin)r %% version)
+    os.utime(path, (version, version))
+
+
+def getPlugin():
+    return [p for p in bot.plugins if p.name == 'LeakyPlugin'][0]
+
+
+def countObjects():
+    # the reactor drops the cancelled calls, which hold on to the plugins
+    # that made them, every 50 or so cancellations: drop them all so the
+    # count does not depend on when that last happened
+    reactor._pendingTimedCalls = [
+        c for c in reactor._pendingTimedCalls if not c.cancelled
+    ]
+    heapq.heapify(reactor._pendingTimedCalls)
+    reactor._cancellations = 0
+    # weakref callbacks run while collecting can leave more garbage
+    while gc.collect():
+        pass
+    return len(gc.get_objects()) - len(plugins) - len(models)
+
+
+edit(1)
+bot = yaib.Yaib()
+
+plugins = []
+models = []
+unloaded = []
+objects = []
+for version in range(2, RELOADS + 2):
+    plugin = getPlugin()
+    plugins.append(weakref.ref(plugin))
+    models.append(weakref.ref(sys.modules['leaky'].LeakyThing))
+    edit(version)
+    reloaded, removed = bot.reloadPlugins()
+    assert(reloaded == ['LeakyPlugin']), reloaded
+    unloaded.append(plugin.unloaded)
+    del plugin
+
+    # the reactor drops cancelled calls as it runs
+    reactor.runUntilCurrent()
+
+    if version in CHECKPOINTS:
+        objects.append(countObjects())
+    if version == CHECKPOINTS[0] and tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+
+result = {
+    'version': getPlugin().command_leaky(None, None, None, ''),
+    'unloaded': all(unloaded),
+    'plugins': len([r for r in plugins if r() is not None]),
+    'models': len([r for r in models if r() is not None]),
+    'tables': [t for t in Base.metadata.tables if t.startswith('leaky')],
+    'listeners': len(pub.getTopic('core:tick').listeners),
+    'delayed': len([c for c in bot.delayed if c.active()]),
+    'objects': objects[1] - objects[0],
+    'memory': None
+}
+if tracemalloc is not None:
+    after = tracemalloc.take_snapshot()
+    result['memory'] = sum(
+        stat.size_diff for stat in after.compare_to(before, 'filename')
+    )
+
+# a version that fails to load leaves the loaded one running
+module = sys.modules['leaky']
+model = module.LeakyThing
+with open(path, 'a') as f:
+    f.write("raise ValueError('broken')\\n")
+os.utime(path, (RELOADS + 2, RELOADS + 2))
+result['failed'] = {
+    'reloaded': bot.reloadPlugins()[0],
+    'module': sys.modules['leaky'] is module,
+    'model': Base._decl_class_registry.get('LeakyThing') is model,
+    'table': Base.metadata.tables['leaky_leakything'] is model.__table__,
+    'version': getPlugin().command_leaky(None, None, None, '')
+}
+print(json.dumps(result))
+'''
+
+
+class TestPluginReload(object):
+    """Reloads a plugin hundreds of times in a real yaib process."""
+
+    RELOADS = 500
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp(prefix='yaib-test-')
+        os.makedirs(os.path.join(self.directory, 'plugins', 'leaky'))
+        with open(os.path.join(self.directory, 'config.json'), 'w') as f:
+            f.write(json.dumps({
+                'settings': {'module': 'json'},
+                'persistence': {
+                    'connection': 'sqlite:///%s' % os.path.join(
+                        self.directory, 'yaib.db'
+                    )
+                },
+                'plugins': {'root': 'plugins'},
+                'connection': {'host': '127.0.0.1', 'command_prefix': '!'},
+                'nick': 'yaib',
+                'default_channels': []
+            }))
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def reload(self):
+        script = SCRIPT % {
+            'root': ROOT,
+            'plugin': PLUGIN,
+            'reloads': self.RELOADS
+        }
+        process = subprocess.Popen(
+            [sys.executable, '-c', script],
+            cwd=self.directory,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        output = process.communicate()[0]
+        assert(process.returncode == 0), output
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_reload_does_not_leak(self):
+        """Test reloading leaves nothing of the old plugins behind."""
+        result = self.reload()
+        assert(result['version'] == self.RELOADS + 1), result
+        assert(result['unloaded']), result
+        assert(result['plugins'] == 0), result
+        assert(result['models'] == 0), result
+        assert(result['tables'] == ['leaky_leakything']), result
+        assert(result['listeners'] == 1), result
+        assert(result['delayed'] == 2), result
+
+        # memory stays flat: the hundreds of reloads between the two
+        # checkpoints do not leave more objects behind
+        assert(abs(result['objects']) < 50), result
+        if result['memory'] is not None:
+            assert(result['memory'] < 100000), result
+
+    def test_failed_reload(self):
+        """Test a version that fails to load keeps the loaded one."""
+        result = self.reload()['failed']
+        assert(result == {
+            'reloaded': [],
+            'module': True,
+            'model': True,
+            'table': True,
+            'version': self.RELOADS + 1
+        }), result
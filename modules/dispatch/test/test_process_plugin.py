@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+from twisted.internet import task
+from twisted.internet.error import ProcessTerminated
+from twisted.python.failure import Failure
+
+from tools import util
+from ..event import Event
+from ..inflight import InFlightTracker
+from ..process_plugin import encodeMessage, MessageDecoder, ProcessPlugin
+from ..process_plugin import WorkerProcessProtocol
+
+
+class TestMessageFraming(object):
+
+    def setup(self):
+        self.decoder = MessageDecoder()
+
+    def test_round_trip(self):
+        """Test a message survives encoding and decoding."""
+        message = ('call', 1, 'command_test', ('user', u'┠'), {})
+        assert(self.decoder.feed(encodeMessage(message)) == [message])
+
+    def test_partial_chunks(self):
+        """Test messages split across reads are reassembled."""
+        data = encodeMessage(('ready',)) + encodeMessage(('stop',))
+        messages = []
+        for i in range(len(data)):
+            messages.extend(self.decoder.feed(data[i]))
+        assert(messages == [('ready',), ('stop',)])
+
+    def test_event_records(self):
+        """Test event records can be sent to workers."""
+        event = Event.fromUser('nick!user@host', channel='#yaib', message='hi')
+        decoded, = self.decoder.feed(encodeMessage(('call', 1, 'x', (event,))))
+        received = decoded[3][0]
+        assert(received.fields('onMessage') == event.fields('onMessage'))
+
+
+class Base(object):
+
+    def onMessage(self, user, nick, channel, message, highlight):
+        pass
+
+
+class HeavyPlugin(Base):
+    name = 'HeavyPlugin'
+    priority = 10
+
+    def command_test(self, user, nick, channel, more):
+        """Test command"""
+
+    def onMessage(self, event):
+        pass
+
+
+class FakeClock(task.Clock):
+
+    def __init__(self):
+        task.Clock.__init__(self)
+        self.spawned = []
+
+    def spawnProcess(self, protocol, executable, args, env, path):
+        self.spawned.append(protocol)
+
+
+class FakeHooks(object):
+    base = Base
+
+
+class FakeSettings(object):
+
+    def get(self, key, default=None):
+        return {'greeting': 'hi'}.get(key, default)
+
+
+class FakeYaib(object):
+
+    def __init__(self):
+        self.clock = FakeClock()
+        self.hooks = FakeHooks()
+        self.config = util.dictToObject({'nick': 'yaib'})
+        self.nick = 'yaib'
+        self.command_prefix = '!'
+        self.sent = []
+        self.delayed = []
+
+    def isAdmin(self, user, nick):
+        return nick == 'admin'
+
+    def getPluginSettings(self, name):
+        return FakeSettings()
+
+    def sendMessage(self, channel, message):
+        self.sent.append((channel, message))
+
+    def action(self, channel, action):
+        self.sent.append((channel, '/me ' + action))
+
+    def callLater(self, delay, func, *args, **kwargs):
+        self.delayed.append(func)
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.decoder = MessageDecoder()
+        self.messages = []
+        self.closed = False
+
+    def write(self, data):
+        self.messages.extend(self.decoder.feed(data))
+
+    def closeStdin(self):
+        self.closed = True
+
+
+class TestProcessPlugin(object):
+
+    def setup(self):
+        self.yaib = FakeYaib()
+        self.plugin = ProcessPlugin(
+            self.yaib, HeavyPlugin, '/plugins/test/test.py', 'test'
+        )
+        self.transport = self.start()
+
+    def start(self):
+        """Connect the last spawned worker, returns its transport."""
+        transport = FakeTransport()
+        self.worker = self.yaib.clock.spawned[-1]
+        self.worker.makeConnection(transport)
+        return transport
+
+    def receive(self, *message):
+        self.worker.outReceived(encodeMessage(message))
+
+    def test_proxies(self):
+        """Test commands and hooks of the plugin class are proxied."""
+        assert(self.plugin.name == 'HeavyPlugin')
+        assert(self.plugin.priority == 10)
+        assert(self.plugin.command_test.__doc__ == 'Test command')
+        assert(callable(self.plugin.onMessage))
+        assert(not hasattr(self.plugin, 'onJoined'))
+
+    def test_init(self):
+        """Test the worker is told what to load."""
+        assert(self.transport.messages == [(
+            'init', {'nick': 'yaib'}, '/plugins/test/test.py', 'test',
+            'yaib', '!'
+        )])
+
+    def test_call(self):
+        """Test calls are queued until ready and answered by the worker."""
+        results = []
+        d = self.plugin.command_test('user', 'nick', '#yaib', 'more')
+        d.addCallback(results.append)
+        assert(len(self.transport.messages) == 1)
+
+        self.receive('ready')
+        assert(self.transport.messages[1:] == [(
+            'call', 1, 'command_test', ('user', 'nick', '#yaib', 'more'), {}
+        )])
+        assert(results == [])
+
+        self.receive('result', 1, 'done', None)
+        assert(results == ['done'])
+
+    def test_call_error(self):
+        """Test errors raised in the worker fail the call."""
+        self.receive('ready')
+        errors = []
+        self.plugin.command_test('user', 'nick', '#yaib', '').addErrback(
+            errors.append
+        )
+        self.receive('result', 1, None, "ValueError('broken')")
+        assert(len(errors) == 1)
+        assert('broken' in str(errors[0].value))
+
+        # so the tracker counts it
+        tracker = InFlightTracker()
+        tracker.track(
+            self.plugin, 'command_test',
+            self.plugin.command_test('user', 'nick', '#yaib', '')
+        )
+        self.receive('result', 2, None, "ValueError('broken')")
+        assert(tracker.failed == 1)
+
+    def test_requests(self):
+        """Test the worker's requests are answered."""
+        self.receive('ready')
+        self.receive('request', 1, 'isAdmin', ('user', 'admin'))
+        self.receive('request', 2, 'settings.get', ('greeting',))
+        self.receive('request', 3, 'unknown', ())
+        self.receive('send', '#yaib', 'hello')
+        assert(self.transport.messages[1:] == [
+            ('response', 1, True),
+            ('response', 2, 'hi'),
+            ('response', 3, None)
+        ])
+        assert(self.yaib.sent == [('#yaib', 'hello')])
+
+    def test_restart(self):
+        """Test a crashed worker fails its calls and is restarted."""
+        self.receive('ready')
+        errors = []
+        self.plugin.command_test('user', 'nick', '#yaib', '').addErrback(
+            errors.append
+        )
+        self.worker.processEnded(Failure(ProcessTerminated(exitCode=1)))
+        assert(len(errors) == 1)
+        assert(self.plugin.worker is None and not self.plugin.ready)
+
+        # restarted with backoff, not as one of the plugin's delayed calls
+        assert(self.yaib.delayed == [])
+        self.yaib.clock.advance(1)
+        assert(len(self.yaib.clock.spawned) == 1)
+        self.yaib.clock.advance(1)
+        assert(len(self.yaib.clock.spawned) == 2)
+
+        # calls made while restarting wait for the new worker
+        d = self.plugin.command_test('user', 'nick', '#yaib', '')
+        transport = self.start()
+        self.receive('ready')
+        assert(transport.messages[-1][:3] == ('call', 2, 'command_test'))
+        assert(self.plugin.crashes == 0)
+        self.receive('result', 2, 'ok', None)
+        assert(d.called)
+
+    def test_stop(self):
+        """Test a stopped worker is not restarted."""
+        self.receive('ready')
+        self.plugin.stop()
+        assert(self.transport.messages[-1] == ('stop',))
+        assert(self.transport.closed)
+        self.worker.processEnded(Failure(ProcessTerminated(exitCode=0)))
+        self.yaib.clock.advance(120)
+        assert(len(self.yaib.clock.spawned) == 1)
+
+    def test_stop_while_restarting(self):
+        """Test a plugin stopped while its worker restarts stays stopped."""
+        self.receive('ready')
+        self.worker.processEnded(Failure(ProcessTerminated(exitCode=1)))
+        self.plugin.stop()
+        self.yaib.clock.advance(120)
+        assert(len(self.yaib.clock.spawned) == 1)
+
+        # a worker that was already starting is stopped right away
+        self.plugin.spawn()
+        assert(len(self.yaib.clock.spawned) == 1)
+        transport = FakeTransport()
+        WorkerProcessProtocol(self.plugin).makeConnection(transport)
+        assert(transport.messages == [] and transport.closed)
+        assert(self.plugin.worker is None)
@@ -0,0 +1,60 @@
+from twisted.internet import defer
+
+from ..threads import ThreadOffloader, blocking
+
+
+class Plugin(object):
+    name = 'Plugin'
+
+    def command_fast(self, user, nick, channel, more):
+        return 'fast'
+
+    @blocking
+    def command_slow(self, user, nick, channel, more):
+        """Slow command."""
+        return 'slow'
+
+
+class FakeReactor(object):
+    """Runs 'threaded' work synchronously."""
+
+    def callWhenRunning(self, func, *args, **kwargs):
+        pass
+
+    def addSystemEventTrigger(self, *args, **kwargs):
+        pass
+
+
+class TestThreadOffloader(object):
+
+    def setup(self):
+        self.offloader = ThreadOffloader(FakeReactor())
+        self.plugin = Plugin()
+        self.calls = []
+        self.offloader.run = self.fakeRun
+
+    def fakeRun(self, owner, func, *args, **kwargs):
+        self.calls.append((owner, func))
+        return defer.succeed(func(*args, **kwargs))
+
+    def test_regular_handlers_unchanged(self):
+        """Test handlers that don't block are not wrapped."""
+        func = self.plugin.command_fast
+        assert(self.offloader.wrap(self.plugin, func) == func)
+
+    def test_blocking_handlers_offloaded(self):
+        """Test blocking handlers run through the pool."""
+        wrapped = self.offloader.wrap(self.plugin, self.plugin.command_slow)
+        results = []
+        wrapped('user', 'nick', '#yaib', '').addCallback(results.append)
+        assert(results == ['slow'])
+        assert(self.calls == [(self.plugin, self.plugin.command_slow)])
+
+    def test_wrapped_keeps_doc(self):
+        """Test the wrapper keeps the docstring used by help and flags."""
+        wrapped = self.offloader.wrap(self.plugin, self.plugin.command_slow)
+        assert(wrapped.__doc__ == 'Slow command.')
+
+    def test_default_limit(self):
+        """Test the per plugin limit defaults to the global setting."""
+        assert(self.offloader.getLimit('Plugin') == 2)
@@ -0,0 +1,93 @@
+from tools import util
+
+from ..watchdog import Watchdog
+
+
+class Plugin(object):
+    name = 'Plugin'
+
+
+class Other(object):
+    name = 'Other'
+
+
+class FakeReactor(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def callFromThread(self, func, *args, **kwargs):
+        self.calls.append((func, args))
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWatchdog(object):
+
+    def setup(self):
+        self.reactor = FakeReactor()
+        self.timer = FakeTimer()
+        self.disabled = []
+        self.watchdog = Watchdog(
+            self.reactor, disable=self.disabled.append, timer=self.timer
+        )
+        self.watchdog.configure(util.dictToObject({
+            'watchdog': {'budget': 2},
+            'plugins': {
+                'Plugin': {'budgets': {'onMessage': 1}},
+                'Other': {'budget': 10, 'disable_on_overrun': True}
+            }
+        }))
+        self.plugin = Plugin()
+        self.other = Other()
+
+    def test_budgets(self):
+        """Test budgets come from the hook, plugin or default config."""
+        assert(self.watchdog.getBudget(self.plugin, 'onMessage') == 1)
+        assert(self.watchdog.getBudget(self.plugin, 'onJoined') == 2)
+        assert(self.watchdog.getBudget(self.other, 'onMessage') == 10)
+
+    def test_within_budget(self):
+        """Test handlers within their budget are not reported."""
+        self.watchdog.enter(self.plugin, 'onJoined')
+        self.timer.now = 1.5
+        self.watchdog.check()
+        self.watchdog.exit()
+        assert(self.watchdog.overruns == {})
+
+    def test_overrun_reported_once(self):
+        """Test a handler over budget is counted once per call."""
+        self.watchdog.enter(self.plugin, 'onMessage')
+        self.timer.now = 1.5
+        self.watchdog.check()
+        self.timer.now = 3
+        self.watchdog.check()
+        self.watchdog.exit()
+        assert(self.watchdog.overruns == {('Plugin', 'onMessage'): 1})
+        assert(self.reactor.calls == [])
+
+    def test_innermost_blamed(self):
+        """Test only the innermost handler over budget is reported."""
+        self.watchdog.enter(self.other, 'command_say')
+        self.watchdog.enter(self.plugin, 'onSend')
+        self.timer.now = 20
+        self.watchdog.check()
+        self.watchdog.exit()
+        self.watchdog.check()
+        self.watchdog.exit()
+        assert(self.watchdog.overruns == {('Plugin', 'onSend'): 1})
+
+    def test_disable_on_overrun(self):
+        """Test plugins configured to be disabled are disabled."""
+        self.watchdog.enter(self.other, 'onMessage')
+        self.timer.now = 11
+        self.watchdog.check()
+        self.watchdog.exit()
+        assert(self.reactor.calls == [(self.disabled.append, (self.other,))])
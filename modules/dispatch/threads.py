@@ -0,0 +1,118 @@
+import functools
+
+from twisted.internet import defer, threads
+from twisted.python import threadable
+from twisted.python.threadpool import ThreadPool
+
+
+def blocking(func):
+    """
+    Decorator marking a plugin command or hook as blocking (database queries,
+    http requests, file io...). Blocking handlers are run in yaib's thread
+    pool instead of on the reactor thread, so they don't stall the
+    connection. Calls to send, reply and action from a blocking handler are
+    passed back to the reactor thread automatically.
+    """
+    func.blocking = True
+    return func
+
+
+def inReactorThread():
+    """
+    Returns True if called from the reactor thread, or before the reactor
+    has started (when the thread pool isn't running either).
+    """
+    return threadable.ioThread is None or threadable.isInIOThread()
+
+
+class ThreadOffloader(object):
+    """
+    Runs blocking plugin handlers in a bounded thread pool.
+
+    Configured with the `threads` config section:
+    - `pool_size` (int) - maximum number of threads, defaults to 10
+    - `per_plugin` (int) - maximum number of handlers each plugin can run at
+                           once, defaults to 2. Can be overridden per plugin
+                           with `plugins.<name>.max_threads`.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_PER_PLUGIN = 2
+
+    def __init__(self, reactor):
+        self._reactor = reactor
+        self._pool = None
+        self._semaphores = {}
+
+        self.pool_size = self.DEFAULT_POOL_SIZE
+        self.per_plugin = self.DEFAULT_PER_PLUGIN
+        self._plugins_config = None
+
+    def configure(self, configuration):
+        """Called with the bot configuration."""
+        if configuration.threads:
+            self.pool_size = (
+                configuration.threads.pool_size or self.DEFAULT_POOL_SIZE
+            )
+            self.per_plugin = (
+                configuration.threads.per_plugin or self.DEFAULT_PER_PLUGIN
+            )
+        self._plugins_config = configuration.plugins
+
+    @property
+    def pool(self):
+        """The thread pool, created and started with the reactor."""
+        if self._pool is None:
+            self._pool = ThreadPool(0, self.pool_size, 'yaib')
+            self._reactor.callWhenRunning(self._pool.start)
+            self._reactor.addSystemEventTrigger(
+                'during', 'shutdown', self._pool.stop
+            )
+        return self._pool
+
+    def getLimit(self, name):
+        """Returns the number of handlers the plugin can run at once."""
+        plugin_config = None
+        if self._plugins_config:
+            plugin_config = getattr(self._plugins_config, name)
+        if plugin_config and plugin_config.max_threads:
+            return plugin_config.max_threads
+        return self.per_plugin
+
+    def wrap(self, owner, func):
+        """
+        Returns func unchanged unless it is marked as blocking, otherwise a
+        function that runs it in the pool and returns a Deferred.
+        """
+        if not getattr(func, 'blocking', False):
+            return func
+
+        @functools.wraps(func)
+        def offloaded(*args, **kwargs):
+            return self.run(owner, func, *args, **kwargs)
+        return offloaded
+
+    def run(self, owner, func, *args, **kwargs):
+        """
+        Run func in the pool, respecting owner's concurrency limit. Returns a
+        Deferred firing with the result on the reactor thread. Failures are
+        left to the caller (see InFlightTracker) to log and count.
+        """
+        name = getattr(owner, 'name', None)
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = defer.DeferredSemaphore(self.getLimit(name))
+            self._semaphores[name] = semaphore
+
+        return semaphore.run(
+            threads.deferToThreadPool,
+            self._reactor,
+            self.pool,
+            func,
+            *args,
+            **kwargs
+        )
+
+    def callFromThread(self, func, *args, **kwargs):
+        """Call func on the reactor thread."""
+        self._reactor.callFromThread(func, *args, **kwargs)
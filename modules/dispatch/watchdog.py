@@ -0,0 +1,162 @@
+import sys
+import time
+import thread
+import logging
+import threading
+import traceback
+
+
+class Watchdog(object):
+    """
+    Watches the plugin commands and hooks running on the reactor thread and
+    reports the ones that take longer than their time budget. A helper
+    thread checks the running handlers every `interval` seconds, logs the
+    plugin, hook and stack trace of any handler over budget, counts the
+    overrun and can disable the plugin once the handler returns.
+
+    Configured with the `watchdog` config section:
+    - `budget` (float) - seconds each handler can run, defaults to 5
+    - `interval` (float) - seconds between checks, defaults to 0.5
+    - `disable_on_overrun` (bool) - unload plugins that overrun their budget
+
+    Plugins can override them with `plugins.<name>.budget`,
+    `plugins.<name>.budgets` (hook or command name -> seconds) and
+    `plugins.<name>.disable_on_overrun`.
+    """
+
+    DEFAULT_BUDGET = 5
+    DEFAULT_INTERVAL = 0.5
+
+    def __init__(self, reactor, disable=None, timer=time.time):
+        self._reactor = reactor
+        self._disable = disable
+        self._timer = timer
+
+        self.budget = self.DEFAULT_BUDGET
+        self.interval = self.DEFAULT_INTERVAL
+        self.disable_on_overrun = False
+        self._plugins_config = None
+
+        # (plugin name, hook) -> budget in seconds
+        self._budgets = {}
+
+        # handlers currently running, innermost last. Each entry is
+        # [owner, name, start time, budget, thread id, reported]
+        self._running = []
+
+        # (plugin name, hook) -> number of overruns
+        self.overruns = {}
+
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def configure(self, configuration):
+        """Called with the bot configuration."""
+        if configuration.watchdog:
+            self.budget = configuration.watchdog.budget or self.DEFAULT_BUDGET
+            self.interval = (
+                configuration.watchdog.interval or self.DEFAULT_INTERVAL
+            )
+            self.disable_on_overrun = bool(
+                configuration.watchdog.disable_on_overrun
+            )
+        self._plugins_config = configuration.plugins
+        self._budgets = {}
+
+    def getPluginConfig(self, name):
+        if self._plugins_config:
+            return getattr(self._plugins_config, name)
+        return None
+
+    def getBudget(self, owner, name):
+        """Returns the seconds the owner's hook or command can run for."""
+        plugin_name = getattr(owner, 'name', None)
+        key = (plugin_name, name)
+        budget = self._budgets.get(key)
+        if budget is None:
+            budget = self.budget
+            plugin_config = self.getPluginConfig(plugin_name)
+            if plugin_config:
+                if plugin_config.budgets and getattr(
+                        plugin_config.budgets, name):
+                    budget = getattr(plugin_config.budgets, name)
+                elif plugin_config.budget:
+                    budget = plugin_config.budget
+            self._budgets[key] = budget
+        return budget
+
+    def shouldDisable(self, plugin_name):
+        plugin_config = self.getPluginConfig(plugin_name)
+        if plugin_config and plugin_config.disable_on_overrun is not None:
+            return bool(plugin_config.disable_on_overrun)
+        return self.disable_on_overrun
+
+    def enter(self, owner, name, started=None):
+        """Called before running the owner's hook or command."""
+        self._running.append([
+            owner,
+            name,
+            self._timer() if started is None else started,
+            self.getBudget(owner, name),
+            thread.get_ident(),
+            False
+        ])
+
+    def exit(self):
+        """Called after the handler passed to enter returns."""
+        self._running.pop()
+
+    def start(self):
+        """Start checking the running handlers from a helper thread."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name='yaib-watchdog'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        self._reactor.addSystemEventTrigger('during', 'shutdown', self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+        self._thread = None
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Report the innermost handler over its budget. Handlers it was called
+        from are not blamed for its time.
+        """
+        now = self._timer()
+        running = list(self._running)
+        for i in range(len(running) - 1, -1, -1):
+            owner, name, started, budget, thread_id, reported = running[i]
+            if not reported and now - started > budget:
+                for entry in running[:i + 1]:
+                    entry[5] = True
+                self.overrun(owner, name, now - started, thread_id)
+                return
+
+    def overrun(self, owner, name, elapsed, thread_id):
+        plugin_name = getattr(owner, 'name', None)
+        key = (plugin_name, name)
+        self.overruns[key] = self.overruns.get(key, 0) + 1
+
+        frame = sys._current_frames().get(thread_id)
+        stack = ''.join(traceback.format_stack(frame)) if frame else ''
+        logging.warning(
+            "{} in plugin {} has been running for {:.1f} seconds "
+            "(budget {} seconds):\n{}".format(
+                name, plugin_name, elapsed, self.getBudget(owner, name), stack
+            )
+        )
+
+        # disabled from the reactor thread, once the handler returns
+        if self._disable is not None and self.shouldDisable(plugin_name):
+            self._reactor.callFromThread(self._disable, owner)
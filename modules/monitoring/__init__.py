@@ -0,0 +1,2 @@
+from lag_monitor import LagMonitor
+from latency import LatencyStats
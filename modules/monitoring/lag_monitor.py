@@ -0,0 +1,164 @@
+import sys
+import time
+import thread
+import logging
+import threading
+import traceback
+from collections import deque
+
+from twisted.internet import task
+
+
+class LagMonitor(object):
+    """
+    Measures how late the reactor runs a recurring timer, ie how long the
+    event loop was blocked between ticks. While the loop is blocked for
+    longer than the threshold, a helper thread samples the reactor thread's
+    stack so the log shows exactly what stalled it.
+
+    Configured with the `monitoring` config section:
+    - `lag_monitor` (bool) - start the monitor with yaib, defaults to false
+    - `lag_interval` (float) - seconds between ticks, defaults to 0.1
+    - `lag_threshold` (float) - seconds of lag to report, defaults to 0.25
+    - `lag_log_size` (int) - number of reports to keep, defaults to 50
+    """
+
+    DEFAULT_INTERVAL = 0.1
+    DEFAULT_THRESHOLD = 0.25
+    DEFAULT_LOG_SIZE = 50
+
+    def __init__(self, reactor, timer=time.time):
+        self._reactor = reactor
+        self._timer = timer
+
+        self.enabled = False
+        self.interval = self.DEFAULT_INTERVAL
+        self.threshold = self.DEFAULT_THRESHOLD
+        self.log = deque(maxlen=self.DEFAULT_LOG_SIZE)
+        self.reset()
+
+        self._loop = None
+        self._thread = None
+        self._thread_id = None
+        self._stopped = threading.Event()
+        self._shutdown_trigger = None
+
+        # when the next tick should run and the stack sampled while late
+        self._expected = None
+        self._sample = None
+
+    def configure(self, configuration):
+        """Called with the bot configuration."""
+        monitoring = configuration.monitoring
+        if monitoring:
+            self.enabled = bool(monitoring.lag_monitor)
+            self.interval = monitoring.lag_interval or self.DEFAULT_INTERVAL
+            self.threshold = (
+                monitoring.lag_threshold or self.DEFAULT_THRESHOLD
+            )
+            self.log = deque(
+                self.log, maxlen=monitoring.lag_log_size or
+                self.DEFAULT_LOG_SIZE
+            )
+
+    def reset(self):
+        """Clear the counters and the log."""
+        self.counters = {
+            'ticks': 0,
+            'lagged': 0,
+            'total_lag': 0.0,
+            'max_lag': 0.0
+        }
+        self.log.clear()
+
+    @property
+    def running(self):
+        return self._loop is not None
+
+    def start(self):
+        """
+        Start measuring. Must be called from the reactor thread (or the
+        thread that will run the reactor).
+        """
+        if self.running:
+            return
+        self._thread_id = thread.get_ident()
+        self._expected = self._timer() + self.interval
+        self._sample = None
+
+        self._loop = task.LoopingCall(self.tick)
+        self._loop.clock = self._reactor
+        self._loop.start(self.interval, now=False)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name='yaib-lag-monitor'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+        if self._shutdown_trigger is None:
+            self._shutdown_trigger = self._reactor.addSystemEventTrigger(
+                'during', 'shutdown', self.stop
+            )
+
+    def stop(self):
+        """Stop measuring, keeps the counters and log."""
+        if not self.running:
+            return
+        self._loop.stop()
+        self._loop = None
+        self._stopped.set()
+        self._thread.join(self.interval)
+        self._thread = None
+
+    def tick(self):
+        now = self._timer()
+        lag = max(now - self._expected, 0)
+        self._expected = now + self.interval
+
+        counters = self.counters
+        counters['ticks'] += 1
+        counters['total_lag'] += lag
+        if lag > counters['max_lag']:
+            counters['max_lag'] = lag
+
+        if lag > self.threshold:
+            counters['lagged'] += 1
+            stack, self._sample = self._sample, None
+            self.log.append((now, lag, stack))
+            logging.warning(
+                "Reactor blocked for {:.3f} seconds:\n{}".format(
+                    lag, ''.join(stack or [])
+                )
+            )
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """
+        Called from the helper thread. Keeps the reactor thread's stack if
+        the next tick is later than the threshold.
+        """
+        if self._sample is not None or self._expected is None:
+            return
+        if self._timer() - self._expected > self.threshold:
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self._sample = traceback.format_stack(frame)
+
+    def summary(self):
+        """Returns a one line description of the counters."""
+        counters = self.counters
+        return (
+            "{} ticks, {} lagged over {:.2f}s, max lag {:.3f}s, "
+            "average lag {:.3f}s".format(
+                counters['ticks'],
+                counters['lagged'],
+                self.threshold,
+                counters['max_lag'],
+                counters['total_lag'] / (counters['ticks'] or 1)
+            )
+        )
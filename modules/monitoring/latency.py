@@ -0,0 +1,120 @@
+import time
+from bisect import bisect_left
+
+
+# upper bounds of the histogram buckets in seconds, the last one catches
+# everything slower
+BUCKETS = (
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1, 2.5, 5,
+    10, float('inf')
+)
+
+
+class LatencyHistogram(object):
+    """Counts durations in fixed buckets (see BUCKETS)."""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound of the bucket holding the given percentile
+        (0-100), or the slowest duration seen if that is lower.
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * percent / 100.0
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def toDict(self):
+        return {
+            'buckets': dict([
+                (str(bound), count)
+                for bound, count in zip(BUCKETS, self.counts) if count
+            ]),
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99)
+        }
+
+
+class LatencyStats(object):
+    """
+    Latency histograms of plugin hooks and commands, keyed by
+    (plugin name, hook or command).
+    """
+
+    ORDERS = ('p50', 'p99', 'total', 'count', 'max')
+
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        self.histograms = {}
+        self.since = timer()
+
+    def record(self, plugin_name, name, seconds):
+        key = (plugin_name, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.add(seconds)
+
+    def reset(self):
+        self.histograms = {}
+        self.since = self.timer()
+
+    def top(self, order='total', limit=10):
+        """
+        Returns up to limit (plugin name, name, histogram) tuples, slowest
+        first by the given order (one of ORDERS).
+        """
+        if order == 'p50':
+            key = lambda h: h.percentile(50)
+        elif order == 'p99':
+            key = lambda h: h.percentile(99)
+        else:
+            key = lambda h: getattr(h, order)
+
+        ranked = sorted(
+            self.histograms.items(),
+            key=lambda item: key(item[1]),
+            reverse=True
+        )
+        return [
+            (plugin_name, name, histogram)
+            for (plugin_name, name), histogram in ranked[:limit]
+        ]
+
+    def export(self):
+        """Returns the histograms as a json serializable dict."""
+        plugins = {}
+        for (plugin_name, name), histogram in self.histograms.items():
+            plugins.setdefault(plugin_name or '', {})[name] = \
+                histogram.toDict()
+        return {
+            'since': self.since,
+            'exported': self.timer(),
+            'plugins': plugins
+        }
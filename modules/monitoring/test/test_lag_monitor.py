@@ -0,0 +1,74 @@
+import thread
+
+from tools import util
+
+from ..lag_monitor import LagMonitor
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLagMonitor(object):
+
+    def setup(self):
+        self.timer = FakeTimer()
+        self.monitor = LagMonitor(None, timer=self.timer)
+        self.monitor.configure(util.dictToObject({
+            'monitoring': {
+                'lag_monitor': True,
+                'lag_interval': 1,
+                'lag_threshold': 0.5,
+                'lag_log_size': 2
+            }
+        }))
+        # pretend the monitor was started on this thread
+        self.monitor._thread_id = thread.get_ident()
+        self.monitor._expected = 1
+
+    def test_configure(self):
+        """Test the monitor reads the monitoring config section."""
+        assert(self.monitor.enabled)
+        assert(self.monitor.interval == 1)
+        assert(self.monitor.log.maxlen == 2)
+
+    def test_on_time_ticks(self):
+        """Test ticks within the threshold are only counted."""
+        self.timer.now = 1.25
+        self.monitor.tick()
+        assert(self.monitor.counters['ticks'] == 1)
+        assert(self.monitor.counters['lagged'] == 0)
+        assert(self.monitor.counters['max_lag'] == 0.25)
+        assert(len(self.monitor.log) == 0)
+
+    def test_lag_logged_with_stack(self):
+        """Test late ticks are logged with the stack sampled while late."""
+        self.timer.now = 2
+        self.monitor.sample()
+        self.timer.now = 3
+        self.monitor.tick()
+        assert(self.monitor.counters['lagged'] == 1)
+
+        timestamp, lag, stack = self.monitor.log[-1]
+        assert(lag == 2)
+        assert('test_lag_logged_with_stack' in ''.join(stack))
+
+    def test_no_sample_while_on_time(self):
+        """Test the stack is only sampled once the tick is late."""
+        self.timer.now = 1.25
+        self.monitor.sample()
+        assert(self.monitor._sample is None)
+
+    def test_rolling_log(self):
+        """Test only the most recent reports are kept."""
+        for now in (3, 5, 7):
+            self.timer.now = now
+            self.monitor.tick()
+            self.monitor._expected = now + 0.5
+        assert(len(self.monitor.log) == 2)
+        assert(self.monitor.log[0][0] == 5)
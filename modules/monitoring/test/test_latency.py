@@ -0,0 +1,55 @@
+from ..latency import LatencyHistogram, LatencyStats
+
+
+class TestLatencyHistogram(object):
+
+    def setup(self):
+        self.histogram = LatencyHistogram()
+
+    def test_empty(self):
+        """Test an empty histogram reports zero."""
+        assert(self.histogram.percentile(50) == 0)
+
+    def test_percentiles(self):
+        """Test percentiles report the bucket upper bound."""
+        for i in range(98):
+            self.histogram.add(0.0004)
+        self.histogram.add(0.2)
+        self.histogram.add(0.2)
+        assert(self.histogram.count == 100)
+        assert(self.histogram.percentile(50) == 0.0005)
+        assert(self.histogram.percentile(99) == 0.2)
+        assert(self.histogram.max == 0.2)
+
+    def test_slow_outliers(self):
+        """Test durations over the last bound are counted."""
+        self.histogram.add(60)
+        assert(self.histogram.percentile(99) == 60)
+        assert(self.histogram.counts[-1] == 1)
+
+
+class TestLatencyStats(object):
+
+    def setup(self):
+        self.stats = LatencyStats(timer=lambda: 100)
+        self.stats.record('Fast', 'onMessage', 0.001)
+        self.stats.record('Fast', 'onMessage', 0.001)
+        self.stats.record('Fast', 'onMessage', 0.001)
+        self.stats.record('Slow', 'lookup', 0.5)
+
+    def test_top(self):
+        """Test handlers are ranked by the given order."""
+        assert([t[0] for t in self.stats.top('p99')] == ['Slow', 'Fast'])
+        assert([t[0] for t in self.stats.top('count')] == ['Fast', 'Slow'])
+        assert(len(self.stats.top('total', limit=1)) == 1)
+
+    def test_export(self):
+        """Test the export groups histograms by plugin."""
+        exported = self.stats.export()
+        assert(exported['plugins']['Fast']['onMessage']['count'] == 3)
+        assert(exported['plugins']['Slow']['lookup']['p50'] == 0.5)
+
+    def test_reset(self):
+        """Test reset clears the histograms."""
+        self.stats.reset()
+        assert(self.stats.top() == [])
@@ -1,3 +1,7 @@
 from sqlalchemy_persistence import SqlAlchemyPersistence as default
 from sqlalchemy_persistence import Base
 from sqlalchemy_persistence import getModelBase
+from sqlalchemy_persistence import removeModels
+from sqlalchemy_persistence import detachModels
+from sqlalchemy_persistence import restoreModels
+from snapshot import Snapshot
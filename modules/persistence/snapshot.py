@@ -0,0 +1,115 @@
+import os
+import time
+import zlib
+import logging
+import cPickle as pickle
+
+from twisted.internet import task
+
+
+class Snapshot(object):
+    """
+    Saves yaib's runtime state (admin sessions, pending callLater calls,
+    plugin caches from BasePlugin.serializeState...) to a local file every
+    `interval` seconds and on shutdown, so the next start can restore it
+    instead of starting cold. The state is a pickled dict, compressed with
+    zlib and written atomically.
+
+    Configured with the `snapshot` config section:
+    - `enabled` (bool) - save and restore snapshots, defaults to false
+    - `file` (string) - path of the snapshot, defaults to 'yaib.snapshot'
+    - `interval` (float) - seconds between snapshots, defaults to 60
+    - `max_age` (float) - ignore older snapshots, defaults to 3600 seconds
+    """
+
+    VERSION = 1
+
+    DEFAULT_FILE = 'yaib.snapshot'
+    DEFAULT_INTERVAL = 60
+    DEFAULT_MAX_AGE = 3600
+
+    def __init__(self, clock, timer=time.time):
+        self._clock = clock
+        self._timer = timer
+
+        self.enabled = False
+        self.path = self.DEFAULT_FILE
+        self.interval = self.DEFAULT_INTERVAL
+        self.max_age = self.DEFAULT_MAX_AGE
+
+        self._loop = None
+
+    def configure(self, configuration):
+        """Called with the bot configuration."""
+        snapshot = configuration.snapshot
+        if snapshot:
+            self.enabled = bool(snapshot.enabled)
+            self.path = snapshot.file or self.DEFAULT_FILE
+            self.interval = snapshot.interval or self.DEFAULT_INTERVAL
+            self.max_age = snapshot.max_age or self.DEFAULT_MAX_AGE
+
+    def save(self, state):
+        """Write the state to the snapshot file."""
+        data = zlib.compress(pickle.dumps(
+            {'version': self.VERSION, 'time': self._timer(), 'state': state},
+            pickle.HIGHEST_PROTOCOL
+        ))
+
+        # never leave a half written snapshot behind
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.rename(temporary, self.path)
+        logging.debug(
+            "Saved a %d byte snapshot to %s" % (len(data), self.path)
+        )
+
+    def load(self):
+        """
+        Returns the state from the snapshot file, or None if there is no
+        usable snapshot.
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.loads(zlib.decompress(f.read()))
+        # a damaged snapshot only costs a cold start
+        except Exception as e:
+            logging.error(
+                "Could not load snapshot %s: %s" % (self.path, repr(e))
+            )
+            return None
+
+        if snapshot.get('version') != self.VERSION:
+            logging.warning("Ignoring snapshot from another version of yaib")
+            return None
+        age = self._timer() - snapshot['time']
+        if age > self.max_age:
+            logging.info("Ignoring %d second old snapshot" % age)
+            return None
+        return snapshot['state']
+
+    @property
+    def running(self):
+        return self._loop is not None
+
+    def start(self, collect):
+        """Save the state returned by collect() every interval seconds."""
+        if self.running:
+            return
+        self._loop = task.LoopingCall(self.saveFrom, collect)
+        self._loop.clock = self._clock
+        self._loop.start(self.interval, now=False)
+
+    def stop(self):
+        if self.running:
+            self._loop.stop()
+            self._loop = None
+
+    def saveFrom(self, collect):
+        # a failed snapshot must not stop the loop
+        try:
+            self.save(collect())
+        except Exception as e:
+            logging.error("Could not save snapshot: %s" % repr(e))
@@ -1,13 +1,14 @@
 import logging
 
 from contextlib import contextmanager
-from pubsub import pub
+from tools.eventbus import pub
 
 from sqlalchemy import create_engine
 from sqlalchemy import Column, Integer
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.ext.declarative import clsregistry
 
 # declarative base for sqlalchemy schema
 Base = declarative_base()
@@ -107,3 +108,59 @@ def getModelBase(prefix=''):
         def __tablename__(cls):
             return ('%s_%s' % (prefix, cls.__name__)).lower()
     return CustomBase
+
+
+def removeModels(module_name):
+    """
+    Forget the model classes declared in the module, so they are not kept
+    alive by Base and the module can declare them again when it is
+    reloaded. Their tables are removed from Base.metadata, not from the
+    database.
+    """
+    detachModels(module_name)
+
+
+def detachModels(module_name):
+    """
+    Like removeModels, but returns the model classes removed so they can be
+    put back with restoreModels, eg if the new version of the module fails
+    to load. Tables with the same name can not be in Base.metadata twice,
+    so the old models have to be set aside while the new ones are declared.
+    """
+    registry = Base._decl_class_registry
+    detached = []
+    for name, cls in list(registry.items()):
+        if not isinstance(cls, type) or cls.__module__ != module_name:
+            continue
+        del registry[name]
+        detached.append(cls)
+        table = getattr(cls, '__table__', None)
+        if table is not None and table.key in Base.metadata.tables:
+            Base.metadata.remove(table)
+
+        # the module path lookups, registered for each suffix of the path
+        tokens = module_name.split('.')
+        while tokens:
+            marker = registry.get('_sa_module_registry')
+            for token in tokens:
+                marker = marker and marker.contents.get(token)
+            if marker is not None:
+                marker._remove_item(name)
+            tokens.pop(0)
+    return detached
+
+
+def restoreModels(detached):
+    """Put back the model classes returned by detachModels."""
+    for cls in detached:
+        clsregistry.add_class(cls.__name__, cls)
+        table = getattr(cls, '__table__', None)
+        if table is None or table.key in Base.metadata.tables:
+            continue
+        Base.metadata._add_table(table.name, table.schema, table)
+
+        # the foreign keys Base.metadata.remove dropped
+        for fk in table.foreign_keys:
+            if isinstance(fk._colspec, basestring):
+                parent, table_key, column = fk._resolve_col_tokens()
+                Base.metadata._fk_memos[(table_key, column)].append(fk)
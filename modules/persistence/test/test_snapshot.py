@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+
+from tools import util
+
+from ..snapshot import Snapshot
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSnapshot(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp(prefix='yaib-test-')
+        self.timer = FakeTimer()
+        self.snapshot = Snapshot(None, timer=self.timer)
+        self.snapshot.configure(util.dictToObject({
+            'snapshot': {
+                'enabled': True,
+                'file': os.path.join(self.directory, 'yaib.snapshot'),
+                'max_age': 60
+            }
+        }))
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_configure(self):
+        """Test the snapshot config section."""
+        assert(self.snapshot.enabled)
+        assert(self.snapshot.interval == Snapshot.DEFAULT_INTERVAL)
+        assert(self.snapshot.max_age == 60)
+
+    def test_no_snapshot(self):
+        """Test there is nothing to restore without a snapshot."""
+        assert(self.snapshot.load() is None)
+
+    def test_round_trip(self):
+        """Test the saved state is loaded back."""
+        state = {'admins': {'keeyai': ('user', 1060)}, 'plugins': {'a': [1]}}
+        self.snapshot.save(state)
+        assert(self.snapshot.load() == state)
+        assert(os.listdir(self.directory) == ['yaib.snapshot'])
+
+    def test_too_old(self):
+        """Test old snapshots are ignored."""
+        self.snapshot.save({})
+        self.timer.now += 61
+        assert(self.snapshot.load() is None)
+
+    def test_damaged(self):
+        """Test a damaged snapshot is ignored."""
+        with open(self.snapshot.path, 'wb') as f:
+            f.write('not a snapshot')
+        assert(self.snapshot.load() is None)
+
+    def test_save_errors_logged(self):
+        """Test a failing collect does not raise."""
+        def collect():
+            raise ValueError('broken')
+        self.snapshot.saveFrom(collect)
+        assert(not os.path.exists(self.snapshot.path))
@@ -11,11 +11,17 @@ class BaseSettings(object):
     Uses '.' delimited strings to make accessing settings convenient.
     You can configure which character to use for delimiting by setting
     the `delimiter` field in the settings configuration.
+
+    After every write (or batch of writes) 'settings:updated' is sent, then
+    'settings:changed' with the keys written, or None if every setting may
+    have changed.
     """
 
     def __init__(self, configuration={}):
         """Initialize the module"""
         self._settings = {}
+        # the keys written since the last update, None for all of them
+        self._changed = set()
         self._configure(configuration)
 
     def _configure(self, configuration):
@@ -74,6 +80,8 @@ class BaseSettings(object):
                 node[subkey] = {}
                 node = node[subkey]
 
+        if self._changed is not None:
+            self._changed.add(key)
         if not more:
             self.afterUpdate()
 
@@ -97,8 +105,13 @@ class BaseSettings(object):
         Called after a write (or batch of writes).
         Saves the current settings and notifies the bot.
         """
+        changed, self._changed = self._changed, set()
         self.saveSettings()
         pub.sendMessage('settings:updated')
+        pub.sendMessage(
+            'settings:changed',
+            keys=sorted(changed) if changed is not None else None
+        )
 
     def get(self, key, default=None):
         """
@@ -128,6 +141,10 @@ class BaseSettings(object):
                 # does not exist - return default
                 return default
 
+    def getAll(self):
+        """Returns all the settings as a nested dict."""
+        return self._settings
+
     def getMulti(self, keys, default=None):
         """
         Returns a dict of multiple settings at once. If the requested key is
@@ -1,3 +1,5 @@
+from pubsub import pub
+
 from ..base_settings import BaseSettings
 
 
@@ -84,3 +86,17 @@ class TestBaseSettings(object):
         self.settings.set('list', test_list)
         test_list2 = self.settings.get('list')
         assert(test_list == test_list2)
+
+    def test_changed_keys(self):
+        """Test the keys written are sent after each update."""
+        changes = []
+
+        def onChanged(keys=None):
+            changes.append(keys)
+        pub.subscribe(onChanged, 'settings:changed')
+        try:
+            self.settings.set('a.b', 1)
+            self.settings.setMulti({'c': 1, 'd.e': 2})
+        finally:
+            pub.unsubscribe(onChanged, 'settings:changed')
+        assert(changes == [['a.b'], ['c', 'd.e']])
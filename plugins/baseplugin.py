@@ -1,3 +1,8 @@
+from modules.dispatch import STOP_PROPAGATION
+from modules.dispatch import blocking, memoize  # NOQA - exposed for plugins
+from modules.dispatch import normalizeArgument  # NOQA - exposed for plugins
+
+
 class BasePlugin(object):
     """
     Extend this/copy its structure to create plugins. Your plugin
@@ -11,9 +16,50 @@ class BasePlugin(object):
     Command docstrings can include {nick} and {command_prefix} which
     will automatically be replaced in the help text with the current
     values.
+
+    Hooks are called in order of priority, highest first. Set `priority`
+    to change the default for every hook or `priorities` to set it per hook,
+    eg {'onMessage': 100}. A hook can return self.STOP_PROPAGATION to keep
+    the event from reaching any lower priority plugins.
+
+    Message, action, notice, join, leave and quit hooks can also be declared
+    with a single `event` argument, eg `def onMessage(self, event)`, to get
+    the Event record for the line (user, nick, host, channel, message,
+    highlight, timestamp...) instead of the positional arguments below.
+
+    Plugins that log, count or index events can implement `<hook>Batch`,
+    eg `def onMessageBatch(self, events)`, to receive a list of up to
+    `batch_size` events (Event records, or argument tuples for hooks without
+    records) at most `batch_interval` seconds after the first one arrived.
+    Pending events are always delivered before a reload or shutdown.
+
+    Commands and hooks that block (database queries, web requests...) should
+    be decorated with `@blocking` (importable from this module) to run in
+    yaib's thread pool instead of stalling the connection. Calling send,
+    reply and action from a blocking handler is safe.
+
+    Commands and hooks that wait on something else (a server reply, a web
+    request made with twisted) can return a Deferred, or be written as
+    generators decorated with `defer.inlineCallbacks`. Yaib keeps track of
+    them until they finish and logs their errors like any other handler.
+
+    Commands whose output only depends on their arguments (lookups, web
+    searches...) can be decorated with `@memoize(ttl=..., size=...)` and
+    return their output instead of replying. It is cached for `ttl` seconds,
+    and identical requests made while it is still running wait for it. Case
+    insensitive commands can share results with
+    `@memoize(normalize=normalizeArgument)`.
     """
     name = 'BasePlugin'
 
+    priority = 0
+    priorities = {}
+
+    batch_size = 100
+    batch_interval = 5
+
+    STOP_PROPAGATION = STOP_PROPAGATION
+
     def __init__(self, yaib, configuration):
         self.yaib = yaib
 
@@ -35,6 +81,11 @@ class BasePlugin(object):
     def nick(self):
         return self.yaib.nick
 
+    @property
+    def network(self):
+        """The network the current event came from (see yaib.networks)."""
+        return self.yaib.network
+
     def configure(self, configuration):
         """
         Overwrite this to handle configuration.
@@ -52,21 +103,50 @@ class BasePlugin(object):
     def getDbSession(self):
         return self.yaib.persistence.getDbSession()
 
-    def formatDoc(self, message):
-        """Formats the given message with the {nick} and {command_prefix}."""
-        return self.yaib.formatDoc(message)
+    def formatDoc(self, message, *args, **values):
+        """
+        Formats the given message with the {nick} and {command_prefix}, and
+        any other fields with the given values. The parsed message is cached,
+        so this is also the quick way to fill in reply templates, eg
+        self.formatDoc(self.GREETING, user=nick).
+        """
+        return self.yaib.formatDoc(message, *args, **values)
 
     def callLater(self, delay, func, *args, **kwargs):
         """
         Wait for the delay (in seconds) then call the function with
         the given arguments."""
-        return self.yaib.callLater(delay, func, *args, **kwargs)
+        return self.yaib.callLaterFor(self, delay, func, *args, **kwargs)
 
     def onShutdown(self):
         """Called when yaib is shutting down. Clean anything
         up and save all the settings necessary."""
         pass
 
+    def onUnload(self):
+        """
+        Called before the plugin is unloaded or replaced by a reload. Yaib
+        cancels its pending callLater calls and unsubscribes its methods
+        from pub itself. Release anything else that would keep it running
+        or alive (threads, other timers, subscribed functions...).
+        """
+        pass
+
+    def serializeState(self):
+        """
+        Overwrite this to keep runtime state (caches, counters...) across
+        restarts. Return something picklable, or None for nothing to keep.
+        Called for the snapshot (see the `snapshot` config) and upgrades.
+        """
+        return None
+
+    def restoreState(self, state):
+        """
+        Called after loading with the value serializeState returned before
+        the restart.
+        """
+        pass
+
     def send(self, channel, message):
         """Send a message in the given channel."""
         return self.yaib.sendMessage(channel, message)
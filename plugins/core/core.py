@@ -1,5 +1,9 @@
+import os
 import time
+import json
+import datetime
 from plugins.baseplugin import BasePlugin
+from modules.dispatch import getCaches
 
 
 class Plugin(BasePlugin):
@@ -111,7 +115,9 @@ class Plugin(BasePlugin):
         self.reply(channel, nick, "reset settings starting at %s" % more)
 
     def admin_reload(self, user, nick, channel, more):
-        """Reloads all the plugins, or one specified plugin"""
+        """
+        Reloads the plugins that changed, or one specified plugin -
+        Usage: {command_prefix}reload [plugin folder]"""
         if more != '':
             try:
                 result = self.yaib.loadPlugin(more.strip())
@@ -122,13 +128,35 @@ class Plugin(BasePlugin):
             except Exception as e:
                 self.reply(channel, nick, "Failed to reload plugin %s" % more)
 
-        # if we didnt find the specified plugin, just reload them all
-        self.yaib.loadPlugins()
-        self.reply(
-            channel,
-            nick,
-            "%d plugins reloaded" % len(self.yaib.plugins)
-        )
+            # if we didnt find the specified plugin, just reload them all
+            self.yaib.loadPlugins()
+            self.reply(
+                channel,
+                nick,
+                "%d plugins reloaded" % len(self.yaib.plugins)
+            )
+            return
+
+        reloaded, removed = self.yaib.reloadPlugins()
+        # unchanged plugins keep their instances, give them another chance
+        # like a full reload would
+        self.yaib.breaker.reset()
+        self.reply(channel, nick, "Reloaded %d changed plugins%s%s" % (
+            len(reloaded),
+            reloaded and ': %s' % ', '.join(reloaded) or '',
+            removed and ', removed %s' % ', '.join(removed) or ''
+        ))
+
+    def admin_upgrade(self, user, nick, channel, more):
+        """
+        Restarts {nick} with the latest code without disconnecting -
+        Usage: {command_prefix}upgrade"""
+        if not self.yaib.getConnections():
+            self.reply(channel, nick, "Not connected, restart me instead")
+            return
+        self.reply(channel, nick, "Upgrading...")
+        if not self.yaib.upgrade():
+            self.reply(channel, nick, "Can not upgrade a cluster worker")
 
     def admin_do(self, user, nick, channel, more):
         """Makes {nick} do an action."""
@@ -173,7 +201,7 @@ class Plugin(BasePlugin):
 
     def admin_nick(self, user, nick, channel, more):
         """Makes {nick} change nick - Usage: {command_prefix}nick new_nick"""
-        self.yaib.setNick(more.strip())
+        self.yaib.setNick(self.yaib.formatNick(more.strip()))
 
     def admin_shutup(self, user, nick, channel, more):
         """
@@ -200,6 +228,180 @@ class Plugin(BasePlugin):
             duration = self.yaib.settings.get('shutup_duration')
         self.yaib.shutup_until = time.time() + duration
 
+    def admin_running(self, user, nick, channel, more):
+        """Lists the asynchronous commands and hooks still running."""
+        pending = self.yaib.inflight.pending()
+        self.send(nick, "%d running, %d finished, %d failed" % (
+            len(pending),
+            self.yaib.inflight.finished,
+            self.yaib.inflight.failed
+        ))
+        for plugin_name, name, elapsed in pending[:10]:
+            self.send(nick, "- %s in %s for %.1f seconds" % (
+                name, plugin_name, elapsed
+            ))
+
+    def admin_overruns(self, user, nick, channel, more):
+        """Lists the plugin hooks and commands that ran over budget."""
+        overruns = sorted(
+            self.yaib.watchdog.overruns.items(),
+            key=lambda o: o[1],
+            reverse=True
+        )
+        if not overruns:
+            return self.send(nick, "No handlers have run over budget")
+        for (plugin_name, name), count in overruns[:10]:
+            self.send(nick, "- %s in %s: %d times" % (
+                name, plugin_name, count
+            ))
+
+    def admin_lagmonitor(self, user, nick, channel, more):
+        """
+        Measures how long {nick} is blocked between ticks.
+        Usage: {command_prefix}lagmonitor [on|off|reset|status]
+        """
+        monitor = self.yaib.lagMonitor
+        more = more.strip()
+        if more == 'on':
+            monitor.start()
+        elif more == 'off':
+            monitor.stop()
+        elif more == 'reset':
+            monitor.reset()
+
+        self.send(nick, "Lag monitor is %s: %s" % (
+            'on' if monitor.running else 'off',
+            monitor.summary()
+        ))
+
+        # the most recent stalls and the code that was running
+        for timestamp, lag, stack in list(monitor.log)[-5:]:
+            where = stack[-1].strip().split('\n')[0] if stack else 'unknown'
+            self.send(nick, "- %s blocked %.3fs in %s" % (
+                datetime.datetime.fromtimestamp(timestamp).strftime(
+                    '%H:%M:%S'
+                ),
+                lag,
+                where
+            ))
+
+    def admin_perf(self, user, nick, channel, more):
+        """
+        Lists the slowest plugin hooks and commands.
+        Usage: {command_prefix}perf [p50|p99|total|count|max] [limit],
+        {command_prefix}perf reset or {command_prefix}perf export [file]
+        """
+        stats = self.yaib.latency
+        params = more.split()
+        order = params[0] if params else 'total'
+
+        if order == 'reset':
+            stats.reset()
+            return self.send(nick, 'Cleared the latency histograms')
+
+        if order == 'export':
+            # only to a file in the export folder, not anywhere on the host
+            name = params[1] if len(params) > 1 else 'perf.json'
+            if os.path.basename(name) != name or name.startswith('.'):
+                return self.send(nick, 'Export to a file name, not a path')
+            monitoring = self.yaib.config.monitoring
+            path = os.path.join(
+                monitoring and monitoring.export_folder or '.', name
+            )
+            try:
+                with open(path, 'w') as f:
+                    json.dump(stats.export(), f, indent=2, sort_keys=True)
+            except (IOError, OSError) as e:
+                return self.send(nick, 'Could not export to %s: %s' % (
+                    path, e.strerror or e
+                ))
+            return self.send(nick, 'Exported the latency histograms to %s' % (
+                path
+            ))
+
+        if order not in stats.ORDERS:
+            return self.send(nick, self.formatDoc(
+                "Usage: {command_prefix}perf [p50|p99|total|count|max] [limit]"
+            ))
+
+        try:
+            limit = int(params[1]) if len(params) > 1 else 10
+        except ValueError:
+            limit = 10
+
+        self.send(nick, "Slowest handlers by %s since %s" % (
+            order,
+            datetime.datetime.fromtimestamp(stats.since).strftime(
+                '%Y-%m-%d %H:%M:%S'
+            )
+        ))
+        for plugin_name, name, histogram in stats.top(order, limit):
+            self.send(
+                nick,
+                "- %s in %s: %d calls, p50 %.1fms, p99 %.1fms, "
+                "max %.1fms, total %.2fs" % (
+                    name,
+                    plugin_name,
+                    histogram.count,
+                    histogram.percentile(50) * 1000,
+                    histogram.percentile(99) * 1000,
+                    histogram.max * 1000,
+                    histogram.total
+                )
+            )
+
+    def admin_breakers(self, user, nick, channel, more):
+        """
+        Lists the plugin hooks skipped because they keep failing.
+        Usage: {command_prefix}breakers [reset [plugin]]
+        """
+        breaker = self.yaib.breaker
+        params = more.split()
+        if params and params[0] == 'reset':
+            breaker.reset(params[1] if len(params) > 1 else None)
+            return self.send(nick, 'Reset the circuit breakers')
+
+        states = breaker.states()
+        if not states:
+            return self.send(nick, 'No circuit breakers are open')
+        for plugin_name, name, state, retry, count in states:
+            self.send(nick, "- %s in %s: %s, retry in %ds, opened %d times" % (
+                name, plugin_name, state, retry, count
+            ))
+
+    def admin_memo(self, user, nick, channel, more):
+        """
+        Lists the hit rates of the memoized plugin commands.
+        Usage: {command_prefix}memo [reset]
+        """
+        caches = [
+            (plugin.name, cache)
+            for plugin in self.yaib.plugins
+            for cache in getCaches(plugin)
+        ]
+        if more.strip() == 'reset':
+            for plugin_name, cache in caches:
+                cache.clear()
+            return self.send(nick, 'Cleared the memoized results')
+
+        if not caches:
+            return self.send(nick, 'No memoized commands have run')
+        for plugin_name, cache in caches:
+            self.send(
+                nick,
+                "- %s in %s: %d hits, %d waited, %d misses (%.0f%% hit "
+                "rate), %d/%d cached" % (
+                    cache.name,
+                    plugin_name,
+                    cache.hits,
+                    cache.coalesced,
+                    cache.misses,
+                    cache.hitRate() * 100,
+                    len(cache),
+                    cache.size
+                )
+            )
+
     def command_plugins(self, user, nick, channel, more):
         """Lists the loaded plugins"""
         self.reply(
@@ -216,83 +418,39 @@ class Plugin(BasePlugin):
         self.reply(
             channel, nick, self.formatDoc(self.settings.get('yaib_info')))
 
-    # TODO: make this less ugly
+    def getHelpIndex(self):
+        """Returns the help index, built again if it is out of date."""
+        index = self.yaib.help
+        key = (self.nick, self.command_prefix)
+        if not index.isCurrent(key):
+            index.build(self.yaib.plugins, key, [(self.nick, self.name)])
+        return index
+
     def command_help(self, user, nick, channel, more):
         """Sends the {nick} command documentation to the user who calls it."""
+        index = self.getHelpIndex()
 
         # if more == '', show main help menu
-        if more == '':
-            content = self.formatDoc(
-                "The following help categories are available. " +
-                "Select a category with '{command_prefix}help category'.\n" +
-                "--------------------------------\n"
-            )
-
-            content += ', '.join(
-                [self.nick] + [p.name for p in self.yaib.plugins]
-            )
-
-            for line in content.split("\n"):
-                self.send(nick, line)
+        if more.strip() == '':
+            lines = index.overview
 
         else:
-            searchables = []
-            if more in [self.nick, 'core']:
-                # show all built in commands
-                searchables = [self]
-            else:
-                # look for plugin and use that
-                for plugin in self.yaib.plugins:
-                    if more.find(plugin.name) >= 0:
-                        searchables.append(plugin)
-
-            if len(searchables) == 0:
+            categories = index.find(more)
+            if len(categories) == 0:
                 self.send(nick, "Could not find help category %s" % more)
                 return
+            if len(categories) > 1:
+                self.send(nick, "Help category %s could be %s" % (
+                    more, ', '.join(categories)
+                ))
+                return
 
-            content = self.formatDoc(
-                "Commands can be issued with a '{command_prefix}' or by " +
-                "starting with '{nick}'. Example: '{command_prefix}help' " +
-                "or '{nick}: help'.\n" +
-                "The following commands are available in the category " +
-                "'{}'\n".format(more)
+            lines = index.getLines(
+                categories[0], self.yaib.isAdmin(user, nick)
             )
 
-            is_admin = self.yaib.isAdmin(user, nick)
-            admin_commands, commands = [], []
-            for searchable in searchables:
-                for item in dir(searchable):
-                    prop = getattr(searchable, item)
-                    if callable(prop):
-                        is_command = item.startswith('command_')
-                        is_admin_command = item.startswith('admin_')
-
-                        # if this is a command
-                        if (is_command or (is_admin and is_admin_command)):
-                            # if function has a doc string
-                            if prop.__doc__:
-                                doc = prop.__doc__
-
-                                if is_command:
-                                    commands.append((
-                                        item[len('command_'):],
-                                        self.yaib.formatDoc(doc)
-                                    ))
-                                else:
-                                    admin_commands.append((
-                                        item[len('admin_'):],
-                                        self.yaib.formatDoc(doc)
-                                    ))
-
-            # list admin commands first
-            for admin_command, doc in admin_commands:
-                content += """- %s (Admin only): %s\n""" % (admin_command, doc)
-
-            for command, doc in commands:
-                content += """- %s: %s\n""" % (command, doc)
-
-            for line in content.split("\n"):
-                self.send(nick, line)
+        for line in lines:
+            self.send(nick, line)
 
     def command_ping(self, user, nick, channel, more):
         """Starts a ping request against the user who calls it
@@ -5,7 +5,9 @@ plugins work.
 Includes custom settings and using the persistence layer via sqlalchemy.
 """
 
-from plugins.baseplugin import BasePlugin
+from twisted.internet import defer
+
+from plugins.baseplugin import BasePlugin, blocking
 
 # import models for this plugin - import from top
 from plugins.example.models import Thing
@@ -30,11 +32,13 @@ class Plugin(BasePlugin):
         """
         self.reply(channel, nick, "Admin plugin commands too!")
 
+    @blocking
     def command_dbtest(self, user, nick, channel, rest):
         """
         Demonstrates how to correctly use the sqlalchemy db session from the
         persistence module. Every time this function is called, this creates a
-        new row in the Thing table.
+        new row in the Thing table. Marked as blocking so the query runs in
+        the thread pool instead of stalling the connection.
         """
         with self.getDbSession() as db_session:
             contrived_example = Thing(
@@ -43,29 +47,56 @@ class Plugin(BasePlugin):
             )
             db_session.add(contrived_example)
 
+    def configure(self, configuration):
+        # lowercase nick -> (whois result, deferreds waiting for it)
+        self.whois_requests = {}
+
+    @defer.inlineCallbacks
     def command_whois(self, user, nick, channel, rest):
         """
         Calls the whois command. Unstable usage - depends on IRC and goes
-        beyond existing api. This is an example of a fairly elaborate,
-        stateful command.
+        beyond existing api. This is an example of an asynchronous command
+        that waits for the server's replies.
         """
         if not rest:
             self.reply(channel, nick, '%s: who is who?' % nick)
-            return False
+            return
 
-        try:
-            target_nick = rest.split(' ')[0]
-        except:
-            target_nick = rest
+        target_nick = rest.split(' ')[0]
+        result = yield self.whois(target_nick)
 
-        self.whois_channel = channel if channel != self.nick else nick
-        self.whois_result = {'nick': target_nick}
-        self.yaib.server_connection.whois(target_nick)
+        if 'user' in result:
+            self.reply(channel, nick, result['user'])
+            self.reply(
+                channel,
+                nick,
+                "Member of " + ', '.join(result.get('channels', []))
+            )
+        else:
+            self.reply(channel, nick, "No results for whois")
+
+    def whois(self, target_nick):
+        """
+        Returns a Deferred firing with the whois result for the nick. Requests
+        for a nick that is already being looked up share the same reply.
+        """
+        d = defer.Deferred()
+        key = target_nick.lower()
+        if key in self.whois_requests:
+            self.whois_requests[key][1].append(d)
+        else:
+            self.whois_requests[key] = ({'nick': target_nick}, [d])
+            self.yaib.server_connection.whois(target_nick)
+        return d
+
+    def getWhoisResult(self, target_nick):
+        request = self.whois_requests.get(target_nick.lower())
+        return request[0] if request else {}
 
     def irc_RPL_WHOISUSER(self, *args):
         """Can listen for unhandled connection events by name."""
         # print "WHOIS USER", args
-        self.whois_result['user'] = '%s <%s@%s> "%s"' % (
+        self.getWhoisResult(args[0][1])['user'] = '%s <%s@%s> "%s"' % (
             args[0][1], args[0][2], args[0][3], args[0][5]
         )
 
@@ -76,7 +107,7 @@ class Plugin(BasePlugin):
     def irc_RPL_WHOISCHANNELS(self, *args):
         # print "WHOIS CHANNELS", args
         channels = args[0][2].strip().split(' ')
-        self.whois_result['channels'] = channels
+        self.getWhoisResult(args[0][1])['channels'] = channels
 
     def irc_RPL_WHOISIDLE(self, *args):
         # print "WHOIS IDLE", args
@@ -84,14 +115,11 @@ class Plugin(BasePlugin):
 
     def irc_RPL_ENDOFWHOIS(self, *args):
         # print 'END OF WHOIS'
-        if 'user' in self.whois_result:
-            self.send(self.whois_channel, self.whois_result['user'])
-            self.send(
-                self.whois_channel,
-                "Member of " + ', '.join(self.whois_result['channels'])
-            )
-        else:
-            self.send(self.whois_channel, "No results for whois")
+        request = self.whois_requests.pop(args[0][1].lower(), None)
+        if request:
+            result, waiting = request
+            for d in waiting:
+                d.callback(result)
 
     def command_echo_wait(self, user, nick, channel, more):
         """Echos the message passed (and appends 'woohoo') after a 2 second
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Microbenchmark comparing the per-event overhead of PyPubSub with the
+yaib event bus on the connection hot path.
+
+Run from the yaib folder:
+    python -m tools.bench_eventbus [events]
+"""
+
+import sys
+import timeit
+
+from pubsub import pub as pypubsub
+
+from tools.eventbus import EventBus
+
+
+def listener(user, nick, channel, message, highlight):
+    pass
+
+
+def run(events):
+    kwargs = dict(
+        user='nick!user@host',
+        nick='nick',
+        channel='#yaib',
+        message='hello world',
+        highlight=False
+    )
+
+    pypubsub.subscribe(listener, 'connection:message')
+
+    bus = EventBus()
+    bus.subscribe(listener, 'connection:message')
+    topic = bus.getTopic('connection:message')
+
+    def viaPyPubSub():
+        pypubsub.sendMessage('connection:%s' % 'message', **kwargs)
+
+    def viaBusSendMessage():
+        bus.sendMessage('connection:%s' % 'message', **kwargs)
+
+    def viaResolvedTopic():
+        topic.send(**kwargs)
+
+    def direct():
+        listener(**kwargs)
+
+    results = []
+    for name, func in [
+            ('pypubsub sendMessage', viaPyPubSub),
+            ('eventbus sendMessage', viaBusSendMessage),
+            ('eventbus resolved topic', viaResolvedTopic),
+            ('direct call (baseline)', direct)]:
+        seconds = min(timeit.repeat(func, number=events, repeat=3))
+        results.append((name, seconds))
+
+    baseline = results[0][1]
+    print("%d events, best of 3" % events)
+    for name, seconds in results:
+        print("%-26s %8.3f us/event  %6.1fx" % (
+            name,
+            seconds / events * 1e6,
+            baseline / seconds
+        ))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,105 @@
+"""
+Lightweight in-process event bus for yaib's hot path.
+
+Every line from the server used to go through PyPubSub, which formats the
+topic name, looks the topic up, and validates the listener arguments before
+any listener runs. The bus keeps a Topic object per topic with a plain tuple
+of listeners, so publishers can resolve a topic once and call its listeners
+directly afterwards.
+
+The bus is API compatible with the parts of `pubsub.pub` yaib uses
+(`subscribe`, `unsubscribe`, `sendMessage`). Topics starting with one of
+the LOCAL_PREFIXES are handled by the bus, everything else is passed through
+to PyPubSub, so modules can use the bus for all of their subscriptions.
+
+NOTE: unlike PyPubSub, the bus holds strong references to its listeners.
+Unsubscribe listeners that should be garbage collected (see
+unsubscribeOwner).
+"""
+
+from pubsub import pub as pypubsub
+
+
+LOCAL_PREFIXES = ('connection:', 'core:')
+
+
+class Topic(object):
+    """A single topic and the listeners subscribed to it."""
+
+    __slots__ = ('name', 'listeners')
+
+    def __init__(self, name):
+        self.name = name
+        self.listeners = ()
+
+    def subscribe(self, listener):
+        if listener not in self.listeners:
+            self.listeners = self.listeners + (listener,)
+
+    def unsubscribe(self, listener):
+        self.listeners = tuple(l for l in self.listeners if l != listener)
+
+    def hasListeners(self):
+        return len(self.listeners) > 0
+
+    def send(self, **kwargs):
+        """Call every listener with the given keyword arguments."""
+        for listener in self.listeners:
+            listener(**kwargs)
+
+
+class EventBus(object):
+
+    def __init__(self, local_prefixes=LOCAL_PREFIXES, fallback=pypubsub):
+        self._local_prefixes = local_prefixes
+        self._fallback = fallback
+        self._topics = {}
+
+    def isLocal(self, topicName):
+        """Returns True if the bus handles the topic itself."""
+        return topicName.startswith(self._local_prefixes)
+
+    def getTopic(self, topicName):
+        """Returns the Topic object for a local topic, creating it if new."""
+        topic = self._topics.get(topicName)
+        if topic is None:
+            topic = self._topics[topicName] = Topic(topicName)
+        return topic
+
+    def subscribe(self, listener, topicName):
+        if self.isLocal(topicName):
+            self.getTopic(topicName).subscribe(listener)
+        else:
+            self._fallback.subscribe(listener, topicName)
+
+    def unsubscribe(self, listener, topicName):
+        if self.isLocal(topicName):
+            self.getTopic(topicName).unsubscribe(listener)
+        else:
+            self._fallback.unsubscribe(listener, topicName)
+
+    def unsubscribeOwner(self, owner):
+        """
+        Unsubscribe every method of owner from every topic, so an unloaded
+        plugin is not kept alive (or called) by its subscriptions.
+        """
+        def isOwned(listener):
+            return getattr(listener, 'im_self', None) is owner
+
+        for topic in self._topics.values():
+            for listener in topic.listeners:
+                if isOwned(listener):
+                    topic.unsubscribe(listener)
+        self._fallback.unsubAll(
+            listenerFilter=lambda listener: isOwned(listener.getCallable())
+        )
+
+    def sendMessage(self, topicName, **kwargs):
+        if self.isLocal(topicName):
+            self.getTopic(topicName).send(**kwargs)
+        else:
+            self._fallback.sendMessage(topicName, **kwargs)
+
+
+# shared bus used by yaib, the modules and the plugins
+pub = EventBus()
@@ -0,0 +1,58 @@
+"""
+Consistent hash ring, used to spread channels over cluster workers so that
+adding or removing a worker only moves the channels it owned.
+"""
+
+import hashlib
+from bisect import bisect, insort
+
+
+class HashRing(object):
+    """
+    Maps keys to nodes. Every node is placed on the ring `replicas` times to
+    spread the keys evenly.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self.nodes = set()
+
+        # sorted hashes and hash -> node
+        self._points = []
+        self._owners = {}
+
+        for node in nodes:
+            self.add(node)
+
+    def _hash(self, key):
+        return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = self._hash('%s:%d' % (node, i))
+            self._owners[point] = node
+            insort(self._points, point)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        for i in range(self.replicas):
+            point = self._hash('%s:%d' % (node, i))
+            del self._owners[point]
+            self._points.remove(point)
+
+    def get(self, key):
+        """Returns the node owning the key, or None if the ring is empty."""
+        if not self._points:
+            return None
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        index = bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+    def __len__(self):
+        return len(self.nodes)
@@ -0,0 +1,109 @@
+"""
+Cache of formatted message templates, used for docstrings and plugin
+replies that mention the bot's nick or command prefix.
+"""
+
+import re
+from string import Formatter
+
+
+_FIELD_ROOT = re.compile(r'[^.\[]*')
+
+
+def _escape(text):
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+class TemplateCache(object):
+    """
+    Formats str.format templates with a few values that rarely change (eg
+    nick and command_prefix) and, optionally, values given with each call.
+
+    Each template is parsed once. The cached values are filled in, and what
+    is left is kept as a smaller template, or as the final string when
+    nothing is left, so formatting it again is a dict lookup. The cache is
+    cleared when one of the cached values changes, or when it holds
+    `maxsize` templates.
+    """
+
+    def __init__(self, remove=(), maxsize=1000, **values):
+        # substrings removed from every template
+        self.remove = remove
+        self.maxsize = maxsize
+
+        self._values = values
+        self._formatter = Formatter()
+
+        # template -> (text, whether text still has fields to format)
+        self._templates = {}
+
+    def update(self, **values):
+        """Set cached values, clearing the cache if any of them changed."""
+        for key, value in values.items():
+            if key not in self._values or self._values[key] != value:
+                self._values.update(values)
+                self._templates = {}
+                return
+
+    def clear(self):
+        self._templates = {}
+
+    def format(self, template, *args, **kwargs):
+        """
+        Returns the template formatted with the cached values and the given
+        ones, which take precedence.
+        """
+        for key in kwargs:
+            if key in self._values:
+                # overrides a cached value, can not use the cached text
+                values = dict(self._values)
+                values.update(kwargs)
+                return self._clean(template).format(*args, **values)
+
+        compiled = self._templates.get(template)
+        if compiled is None:
+            compiled = self._compile(template)
+            if len(self._templates) >= self.maxsize:
+                self._templates = {}
+            self._templates[template] = compiled
+
+        text, formatted = compiled
+        if formatted:
+            return text
+        values = dict(self._values)
+        values.update(kwargs)
+        return text.format(*args, **values)
+
+    def _clean(self, template):
+        for text in self.remove:
+            template = template.replace(text, '')
+        return template
+
+    def _compile(self, template):
+        """Returns (text, True) if template is fully formatted by caching."""
+        parts = []
+        formatted = True
+        for literal, field, spec, conversion in self._formatter.parse(
+                self._clean(template)):
+            parts.append(_escape(literal))
+            if field is None:
+                continue
+
+            field = '{%s%s%s}' % (
+                field,
+                '!' + conversion if conversion else '',
+                ':' + spec if spec else ''
+            )
+            root = _FIELD_ROOT.match(field[1:]).group(0)
+            if root in self._values and '{' not in spec:
+                parts.append(_escape(field.format(**self._values)))
+            else:
+                # positional, given with the call or with nested fields
+                parts.append(field)
+                formatted = False
+
+        text = ''.join(parts)
+        if formatted:
+            # only escaped braces are left
+            text = text.format()
+        return text, formatted
@@ -0,0 +1,93 @@
+from ..eventbus import EventBus
+
+
+class FakeFallback(object):
+
+    def __init__(self):
+        self.sent = []
+        self.listeners = []
+
+    def subscribe(self, listener, topicName):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener, topicName):
+        self.listeners.remove(listener)
+
+    def sendMessage(self, topicName, **kwargs):
+        self.sent.append((topicName, kwargs))
+
+    def unsubAll(self, listenerFilter):
+        for listener in list(self.listeners):
+            if listenerFilter(FakeListener(listener)):
+                self.listeners.remove(listener)
+
+
+class FakeListener(object):
+
+    def __init__(self, listener):
+        self.listener = listener
+
+    def getCallable(self):
+        return self.listener
+
+
+class Owner(object):
+
+    def listener(self, **kwargs):
+        pass
+
+
+class TestEventBus(object):
+
+    def setup(self):
+        self.fallback = FakeFallback()
+        self.bus = EventBus(fallback=self.fallback)
+        self.received = []
+
+    def listener(self, **kwargs):
+        self.received.append(kwargs)
+
+    def test_send(self):
+        """Test local topics are delivered to their listeners."""
+        self.bus.subscribe(self.listener, 'connection:message')
+        self.bus.sendMessage('connection:message', message='hi')
+        assert(self.received == [{'message': 'hi'}])
+
+    def test_topic_object(self):
+        """Test sending through a pre-resolved topic."""
+        topic = self.bus.getTopic('core:pluginsLoaded')
+        self.bus.subscribe(self.listener, 'core:pluginsLoaded')
+        topic.send()
+        assert(self.received == [{}])
+
+    def test_subscribe_once(self):
+        """Test subscribing the same listener twice only delivers once."""
+        self.bus.subscribe(self.listener, 'core:shutdown')
+        self.bus.subscribe(self.listener, 'core:shutdown')
+        self.bus.sendMessage('core:shutdown')
+        assert(len(self.received) == 1)
+
+    def test_unsubscribe(self):
+        """Test unsubscribed listeners are not called."""
+        self.bus.subscribe(self.listener, 'core:shutdown')
+        self.bus.unsubscribe(self.listener, 'core:shutdown')
+        self.bus.sendMessage('core:shutdown')
+        assert(self.received == [])
+
+    def test_fallback(self):
+        """Test other topics are passed through to pubsub."""
+        self.bus.sendMessage('settings:updated')
+        assert(self.fallback.sent == [('settings:updated', {})])
+        assert(not self.bus.getTopic('connection:joined').hasListeners())
+
+    def test_unsubscribe_owner(self):
+        """Test every method of an owner is unsubscribed."""
+        owner = Owner()
+        self.bus.subscribe(owner.listener, 'core:shutdown')
+        self.bus.subscribe(self.listener, 'core:shutdown')
+        self.bus.subscribe(owner.listener, 'settings:updated')
+        self.bus.unsubscribeOwner(owner)
+
+        listeners = self.bus.getTopic('core:shutdown').listeners
+        assert(listeners == (self.listener,))
+        assert(self.fallback.listeners == [])
@@ -0,0 +1,42 @@
+from ..hashring import HashRing
+
+
+CHANNELS = ['#channel%d' % i for i in range(200)]
+
+
+class TestHashRing(object):
+
+    def setup(self):
+        self.ring = HashRing([1, 2, 3])
+
+    def test_empty(self):
+        """Test an empty ring has no owners."""
+        assert(HashRing().get('#yaib') is None)
+
+    def test_stable(self):
+        """Test the same key always maps to the same node."""
+        assert(self.ring.get('#yaib') == self.ring.get('#yaib'))
+        assert(self.ring.get(u'#yaib') == self.ring.get('#yaib'))
+
+    def test_spread(self):
+        """Test keys are spread over every node."""
+        owners = [self.ring.get(c) for c in CHANNELS]
+        for node in (1, 2, 3):
+            assert(owners.count(node) > len(CHANNELS) / 6)
+
+    def test_remove_only_moves_removed_keys(self):
+        """Test removing a node only moves the keys it owned."""
+        before = dict((c, self.ring.get(c)) for c in CHANNELS)
+        self.ring.remove(2)
+        for channel, owner in before.items():
+            if owner != 2:
+                assert(self.ring.get(channel) == owner)
+            else:
+                assert(self.ring.get(channel) in (1, 3))
+
+    def test_add_back(self):
+        """Test adding a node back restores the original owners."""
+        before = dict((c, self.ring.get(c)) for c in CHANNELS)
+        self.ring.remove(2)
+        self.ring.add(2)
+        assert(before == dict((c, self.ring.get(c)) for c in CHANNELS))
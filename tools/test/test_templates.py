@@ -0,0 +1,58 @@
+from ..templates import TemplateCache
+
+
+FLAG = '**flag**'
+
+
+class TestTemplateCache(object):
+
+    def setup(self):
+        self.cache = TemplateCache(
+            remove=(FLAG,), nick='yaib', command_prefix='!'
+        )
+
+    def test_format(self):
+        """Test templates are formatted like str.format."""
+        assert(self.cache.format('{command_prefix}help {nick}') ==
+               '!help yaib')
+        assert(self.cache.format('{nick!r:>8} {{}}') == "  'yaib' {}")
+        assert(self.cache.format(FLAG + 'hi {nick}') == 'hi yaib')
+
+    def test_cached(self):
+        """Test templates are only parsed once."""
+        template = 'Hi, I am {nick}'
+        self.cache.format(template)
+        self.cache._formatter = None
+        assert(self.cache.format(template) == 'Hi, I am yaib')
+
+    def test_values(self):
+        """Test values given with the call."""
+        template = '{nick} greets {user} {0}'
+        assert(self.cache.format(template, 1, user='a') == 'yaib greets a 1')
+        assert(self.cache.format(template, 2, user='b') == 'yaib greets b 2')
+        assert(self.cache.format(template, 3, user='c', nick='x') ==
+               'x greets c 3')
+        assert(self.cache.format('{nick}', nick='x') == 'x')
+        assert(self.cache.format('{nick}') == 'yaib')
+
+    def test_missing_value(self):
+        """Test fields without values still raise."""
+        try:
+            self.cache.format('{user}')
+            assert(False), 'formatted a missing field'
+        except KeyError:
+            pass
+
+    def test_update(self):
+        """Test changing a value clears the cache."""
+        assert(self.cache.format('{nick}') == 'yaib')
+        self.cache.update(nick='yaib{2}')
+        assert(self.cache.format('{nick}') == 'yaib{2}')
+        assert(self.cache.format('{nick} {user}', user='a') == 'yaib{2} a')
+
+    def test_maxsize(self):
+        """Test the cache does not grow past maxsize."""
+        self.cache.maxsize = 10
+        for i in range(100):
+            assert(self.cache.format('%d {nick}' % i) == '%d yaib' % i)
+        assert(len(self.cache._templates) <= 10)
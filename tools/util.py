@@ -35,3 +35,21 @@ def dictToObject(d):
             return value
 
     return Container(d)
+
+
+def objectToDict(o):
+    """
+    Returns the dictionary wrapped by an object created with dictToObject,
+    eg to serialize the configuration.
+    """
+    return object.__getattribute__(o, '_d')
+
+
+def toList(value):
+    """
+    Accepts a list or a comma separated string (as found in the config and
+    settings) and returns a list.
+    """
+    if isinstance(value, list):
+        return value
+    return [v.strip() for v in value.split(',')]
@@ -17,15 +17,30 @@
 import sys
 import os
 import time
-import imp
 import json
 import logging
+import weakref
 import traceback
-from pubsub import pub
+import cPickle as pickle
+from collections import OrderedDict
 
 from tools import util
+from tools.eventbus import pub
+from tools.templates import TemplateCache
 from modules import settings, connections, persistence
+from modules.connections import handoff
+from modules.connections.networks import Network, getNetworkConfigs
+from modules.connections.networks import getCurrentNetwork, callInNetwork
+from modules.dispatch import CommandRegistry, HookRegistry, ChannelRouter
+from modules.dispatch import STOP_PROPAGATION, Event, EventBatcher
+from modules.dispatch import ThreadOffloader, inReactorThread
+from modules.dispatch import ProcessPlugin, InFlightTracker, Watchdog
+from modules.dispatch import CircuitBreaker, LazyPlugin, PluginManifest
+from modules.dispatch import PluginLoader, HelpIndex
+from modules.monitoring import LagMonitor, LatencyStats
+from modules.cluster import Coordinator, ClusterClient, ClusterSettings
 from modules.admin.admin_manager import AdminManager
+from plugins.baseplugin import BasePlugin
 
 CONFIG_FILE_PATH = 'config.json'
 PRIVATE_CONFIG_FILE_PATH = 'private_config.json'
@@ -41,91 +56,182 @@ sys.path.insert(
 logging.basicConfig(level=logging.DEBUG)
 
 
+def loadConfiguration():
+    """
+    Loads the configuration file, merged with the private configuration
+    file if there is one. Exits if the configuration can not be loaded.
+    """
+    try:
+        with open(CONFIG_FILE_PATH, 'r') as f:
+            config_content = f.read()
+    except:  # TODO: Catch the real exceptions here
+        logging.error(
+            "Could not open configuration file {}. Quitting.".format(
+                CONFIG_FILE_PATH
+            )
+        )
+        sys.exit(1)
+
+    config = {}
+    try:
+        config = json.loads(config_content)
+        logging.info("Loaded configuration from %s" % CONFIG_FILE_PATH)
+    except ValueError as e:
+        logging.error(
+            "Could not load configuration file {}. Exiting. {}".format(
+                CONFIG_FILE_PATH,
+                repr(e)
+            )
+        )
+        sys.exit(1)
+
+    # try loading private config file
+    private_config_content = ''
+    try:
+        with open(PRIVATE_CONFIG_FILE_PATH, 'r') as private_config_file:
+            private_config_content = private_config_file.read()
+    except:  # TODO: catch real exceptions
+        logging.warning("Could not open private config file {}.".format(
+            PRIVATE_CONFIG_FILE_PATH
+        ))
+
+    private_config = {}
+    try:
+        private_config = json.loads(private_config_content)
+        logging.info(
+            'Loaded private configuration from {}'.format(
+                PRIVATE_CONFIG_FILE_PATH
+            )
+        )
+    except ValueError as e:
+        logging.error(
+            'Could not parse private config file {}.'.format(
+                PRIVATE_CONFIG_FILE_PATH,
+            )
+        )
+
+    # merge private and public config and convert to object
+    config.update(private_config)
+    return util.dictToObject(config)
+
+
+def loadSettings(configuration, worker=False):
+    """
+    Creates the settings module from the configuration and loads the
+    settings. Cluster workers share the coordinator's settings.
+    """
+    # TODO: move this config check to settings module itself
+    if configuration.settings.module != 'json':
+        logging.error(
+            "Unsupported settings module {}. Exiting.".format(
+                configuration.settings.module
+            )
+        )
+        sys.exit(1)
+
+    if worker:
+        loaded = ClusterSettings(configuration)
+    else:
+        loaded = settings.json(configuration)
+    loaded.loadSettings()
+    return loaded
+
+
 class Yaib(object):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, worker=None, resume=None, *args, **kwargs):
 
-        # TODO: support multiple IRC connections at once
-        self.channels = []
         self.plugins = []
-        self.shutup_until = None
+        self.clock = connections.irc.getClock()
+
+        # the source each plugin was loaded from, by plugin folder
+        self.loader = PluginLoader()
+        self.plugin_paths = {}
+
+        # blocking plugin handlers are wrapped to run in the thread pool
+        self.threads = ThreadOffloader(self.clock)
+        self.commands = CommandRegistry(wrap=self.threads.wrap)
+        self.hooks = HookRegistry(base=BasePlugin, wrap=self.threads.wrap)
+        self.routing = ChannelRouter()
+
+        # skips plugin hooks that keep raising exceptions
+        self.breaker = CircuitBreaker()
+
+        # latency histograms of every plugin hook and command
+        self.latency = LatencyStats()
+
+        # commands and hooks that returned a Deferred and are still running
+        self.inflight = InFlightTracker(stats=self.latency)
+
+        # buffers events for the plugins' <hook>Batch handlers
+        self.batches = EventBatcher(
+            self.hooks,
+            self.clock,
+            wrap=self.threads.wrap,
+            track=self.inflight.track,
+            schedule=self.callLaterFor
+        )
 
-        self.DONT_NOTIFY_PLUGINS_FLAG = '**does_not_notify_plugins**'
+        # reports (and optionally disables) handlers that run too long
+        self.watchdog = Watchdog(self.clock, disable=self.disablePlugin)
 
-        # load configuration
-        try:
-            with open(CONFIG_FILE_PATH, 'r') as f:
-                config_content = f.read()
-        except:  # TODO: Catch the real exceptions here
-            logging.error(
-                "Could not open configuration file {}. Quitting.".format(
-                    CONFIG_FILE_PATH
-                )
-            )
-            sys.exit(1)
+        # measures how long the reactor is blocked between ticks
+        self.lagMonitor = LagMonitor(self.clock)
+        self.shutup_until = None
 
-        config = {}
-        try:
-            config = json.loads(config_content)
-            logging.info("Loaded configuration from %s" % CONFIG_FILE_PATH)
-        except ValueError as e:
-            logging.error(
-                "Could not load configuration file {}. Exiting. {}".format(
-                    CONFIG_FILE_PATH,
-                    repr(e)
-                )
-            )
-            sys.exit(1)
+        # saves the runtime state to restore it after a restart
+        self.snapshot = persistence.Snapshot(self.clock)
 
-        # try loading private config file
-        private_config_content = ''
-        try:
-            with open(PRIVATE_CONFIG_FILE_PATH, 'r') as private_config_file:
-                private_config_content = private_config_file.read()
-        except:  # TODO: catch real exceptions
-            logging.warning("Could not open private config file {}.".format(
-                PRIVATE_CONFIG_FILE_PATH
-            ))
+        # pending calls scheduled with callLater, and the plugin each one
+        # was scheduled for
+        self.delayed = weakref.WeakKeyDictionary()
 
-        private_config = {}
-        try:
-            private_config = json.loads(private_config_content)
-            logging.info(
-                'Loaded private configuration from {}'.format(
-                    PRIVATE_CONFIG_FILE_PATH
-                )
-            )
-        except ValueError as e:
-            logging.error(
-                'Could not parse private config file {}.'.format(
-                    PRIVATE_CONFIG_FILE_PATH,
-                )
-            )
+        self.DONT_NOTIFY_PLUGINS_FLAG = '**does_not_notify_plugins**'
 
-        # merge private and public config and convert to object
-        config.update(private_config)
+        # formatDoc results, cleared when the nick or command prefix change
+        self.templates = TemplateCache(
+            remove=(self.DONT_NOTIFY_PLUGINS_FLAG,)
+        )
 
-        self.config = util.dictToObject(config)
+        # the help command's output, built when first needed
+        self.help = HelpIndex(self.formatDoc)
+
+        self.config = loadConfiguration()
+        self.threads.configure(self.config)
+        self.watchdog.configure(self.config)
+        self.breaker.configure(self.config)
+        self.lagMonitor.configure(self.config)
+        self.snapshot.configure(self.config)
+
+        # one or more networks to connect to, the first is the primary
+        self.networks = OrderedDict()
+        for i, (name, network_config) in enumerate(
+                getNetworkConfigs(self.config.connection)):
+            self.networks[name] = Network(name, network_config, i == 0)
+        self.primary_network = self.networks.values()[0]
+
+        # running as one of the coordinator's workers (see Coordinator)
+        self.cluster = None
+        if worker is not None:
+            self.cluster = ClusterClient(self, worker, self.config)
+            self.snapshot.path += '.%d' % worker
 
         # get required fields from config
-        self.command_prefix = self.config.connection.command_prefix
-        self.nick = self.config.nick
+        self.command_prefix = self.primary_network.config.command_prefix
+        self.nick = self.formatNick(self.config.nick)
 
         # load settings module based on configuration
-        # TODO: move this config check to settings module itself
-        if self.config.settings.module == 'json':
-            self.settings = settings.json(self.config)
-            self.settings.loadSettings()
-        else:
-            logging.error(
-                "Unsupported settings module {}. Exiting.".format(
-                    self.config.settings.module
-                )
-            )
-            sys.exit(1)
+        self.settings = loadSettings(self.config, worker is not None)
+        if self.cluster is not None:
+            self.settings.client = self.cluster
 
         # load admin module based on configuration
         self.adminManager = AdminManager(self.config)
 
+        # state handed over by the previous process (see upgrade)
+        self.resume_state = None
+        if resume is not None:
+            self.resume_state = handoff.loadState(resume)
+
         # subscribe to events
         self.subscribeToEvents()
 
@@ -138,61 +244,278 @@ class Yaib(object):
         # load plugins
         self.loadPlugins()
 
+        # start warm with the state from before the restart
+        runtime = None
+        if self.resume_state is not None:
+            runtime = self.resume_state['runtime']
+        elif self.snapshot.enabled:
+            runtime = self.snapshot.load()
+        if runtime is not None:
+            self.restoreRuntimeState(runtime)
+
+    @property
+    def nick(self):
+        return self._nick
+
+    @nick.setter
+    def nick(self, nick):
+        self._nick = nick
+        self.templates.update(nick=nick)
+
+    @property
+    def command_prefix(self):
+        return self._command_prefix
+
+    @command_prefix.setter
+    def command_prefix(self, command_prefix):
+        self._command_prefix = command_prefix
+        self.templates.update(command_prefix=command_prefix)
+
     def subscribeToEvents(self):
         # subscribe to events from the server connections
-        pub.subscribe(self.onConnected, 'connection:connected')
-        pub.subscribe(self.onMessageOfTheDay, 'connection:messageOfTheDay')
-        pub.subscribe(self.onUserAction, 'connection:userAction')
-        pub.subscribe(self.onNotification, 'connection:notification')
-        pub.subscribe(self.onPrivateMessage, 'connection:privateMessage')
-        pub.subscribe(self.onDirectMessage, 'connection:directMessage')
-        pub.subscribe(self.onCommand, 'connection:command')
-        pub.subscribe(self.onMessage, 'connection:message')
-
-        pub.subscribe(self.onJoined, 'connection:joined')
-        pub.subscribe(self.onLeave, 'connection:left')
-        pub.subscribe(self.onKicked, 'connection:kicked')
-        pub.subscribe(self.onTopicChanged, 'connection:topicChanged')
-        pub.subscribe(self.onUserJoined, 'connection:userJoined')
-        pub.subscribe(self.onUserLeft, 'connection:userLeft')
-        pub.subscribe(self.onUserQuit, 'connection:userQuit')
-        pub.subscribe(self.onUserKicked, 'connection:userKicked')
-        pub.subscribe(self.onUserRenamed, 'connection:userRenamed')
-
-        pub.subscribe(self.onUserList, 'connection:userList')
-        pub.subscribe(self.onPong, 'connection:pong')
-        pub.subscribe(self.onIRCUnknown, 'connection:IRCUnknown')
+        subscribe = self.subscribeToConnection
+        subscribe(self.onConnected, 'connected')
+        subscribe(self.onResumed, 'resumed')
+        subscribe(self.onMessageOfTheDay, 'messageOfTheDay')
+        subscribe(self.onUserAction, 'userAction')
+        subscribe(self.onNotification, 'notification')
+        subscribe(self.onPrivateMessage, 'privateMessage')
+        subscribe(self.onDirectMessage, 'directMessage')
+        subscribe(self.onCommand, 'command')
+        subscribe(self.onMessage, 'message')
+
+        subscribe(self.onJoined, 'joined')
+        subscribe(self.onLeave, 'left')
+        subscribe(self.onKicked, 'kicked')
+        subscribe(self.onTopicChanged, 'topicChanged')
+        subscribe(self.onUserJoined, 'userJoined')
+        subscribe(self.onUserLeft, 'userLeft')
+        subscribe(self.onUserQuit, 'userQuit')
+        subscribe(self.onUserKicked, 'userKicked')
+        subscribe(self.onUserRenamed, 'userRenamed')
+
+        subscribe(self.onUserList, 'userList')
+        subscribe(self.onPong, 'pong')
+        subscribe(self.onIRCUnknown, 'IRCUnknown')
+
+        # plugin channel restrictions can be changed in the settings
+        pub.subscribe(self.updateChannelRouting, 'settings:changed')
+        pub.subscribe(self.updateChannelRouting, 'settings:loaded')
+
+    def subscribeToConnection(self, handler, event_name):
+        """
+        Subscribe the handler to the connection event. The handler runs with
+        the network the event came from as the current network.
+        """
+        networks = self.networks
+
+        def handle(network=None, **kwargs):
+            return callInNetwork(networks.get(network), handler, **kwargs)
+        pub.subscribe(handle, 'connection:%s' % event_name)
+
+    @property
+    def network(self):
+        """The network the current event came from, or the primary one."""
+        return getCurrentNetwork() or self.primary_network
+
+    @property
+    def server_connection(self):
+        """The connection to the current network."""
+        connection = self.network.connection
+        if connection is None:
+            raise AttributeError('Not connected to %s' % self.network.name)
+        return connection
+
+    @property
+    def channels(self):
+        """The channels joined on the current network."""
+        return self.network.channels
 
     def start(self):
         """
-        Called after initialization. Connects to the servers in the settings.
+        Called after initialization. Connects to the networks in the settings.
         """
-        # create a connection
+        self.watchdog.start()
+        if self.lagMonitor.enabled:
+            self.lagMonitor.start()
+        if self.snapshot.enabled:
+            self.snapshot.start(self.getRuntimeState)
+
+        if self.cluster is not None:
+            self.cluster.connect(self.clock)
+
+        # create a connection to each network, or adopt the connections
+        # handed over by the previous process
         connection = connections.irc
-        self.connection_factory = connection.connectToServer(
-            self.config.connection,
-            self.nick
-        )
+        resume = self.resume_state and self.resume_state['networks'] or {}
+        for network in self.networks.values():
+            adopted = resume.get(network.name)
+            if adopted and adopted['connection']:
+                network.factory = connection.adoptConnection(
+                    network.config,
+                    self.nick,
+                    network,
+                    adopted['connection']
+                )
+            else:
+                network.factory = connection.connectToServer(
+                    network.config,
+                    self.nick,
+                    network
+                )
+
+            # optional extra connections to spread channel output over
+            helpers = dict([
+                (h['nickname'].lower(), h)
+                for h in (adopted and adopted['helpers'] or [])
+            ])
+            for helper_nick in network.helper_nicks:
+                helper_nick = self.formatNick(helper_nick)
+                network.factory.ignored.add(helper_nick.lower())
+                if helper_nick.lower() in helpers:
+                    connection.adoptConnection(
+                        network.config,
+                        helper_nick,
+                        network,
+                        helpers[helper_nick.lower()],
+                        helper=True
+                    )
+                else:
+                    connection.connectHelper(
+                        network.config, helper_nick, network
+                    )
+        self.resume_state = None
+        self.connection_factory = self.primary_network.factory
         connection.start()
 
+    def formatNick(self, nick):
+        """Returns the nick to use, cluster workers each have their own."""
+        if self.cluster is not None:
+            return self.cluster.formatNick(nick)
+        return nick
+
+    def getRuntimeState(self):
+        """
+        Returns the state lost by restarting, for the snapshot and upgrades.
+        Channels are not included, they are kept in the settings.
+        """
+        plugins = {}
+        for plugin in self.plugins:
+            state = self.getPluginState(plugin)
+            if state is not None:
+                plugins[plugin.name] = state
+
+        return {
+            'admins': self.adminManager.getSessions(),
+            'shutup_until': self.shutup_until,
+            'plugins': plugins,
+            'delayed': self.getDelayedCalls()
+        }
+
+    def getPluginState(self, plugin):
+        """Returns the plugin's serializeState, or None."""
+        serialize = getattr(plugin, 'serializeState', None)
+        if serialize is None:
+            return None
+        # calling external code - catching all exceptions is ok
+        try:
+            return serialize()
+        except Exception as e:
+            logging.error(
+                "Exception serializing plugin {}: {}".format(
+                    plugin.name, repr(e)
+                )
+            )
+            return None
+
+    def getDelayedCalls(self):
+        """
+        Returns (plugin name, method name, args, kwargs, due time, network
+        name) for every pending callLater of a plugin method that can be
+        pickled. Other calls can not be restored after a restart.
+        """
+        now = time.time()
+        delayed = []
+        for call in list(self.delayed):
+            if not call.active():
+                continue
+            network, func = call.args[:2]
+            owner = getattr(func, 'im_self', None)
+            if owner is None or owner not in self.plugins:
+                continue
+            entry = (
+                owner.name,
+                func.__name__,
+                call.args[2:],
+                call.kw,
+                now + call.getTime() - self.clock.seconds(),
+                network and network.name
+            )
+            try:
+                pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                logging.debug("Can not save delayed call %s" % func)
+                continue
+            delayed.append(entry)
+        return delayed
+
+    def restoreRuntimeState(self, state):
+        """Restores the state from getRuntimeState after a restart."""
+        self.adminManager.restoreSessions(state['admins'])
+        self.shutup_until = state['shutup_until']
+
+        plugins = dict([(plugin.name, plugin) for plugin in self.plugins])
+        for name, plugin_state in state['plugins'].items():
+            plugin = plugins.get(name)
+            restore = getattr(plugin, 'restoreState', None)
+            if restore is None:
+                continue
+            # calling external code - catching all exceptions is ok
+            try:
+                restore(plugin_state)
+            except Exception as e:
+                logging.error(
+                    "Exception restoring plugin {}: {}".format(name, repr(e))
+                )
+
+        now = time.time()
+        for name, method, args, kwargs, due, network in state['delayed']:
+            plugin = plugins.get(name)
+            if isinstance(plugin, LazyPlugin):
+                plugin = plugin.activate()
+            func = getattr(plugin, method, None)
+            if func is not None:
+                callInNetwork(
+                    self.networks.get(network),
+                    self.callLater,
+                    max(due - now, 0),
+                    func,
+                    *args,
+                    **kwargs
+                )
+
+        logging.info(
+            "Restored the state of {} plugins and {} delayed calls".format(
+                len(state['plugins']), len(state['delayed'])
+            )
+        )
+
     def createDefaultSettings(self):
         """Ensure the default settings exist from the config file."""
         # TODO: just load everything from config without explicitly listing
-        if isinstance(self.config.default_channels, list):
-            default_channels = self.config.default_channels
-        else:
-            default_channels = [
-                c.strip() for c in
-                self.config.default_channels.split(',')
-            ]
-
-        self.settings.setMulti({
+        defaults = {
             'nick': self.config.nick,
-            'default_channels': default_channels,
             'shutup_duration': 30
-            },
-            initial=True
-        )
+        }
+
+        # each network can list its own channels
+        for network in self.networks.values():
+            channels = network.config.default_channels
+            if channels is None and network.primary:
+                channels = self.config.default_channels
+            defaults[network.channels_key] = util.toList(channels or [])
+
+        self.settings.setMulti(defaults, initial=True)
 
     def loadPlugins(self):
         """
@@ -203,69 +526,367 @@ class Yaib(object):
         """
 
         logging.info("loading plugins")
+
+        # unload the current plugins (flushes batches, stops workers)
+        for plugin in list(self.plugins):
+            self.unloadPlugin(plugin)
+
         # load each plugin and put in self.plugins
         self.plugins = []
+        self.plugin_paths = {}
+
+        # rebuild the command table, yaib's own commands take precedence
+        self.commands.clear()
+        self.commands.register(self)
+        self.batches.clear()
+        self.hooks.clear()
+        self.routing.clear()
+
+        # what each plugin provides, to register lazy plugins as stubs
+        self.manifest = PluginManifest(
+            self.config.plugins.manifest or 'plugin_manifest.json'
+        )
+        self.manifest.load()
+
         for path in os.listdir(self.config.plugins.root):
             self.loadPlugin(path)
+        self.manifest.save()
 
         # notify listeners that the plugins have finished loading
         pub.sendMessage('core:pluginsLoaded')
         self.callInPlugins('onPluginsLoaded')
 
-    def loadPlugin(self, path):
-        """Load a plugin from the given path"""
+    def reloadPlugins(self):
+        """
+        Reloads only the plugins whose source changed since they were
+        loaded, loads new plugins and unloads the ones whose folder is gone.
+        The other plugins are left running as they are. The changed plugins
+        are all created before any of them is swapped in, get the state of
+        the version they replace (see BasePlugin.serializeState) and keep
+        that version if they fail to load. Returns the names of the
+        reloaded and of the removed plugins.
+        """
+        logging.info("reloading changed plugins")
+        loaded = dict([(plugin.name, plugin) for plugin in self.plugins])
+        paths = os.listdir(self.config.plugins.root)
+
+        removed = []
+        for path, name in self.plugin_paths.items():
+            if path not in paths:
+                del self.plugin_paths[path]
+                if name in loaded:
+                    self.unloadPlugin(loaded.pop(name))
+                    removed.append(name)
+                persistence.removeModels(path)
+                self.loader.forget(path, self.getPluginFilePath(path))
+
+        created = []
+        for path in paths:
+            old = loaded.get(self.plugin_paths.get(path))
+            if old is not None and not self.isPluginChanged(path, old):
+                continue
+            plugin = self.createPlugin(path)
+            if plugin is not None:
+                created.append((old, plugin))
+        self.manifest.save()
+
+        # swap them in at once
+        states = []
+        for old, plugin in created:
+            state = None
+            if old is not None:
+                state = self.getPluginState(old)
+                if old in self.plugins:
+                    self.unloadPlugin(old)
+            self.addPlugin(plugin)
+            states.append(state)
+
+        # create the tables of any new models
+        if created and self.persistence.enabled:
+            self.persistence.pluginsLoaded()
+
+        for (old, plugin), state in zip(created, states):
+            self.startPlugin(plugin, state)
+
+        return [plugin.name for old, plugin in created], removed
+
+    def isPluginChanged(self, path, plugin):
+        """
+        Returns True if the plugin file in the folder changed since the
+        plugin was loaded.
+        """
+        plugin_file_path = self.getPluginFilePath(path)
+        if isinstance(plugin, LazyPlugin) and plugin.plugin is None:
+            return self.manifest.get(plugin_file_path) is None
+        return self.loader.isChanged(plugin_file_path)
+
+    def getPluginFilePath(self, path):
+        """Returns the main script of the plugin folder."""
+        return os.path.join(self.config.plugins.root, path, "%s.py" % path)
+
+    def loadPlugin(self, path, process=None, lazy=None):
+        """
+        Load a plugin from the given path. If process is True, or if
+        process is None and `plugins.<name>.process` is set in the config,
+        the plugin runs in its own worker process (see ProcessPlugin). If
+        lazy is True, or if lazy is None and `plugins.lazy` or
+        `plugins.<name>.lazy` is set in the config, a stub is registered
+        instead and the plugin is imported on first use (see LazyPlugin).
+        """
+        plugin = self.createPlugin(path, process, lazy)
+        if plugin is None:
+            return False
+        self.addPlugin(plugin)
+        return True
+
+    def createPlugin(self, path, process=None, lazy=None):
+        """Returns the plugin loaded from the given path, or None."""
         logging.debug("looking for plugin in %s" % path)
         # if path is a folder
         if os.path.isdir(os.path.join(self.config.plugins.root, path)):
 
             # if found plugin in folder
-            plugin_file_path = os.path.join(
-                self.config.plugins.root, path, "%s.py" % path
-            )
+            plugin_file_path = self.getPluginFilePath(path)
             if os.path.isfile(plugin_file_path):
-                try:
-                    # try to import it
-                    logging.debug("- importing plugin %s module" % path)
-                    plugin_module = imp.load_source(
-                        path,
-                        plugin_file_path
+
+                # register a stub if the plugin has not changed
+                entry = self.manifest.get(plugin_file_path)
+                if entry is not None and self.loadsLazily(
+                        entry['name'], process, lazy):
+                    logging.debug("Created stub for plugin %s" % path)
+                    self.plugin_paths[path] = entry['name']
+                    return LazyPlugin(
+                        entry, path, self.activatePlugin, self.threads.wrap
                     )
-                    logging.debug("Imported plugin module %s" % path)
 
-                # TODO: change to only catch import errors here
-                except Exception as e:
-                    logging.error(
-                        "Error importing plugin %s: %s" % (path, repr(e))
+                # models from a previous load would clash with the new ones,
+                # they are put back if the plugin fails to load
+                detached = persistence.detachModels(path)
+                plugin = self.importPlugin(path, plugin_file_path, process)
+                if plugin is None:
+                    persistence.removeModels(path)
+                    persistence.restoreModels(detached)
+                return plugin
+
+        return None
+
+    def importPlugin(self, path, plugin_file_path, process=None):
+        """
+        Returns the plugin created from the plugin file, or None. Its module
+        only replaces the loaded version once the plugin is created.
+        """
+        try:
+            # try to import it
+            logging.debug("- importing plugin %s module" % path)
+            plugin_module = self.loader.load(path, plugin_file_path)
+            logging.debug("Imported plugin module %s" % path)
+
+        # TODO: change to only catch import errors here
+        except Exception as e:
+            logging.error(
+                "Error importing plugin %s: %s" % (path, repr(e))
+            )
+            traceback.print_exc()
+            return None
+
+        if hasattr(plugin_module, 'Plugin'):
+            try:
+                self.manifest.update(
+                    plugin_file_path, plugin_module.Plugin, self.hooks
+                )
+
+                logging.debug("Creating plugin")
+                if self.runsInProcess(plugin_module.Plugin, process):
+                    plugin = ProcessPlugin(
+                        self,
+                        plugin_module.Plugin,
+                        plugin_file_path,
+                        path
                     )
-                    traceback.print_exc()
-                    return False
-
-                if hasattr(plugin_module, 'Plugin'):
-                    try:
-                        logging.debug("Creating plugin")
-                        plugin = plugin_module.Plugin(
-                            self,
-                            self.config
-                        )
-                        logging.debug("Loaded plugin %s" % plugin.name)
-
-                    # loading external code - catch all exceptions
-                    except Exception as e:
-                        logging.error("Error loading plugin %s: %s" % (
-                            plugin_file_path, repr(e))
-                        )
-                        return False
-
-                    # TODO: what does the comment below mean? does this work?
-                    # this probably doesnt work singly bc it sticks the same
-                    # plugin on the end of the list
-                    for p in self.plugins:
-                        if p.name == plugin.name:
-                            self.plugins.remove(p)
-                    self.plugins.append(plugin)
-                    return True
+                else:
+                    plugin = plugin_module.Plugin(
+                        self,
+                        self.config
+                    )
+                logging.debug("Loaded plugin %s" % plugin.name)
+                self.loader.install(path, plugin_module)
+                self.plugin_paths[path] = plugin.name
+                return plugin
+
+            # loading external code - catch all exceptions
+            except Exception as e:
+                logging.error("Error loading plugin %s: %s" % (
+                    plugin_file_path, repr(e))
+                )
 
-        return False
+        return None
+
+    def addPlugin(self, plugin):
+        """
+        Register the plugin in the dispatch structures, replacing any loaded
+        version of it. The new one goes on the end of the list.
+        """
+        for p in list(self.plugins):
+            if p.name == plugin.name:
+                self.unloadPlugin(p)
+        self.plugins.append(plugin)
+        self.commands.register(plugin)
+        self.hooks.register(plugin)
+        self.batches.register(plugin)
+        self.routing.setChannels(plugin, self.getPluginChannels(plugin))
+        self.help.invalidate()
+
+    def activatePlugin(self, stub):
+        """
+        Import and create the real plugin for a LazyPlugin stub and swap it
+        in. Returns the plugin, or None if it could not be loaded.
+        """
+        logging.info("Loading plugin %s on first use" % stub.name)
+        plugin = self.createPlugin(stub.path, lazy=False)
+        if plugin is None:
+            if stub in self.plugins:
+                self.unloadPlugin(stub)
+            return None
+
+        # calls to the stub while it is swapped out go to the plugin
+        stub.plugin = plugin
+        self.addPlugin(plugin)
+        self.manifest.save()
+
+        # create the tables of any new models
+        if self.persistence.enabled:
+            self.persistence.pluginsLoaded()
+
+        # catch up on what the stub held back
+        self.startPlugin(plugin, stub.serializeState())
+        return plugin
+
+    def startPlugin(self, plugin, state=None):
+        """
+        Restore the state of a plugin loaded after the others, if any, and
+        run its onPluginsLoaded.
+        """
+        for name, args in [
+                ('restoreState', (state,) if state is not None else None),
+                ('onPluginsLoaded', ())]:
+            func = getattr(plugin, name, None)
+            if func is None or args is None:
+                continue
+            # calling external code - catching all exceptions is ok
+            try:
+                self.inflight.track(plugin, name, func(*args))
+            except Exception as e:
+                logging.error(
+                    "Exception running {} in plugin {}: {}".format(
+                        name, plugin.name, repr(e)
+                    )
+                )
+
+    def unloadPlugin(self, plugin):
+        """
+        Remove the plugin from yaib and all the dispatch structures, and
+        drop everything else that would keep it alive: its pending callLater
+        calls and pub subscriptions.
+        """
+        onUnload = getattr(plugin, 'onUnload', None)
+        if onUnload is not None:
+            # calling external code - catching all exceptions is ok
+            try:
+                self.inflight.track(plugin, 'onUnload', onUnload())
+            except Exception as e:
+                logging.error(
+                    "Exception unloading plugin {}: {}".format(
+                        plugin.name, repr(e)
+                    )
+                )
+        self.cancelDelayedCalls(plugin)
+        pub.unsubscribeOwner(plugin)
+
+        self.plugins.remove(plugin)
+        self.commands.unregister(plugin)
+        self.batches.unregister(plugin)
+        self.hooks.unregister(plugin)
+        self.routing.remove(plugin)
+        self.breaker.reset(plugin.name)
+        self.help.invalidate()
+
+        if isinstance(plugin, ProcessPlugin):
+            plugin.stop()
+
+    def cancelDelayedCalls(self, plugin):
+        """Cancel the pending callLater calls scheduled for the plugin."""
+        for call, owner in self.delayed.items():
+            if owner is not plugin:
+                continue
+            # the reactor may keep the cancelled call for a while
+            del self.delayed[call]
+            if call.active():
+                call.cancel()
+
+    def disablePlugin(self, plugin):
+        """Unload a misbehaving plugin until the plugins are reloaded."""
+        if plugin in self.plugins:
+            logging.error("Disabling plugin %s" % plugin.name)
+            self.unloadPlugin(plugin)
+
+    def loadsLazily(self, name, process=None, lazy=None):
+        """Returns True if the plugin should be loaded on first use."""
+        if lazy is not None:
+            return lazy
+        plugin_config = getattr(self.config.plugins, name)
+        if process or (plugin_config and plugin_config.process):
+            return False
+        if plugin_config and plugin_config.lazy is not None:
+            return bool(plugin_config.lazy)
+        return bool(self.config.plugins.lazy)
+
+    def runsInProcess(self, plugin_class, process=None):
+        """Returns True if the plugin should run in a worker process."""
+        if process is not None:
+            return process
+        plugin_config = getattr(self.config.plugins, plugin_class.name)
+        return bool(plugin_config and plugin_config.process)
+
+    def getPluginChannels(self, plugin):
+        """
+        Returns the list of channels (or fnmatch patterns) the plugin is
+        restricted to, or None if it is active in every channel. Checks the
+        plugin's `channels` setting first, then the `plugins.<name>.channels`
+        configuration.
+        """
+        channels = self.settings.get('%s.channels' % plugin.name)
+        plugin_config = getattr(self.config.plugins, plugin.name)
+        if channels is None and plugin_config:
+            channels = plugin_config.channels
+
+        if not channels:
+            return None
+        return util.toList(channels)
+
+    def updateChannelRouting(self, keys=None):
+        """
+        Reload the channel restrictions of the plugins whose `channels`
+        setting is one of the changed keys, or of every plugin if keys is
+        None. Other settings, written on every message by some plugins,
+        leave the routing as it is.
+        """
+        if keys is None:
+            names = None
+        else:
+            names = set()
+            for key in keys:
+                subkeys = key.split('.')
+                # the channels key or a parent of it
+                if len(subkeys) == 1 or subkeys[1:] == ['channels']:
+                    names.add(subkeys[0])
+            if not names:
+                return
+
+        for plugin in self.plugins:
+            if names is None or plugin.name in names:
+                self.routing.setChannels(
+                    plugin, self.getPluginChannels(plugin)
+                )
 
     def getPluginSettings(self, pluginName):
         """Create a wrapper around the settings object that namespaces
@@ -294,47 +915,154 @@ class Yaib(object):
         return SettingsWrapper()
 
     def callInPlugins(self, command, *args, **kwargs):
-        for p in self.plugins:
-            if hasattr(p, command):
-                try:
-                    getattr(p, command)(*args, **kwargs)
-                # running plugin command - catch everything
-                except Exception as e:
-                    logging.error(
-                        "Exception running {} in plugin {}: {}".format(
-                            command,
-                            p.name,
-                            repr(e)
-                        )
+        """
+        Calls the given hook in every plugin that implements it, in priority
+        order. Returns True if a plugin stopped the propagation.
+        """
+        return self._callSubscribers(
+            command, self.hooks.get(command), args, kwargs
+        )
+
+    def callInChannel(self, channel, command, *args, **kwargs):
+        """
+        Calls the given hook in every plugin that implements it and is
+        active in the given channel, in priority order. Returns True if a
+        plugin stopped the propagation.
+        """
+        return self._callSubscribers(
+            command,
+            self.routing.filter(command, channel, self.hooks.get(command)),
+            args,
+            kwargs
+        )
+
+    def callEvent(self, command, event):
+        """
+        Calls the given hook with the event record in every plugin that
+        implements it and is active in the event's channel. Plugins that
+        do not accept the record directly get the unpacked arguments.
+        Returns True if a plugin stopped the propagation.
+        """
+        return self._callSubscribers(
+            command,
+            self.routing.filter(
+                command, event.channel, self.hooks.get(command)
+            ),
+            None,
+            None,
+            event
+        )
+
+    def _callSubscribers(self, command, subscribers, args, kwargs,
+                         event=None):
+        watchdog = self.watchdog
+        latency = self.latency
+        timer = latency.timer
+        breaker = self.breaker
+        tripped = breaker.tripped
+        for p, func, takes_event in subscribers:
+            if tripped and not breaker.allow(p.name, command):
+                continue
+
+            started = timer()
+            watchdog.enter(p, command, started)
+            try:
+                if takes_event:
+                    if event is None:
+                        event = Event.fromHookArgs(command, args, kwargs)
+                    result = func(event)
+                else:
+                    # unpack the record once for every legacy hook
+                    if args is None:
+                        args, kwargs = event.fields(command), {}
+                    result = func(*args, **kwargs)
+
+                if tripped:
+                    breaker.success(p.name, command)
+                if result is STOP_PROPAGATION:
+                    return True
+                if result is not None:
+                    self.inflight.track(p, command, result)
+            # running plugin command - catch everything
+            except Exception as e:
+                logging.error(
+                    "Exception running {} in plugin {}: {}".format(
+                        command,
+                        p.name,
+                        repr(e)
                     )
+                )
+                breaker.failure(p.name, command)
+            finally:
+                watchdog.exit()
+                latency.record(p.name, command, timer() - started)
+        return False
 
-    def formatDoc(self, message):
+    def formatDoc(self, message, *args, **values):
         """
         Formats the given message by replacing {nick} and {command_prefix}
-        with their current values and stripping any control flags."""
-        doc = message.replace(self.DONT_NOTIFY_PLUGINS_FLAG, '')
-        return doc.format(
-            nick=self.nick,
-            command_prefix=self.command_prefix
-        )
+        with their current values, and any other fields with the given
+        values, and stripping any control flags. Cached (see TemplateCache).
+        """
+        return self.templates.format(message, *args, **values)
 
     def callLater(self, delay, func, *args, **kwargs):
-        """Wait for the given delay then call the function with the args."""
-        self.server_connection.callLater(delay, func, *args, **kwargs)
+        """
+        Wait for the given delay then call the function with the args. The
+        function runs with the current network, so replies go to the network
+        it was scheduled from. A call of a plugin's method is cancelled when
+        the plugin is unloaded, see callLaterFor for other functions.
+        """
+        owner = getattr(func, 'im_self', None)
+        return self.callLaterFor(owner, delay, func, *args, **kwargs)
+
+    def callLaterFor(self, owner, delay, func, *args, **kwargs):
+        """
+        callLater for the owner plugin: the call is cancelled when the plugin
+        is unloaded, whatever the function (a lambda, a closure...).
+        """
+        call = self.clock.callLater(
+            delay, callInNetwork, getCurrentNetwork(), func, *args, **kwargs
+        )
+        self.delayed[call] = owner
+        return call
 
     # connection functionality
     def onConnected(self, connection):
-        # save the active server connection
-        # (refactor when supporting multiple servers)
-        self.server_connection = connection
+        # save the connection to the network
+        network = self.network
+        network.connection = connection
+        network.channels = []
 
         # set nick
-        self.setNick(self.settings.get('nick'))
+        self.setNick(self.formatNick(self.settings.get('nick')), network)
 
-        # join default channels
-        default_channels = self.settings.get('default_channels')
+        # join default channels, cluster workers join their share of them
+        if self.cluster is not None and network.primary:
+            default_channels = self.cluster.assigned
+        else:
+            default_channels = self.settings.get(network.channels_key) or []
         for channel in default_channels:
-            self.server_connection.join(str(channel))
+            connection.join(str(channel))
+
+        # call in plugins
+        self.callInPlugins('onConnected')
+
+    def onResumed(self, connection, channels):
+        """
+        Called with a connection adopted from the previous process, which is
+        already in its channels.
+        """
+        network = self.network
+        network.connection = connection
+        network.channels = list(channels)
+        if network.primary:
+            self.nick = connection.nickname
+        logging.info(
+            "Resumed the connection to %s in %d channels" % (
+                network.name, len(channels)
+            )
+        )
 
         # call in plugins
         self.callInPlugins('onConnected')
@@ -342,120 +1070,141 @@ class Yaib(object):
     def onMessageOfTheDay(self, message):
         self.callInPlugins('onMessageOfTheDay', message)
 
-    def onNotification(self, user, nick, channel, message):
-        self.callInPlugins('onNotification', user, nick, channel, message)
+    def onNotification(self, event):
+        self.callEvent('onNotification', event)
 
-    def onUserAction(self, user, nick, channel, action):
-        self.callInPlugins('onUserAction', user, nick, channel, action)
+    def onUserAction(self, event):
+        self.callEvent('onUserAction', event)
 
-    def onPrivateMessage(self, user, nick, message):
+    def onPrivateMessage(self, event):
         # split it
-        command, x, more = message.lstrip(' ').partition(' ')
+        command, x, more = event.message.lstrip(' ').partition(' ')
 
         # strip command prefix if there is one
         if command.startswith(self.command_prefix):
             command = command[len(self.command_prefix):]
 
         # try to call this like a command
-        result = self.findAndCall(command, user, nick, self.nick, more)
+        result = self.findAndCall(
+            command, event.user, event.nick, self.nick, more
+        )
 
         # didnt find command, pass on to plugins
         if result is None:
-            self.callInPlugins('onPrivateMessage', user, nick, message)
+            self.callEvent('onPrivateMessage', event)
 
-    def onDirectMessage(self, user, nick, channel, message):
+    def onDirectMessage(self, event):
         # remove nick from front
-        processed = message[len(self.nick):]
+        processed = event.message[len(self.nick):]
         processed = processed.lstrip(
-            self.config.connection.nick_command_delimiters
+            self.network.config.nick_command_delimiters
         )
 
         # split it into command name and the arguments
         command, x, more = processed.partition(' ')
 
         # check if first word is a command
-        found = self.findAndCall(command, user, nick, channel, more)
+        found = self.findAndCall(
+            command, event.user, event.nick, event.channel, more
+        )
         if not found:
-            self.callInPlugins(
-                'onMessage', user, nick, channel, message, highlight=True
-            )
+            event.highlight = True
+            self.callEvent('onMessage', event)
 
-    def onMessage(self, user, nick, channel, message, highlight):
-        self.callInPlugins(
-            'onMessage',
-            user,
-            nick,
-            channel,
-            message,
-            highlight
-        )
+    def onMessage(self, event):
+        self.callEvent('onMessage', event)
 
-    def onCommand(self, user, nick, channel, command, more):
-        found = self.findAndCall(command, user, nick, channel, more)
+    def onCommand(self, event):
+        found = self.findAndCall(
+            event.command, event.user, event.nick, event.channel, event.more
+        )
         if not found:
-            self.callInPlugins(
-                'onMessage', user, nick, channel, more, highlight=True
-            )
+            event.message = event.more
+            event.highlight = True
+            self.callEvent('onMessage', event)
 
     def findAndCall(self, command, user, nick, channel, more):
         """Searches for the specified command and calls it if possible. Returns
-        False if didn't have permission, None if not found, True if found and
+        None if not found or didn't have permission, True if found and
         executed. If multiple plugins provide the same command, whichever one
-        is found first will be executed."""
-        searchables = [self] + self.plugins
-        for searchable in searchables:
-            func, is_admin_command = \
-                self.findCommand(searchable, user, nick, channel, command)
-
-            # found it, execute it
-            if func:
-                command_event_name = 'onCommand'
-                func(user, nick, channel, more)
-
-                # if admin command, publish and notify plugins
-                if is_admin_command:
-                    command_event_name = 'onAdminCommand'
-                    pub.sendMessage(
-                        'core:adminCommand',
-                        user=user,
-                        nick=nick,
-                        channel=channel,
-                        command=command,
-                        more=more
-                    )
-
-                # special cases not to send to plugins
-                if (not func.__doc__ or
-                        self.DONT_NOTIFY_PLUGINS_FLAG not in func.__doc__):
-                    self.callInPlugins(
-                        command_event_name, user, nick, channel, command, more
-                    )
-
-                return True
+        was loaded first will be executed. Commands can return a Deferred (or
+        be inlineCallbacks style generators) to finish asynchronously, they
+        are tracked in self.inflight until they do."""
+        entries = self.commands.get(command)
+        if not entries:
+            return None
+
+        # skip plugins that are not active in this channel
+        entries = self.routing.filter('command_' + command, channel, entries)
+
+        # check permissions once per dispatch
+        owner, func, is_admin_command = self.commands.select(
+            entries,
+            self.isAdmin(user, nick),
+            self.isOp(nick, channel)
+        )
 
         # never found it or didn't have permission, return None
-        return None
+        if func is None:
+            return None
 
-    def findCommand(self, obj, user, nick, channel, command):
-
-        # look for admin command if user is admin
-        if self.isAdmin(user, nick):
-            f = 'admin_%s' % command
-            if hasattr(obj, f):
-                return getattr(obj, f), True
+        # found it, execute it
+        command_event_name = 'onCommand'
+        started = self.latency.timer()
+        self.watchdog.enter(owner, command, started)
+        try:
+            result = func(user, nick, channel, more)
+        # running plugin command - catch everything
+        except Exception as e:
+            result = None
+            logging.error(
+                "Exception running {} in plugin {}: {}".format(
+                    command,
+                    getattr(owner, 'name', None),
+                    repr(e)
+                )
+            )
+        finally:
+            self.watchdog.exit()
+            self.latency.record(
+                getattr(owner, 'name', None),
+                command,
+                self.latency.timer() - started
+            )
+        self.inflight.track(owner, command, result)
+
+        # if admin command, publish and notify plugins
+        if is_admin_command:
+            command_event_name = 'onAdminCommand'
+            pub.sendMessage(
+                'core:adminCommand',
+                user=user,
+                nick=nick,
+                channel=channel,
+                command=command,
+                more=more
+            )
 
-        # look for op command if user is op
-        if self.isOp(nick, channel):
-            f = 'op_%s' % command
-            if hasattr(obj, f):
-                return getattr(obj, f), False
+        # special cases not to send to plugins
+        if (not func.__doc__ or
+                self.DONT_NOTIFY_PLUGINS_FLAG not in func.__doc__):
+            self.callInChannel(
+                channel,
+                command_event_name, user, nick, channel, command, more
+            )
 
-        # look for regular handler for this command - None otherwise
-        func = getattr(obj, 'command_' + command, None)
-        return func, False
+        return True
 
     # TODO: implement this correctly
     def quit(self):
+        # deliver any batched events before the plugins shut down
+        self.batches.flush()
+
+        # keep the runtime state for the next start
+        if self.snapshot.enabled:
+            self.snapshot.stop()
+            self.snapshot.saveFrom(self.getRuntimeState)
+
         # shutdown all the plugins
         self.callInPlugins('onShutdown')
 
@@ -465,36 +1214,125 @@ class Yaib(object):
         # save settings
         self.settings.saveSettings()
 
-        # TODO: support multiple connections
-        self.server_connection.quit()
+        # stops the reactor, closing the connection to every network
+        connected = [
+            n.connection for n in self.networks.values() if n.connection
+        ]
+        if connected:
+            connected[0].quit()
+        else:
+            connections.irc.stop()
+
+    def upgrade(self):
+        """
+        Restart yaib with the current code without disconnecting. Stops
+        reading from the connections, shuts the plugins down, waits for the
+        queued messages to be sent and replaces this process with a new one
+        that adopts the connections (see handoff). Returns False if this is
+        a cluster worker, which can not be upgraded on its own.
+        """
+        if self.cluster is not None:
+            return False
+
+        for connection in self.getConnections():
+            connection.transport.stopReading()
+
+        # same as quit, but the connections stay open
+        self.batches.flush()
+        runtime = self.getRuntimeState()
+        self.callInPlugins('onShutdown')
+        pub.sendMessage('core:shutdown')
+        self.settings.saveSettings()
 
-    def setNick(self, nick):
+        self.handOff(time.time() + handoff.DRAIN_TIMEOUT, runtime)
+        return True
+
+    def getConnections(self):
+        """Returns every open connection, including helpers."""
+        connected = []
+        for network in self.networks.values():
+            if network.connection:
+                connected.append(network.connection)
+            connected.extend(network.helpers)
+        return connected
+
+    def handOff(self, deadline, runtime):
+        drained = all(map(handoff.isDrained, self.getConnections()))
+        if not drained and time.time() < deadline:
+            self.clock.callLater(0.1, self.handOff, deadline, runtime)
+            return
+
+        networks = {}
+        for network in self.networks.values():
+            if network.connection:
+                networks[network.name] = {
+                    'connection': handoff.getConnectionState(
+                        network.connection, network.channels
+                    ),
+                    'helpers': [
+                        handoff.getConnectionState(helper, helper.channels)
+                        for helper in network.helpers
+                    ]
+                }
+
+        handoff.execute({
+            'networks': networks,
+            'runtime': runtime
+        }, os.path.realpath(__file__))
+
+    def setNick(self, nick, network=None):
+        """Change the nick on the given network, or on every network."""
         old_nick = self.nick if hasattr(self, 'nick') else ''
-        # TODO: support multiple connections
-        if hasattr(self, 'server_connection'):
-            self.server_connection.setNick(nick)
+        networks = [network] if network else self.networks.values()
+        connected = [n.connection for n in networks if n.connection]
+        if connected:
+            for connection in connected:
+                connection.setNick(nick)
             self.nick = nick
             self.callInPlugins('onNickChange', nick, old_nick)
 
     def sendMessage(self, channel, message):
         """
-        Sends a message to the specified channel on the current
-        server connection.
+        Sends a message to the specified channel on the current network.
+        Safe to call from blocking plugin handlers.
         """
+        # blocking handlers run in a thread, send from the reactor thread
+        if not inReactorThread():
+            return self.threads.callFromThread(
+                callInNetwork, getCurrentNetwork(),
+                self.sendMessage, channel, message
+            )
+
         # do nothing if in 'shutup' mode
         if self.shutup_until and time.time() < self.shutup_until:
             return False
 
-        # TODO: support multiple connections
-        self.server_connection.sendMessage(channel, message)
+        sender = self.network.getSender(channel)
+        if sender is None:
+            logging.warning("Not connected to %s, dropped message to %s" % (
+                self.network.name, channel
+            ))
+            return False
+        sender.sendMessage(channel, message)
 
         # send to plugins
-        self.callInPlugins('onSend', channel, message)
+        self.callInChannel(channel, 'onSend', channel, message)
 
     def action(self, channel, action):
         """Sends an action in the specified channel (or nick!)."""
+        if not inReactorThread():
+            return self.threads.callFromThread(
+                callInNetwork, getCurrentNetwork(),
+                self.action, channel, action
+            )
+
+        if self.network.connection is None:
+            logging.warning("Not connected to %s, dropped action in %s" % (
+                self.network.name, channel
+            ))
+            return False
         self.server_connection.describe(channel, action)
-        self.callInPlugins('onAction', channel, action)
+        self.callInChannel(channel, 'onAction', channel, action)
 
     def isAdmin(self, user, nick):
         """Returns true if the user is currently an admin."""
@@ -512,54 +1350,71 @@ class Yaib(object):
 
         # add to list of channels
         self.channels.append(channel)
+        self.network.joinHelpers(channel)
 
         # add to settings
-        channels = self.settings.get('default_channels')
+        key = self.network.channels_key
+        channels = self.settings.get(key) or []
         if channel not in channels:
             channels.append(channel)
-            self.settings.set('default_channels', channels)
+            self.settings.set(key, channels)
 
         # notify plugins
-        self.callInPlugins('onJoined', channel)
+        self.callInChannel(channel, 'onJoined', channel)
 
     def onLeave(self, channel):
         logging.info("Left %s" % channel)
 
         self.channels.remove(channel)
-        # remove from settings
-        channels = self.settings.get('default_channels')
-        if channel in channels:
+        self.network.leaveHelpers(channel)
+
+        # remove from settings, unless it moved to another cluster worker
+        releasing = (
+            self.cluster is not None and self.network.primary and
+            self.cluster.isReleasing(channel)
+        )
+        key = self.network.channels_key
+        channels = self.settings.get(key) or []
+        if channel in channels and not releasing:
             channels.remove(channel)
-            self.settings.set('default_channels', channels)
+            self.settings.set(key, channels)
 
         # call in plugins
-        self.callInPlugins('onLeave', channel)
+        self.callInChannel(channel, 'onLeave', channel)
 
     def onKicked(self, kicker_user, kicker, channel, message):
         """Called when kicked from a channel."""
         self.onLeave(channel)
-        self.callInPlugins('onKicked', kicker_user, kicker, channel, message)
+        self.callInChannel(
+            channel, 'onKicked', kicker_user, kicker, channel, message
+        )
 
     def onTopicChanged(self, user, nick, channel, topic):
-        self.callInPlugins('onTopicChanged', user, nick, channel, topic)
+        self.callInChannel(
+            channel, 'onTopicChanged', user, nick, channel, topic
+        )
 
-    def onUserJoined(self, user, nick, channel):
+    def onUserJoined(self, event):
         """Called when another user joins the channel"""
-        self.callInPlugins('onUserJoined', user, nick, channel)
+        self.callEvent('onUserJoined', event)
 
-    def onUserLeft(self, user, nick, channel):
+    def onUserLeft(self, event):
         """Called when another user leaves the channel"""
-        self.callInPlugins('onUserLeft', user, nick, channel)
+        self.callEvent('onUserLeft', event)
 
-    def onUserQuit(self, user, nick, quitMessage):
-        """Called when another user disconnections from the server."""
-        self.callInPlugins('onUserQuit', user, nick, quitMessage)
+    def onUserQuit(self, event):
+        """
+        Called when another user disconnections from the server. The quit
+        message is in event.message.
+        """
+        self.callEvent('onUserQuit', event)
 
     def onUserKicked(self, kickee, channel, kicker_user, kicker, message):
         """Called when a user is kicked from the channel"""
         # TODO: onUserLeft expects user, nick channel
         # self.onUserLeft(kickee, channel)
-        self.callInPlugins(
+        self.callInChannel(
+            channel,
             'onUserKicked', kickee, channel, kicker_user, kicker, message
         )
 
@@ -572,7 +1427,9 @@ class Yaib(object):
             self.callInPlugins('onUserRenamed', user, old_nick, new_nick)
 
     def onUserList(self, channel_type, channel, user_list):
-        self.callInPlugins('onUserList', channel_type, channel, user_list)
+        self.callInChannel(
+            channel, 'onUserList', channel_type, channel, user_list
+        )
 
     def onPong(self, user, nick, channel, seconds):
         self.sendMessage(
@@ -584,5 +1441,22 @@ class Yaib(object):
         self.callInPlugins('irc_%s' % command, params)
 
 if __name__ == '__main__':
-    yaib = Yaib()
-    yaib.start()
+    # `yaib.py --coordinator` runs the bot as a cluster of worker processes
+    if '--coordinator' in sys.argv:
+        configuration = loadConfiguration()
+        Coordinator(
+            configuration,
+            loadSettings(configuration),
+            script=os.path.realpath(__file__)
+        ).start()
+    elif '--worker' in sys.argv:
+        yaib = Yaib(worker=int(sys.argv[sys.argv.index('--worker') + 1]))
+        yaib.start()
+    elif handoff.RESUME_ARGUMENT in sys.argv:
+        yaib = Yaib(
+            resume=sys.argv[sys.argv.index(handoff.RESUME_ARGUMENT) + 1]
+        )
+        yaib.start()
+    else:
+        yaib = Yaib()
+        yaib.start()